@@ -0,0 +1,290 @@
+# analitica.py
+from datetime import datetime, timedelta
+from sqlalchemy import String, func, select, type_coerce
+from archivo import leer_segmento
+from cache import CacheLRU
+from metricas import cronometro
+from models import Registro
+
+# NumPy se importa dentro de cada función que lo usa: main importa este
+# módulo al arrancar, pero NumPy solo se carga con la primera consulta de
+# analítica.
+
+HORA = 3600
+EPOCA = datetime(1970, 1, 1)
+DIAS = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+# El 1970-01-01 fue jueves: día de la semana de un día contado desde la época
+JUEVES = 3
+# Bordes (en minutos) del histograma de permanencia; el último intervalo es abierto
+LIMITES_PERMANENCIA = (0, 30, 60, 120, 180, 240, 360, 480, 720, 1440, 2880)
+HORAS_PICO = 10
+SEPARADOR = "|"
+# Segmentos del archivo ya convertidos a arreglos (son inmutables: la clave lleva el sha256)
+SEGMENTOS_EN_MEMORIA = 36
+
+
+# --- Columnas como arreglos de NumPy ---
+# Fechas en segundos desde la época, sin zona (como se guardan en SQLite);
+# se leen en texto y NumPy las convierte, sin pasar por datetime. Texto
+# vacío o None = NaT (el mínimo de int64).
+def _segundos(textos) -> "np.ndarray":
+    import numpy as np
+    return np.array(textos, dtype="datetime64[s]").astype(np.int64)
+
+
+def _arreglos(ids, entradas, salidas, tipos, cascos) -> dict:
+    import numpy as np
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "entrada": _segundos(entradas),
+        "salida": _segundos(salidas),  # NaT = sigue adentro
+        "tipo": np.array([t or "" for t in tipos], dtype=str),
+        "cascos": np.array([c or 0 for c in cascos], dtype=np.int64),
+    }
+
+
+def _vacio() -> dict:
+    return _arreglos([], [], [], [], [])
+
+
+class Analitica:
+    """
+    Ocupación y permanencia sobre los registros vivos y los archivados. Las
+    columnas que hacen falta se cargan como arreglos y todo se calcula con
+    operaciones vectorizadas: la ocupación sale de un barrido (+1 al
+    entrar, -1 al salir, suma acumulada) partido en horas.
+    """
+
+    def __init__(self, archivo, segmentos_en_memoria: int = SEGMENTOS_EN_MEMORIA):
+        self.archivo = archivo
+        self._segmentos = CacheLRU(segmentos_en_memoria, ttl_segundos=3600)
+
+    # --- Carga ---
+    def _vivos(self, db, desde: datetime, hasta: datetime) -> dict:
+        # Una fila con cada columna concatenada: traer cientos de miles de filas
+        # sueltas a Python cuesta más que todo el cálculo
+        ids, entradas, salidas, tipos, cascos = db.execute(
+            select(
+                func.group_concat(Registro.id),
+                func.group_concat(type_coerce(Registro.hora_entrada, String), SEPARADOR),
+                func.group_concat(func.coalesce(type_coerce(Registro.hora_salida, String), ""), SEPARADOR),
+                func.group_concat(func.coalesce(Registro.tipo_cobro, ""), SEPARADOR),
+                func.group_concat(func.coalesce(Registro.cascos, 0)),
+            ).where(
+                Registro.hora_entrada < hasta,
+                (Registro.hora_salida.is_(None)) | (Registro.hora_salida >= desde),
+            )
+        ).one()
+        if ids is None:
+            return _vacio()
+        return _arreglos(ids.split(","), entradas.split(SEPARADOR), salidas.split(SEPARADOR),
+                         tipos.split(SEPARADOR), cascos.split(","))
+
+    def _archivados(self, desde: datetime, hasta: datetime) -> list[dict]:
+        partes = []
+        for segmento in self.archivo.segmentos():
+            if segmento["entrada_min"] >= hasta or segmento["salida_max"] < desde:
+                continue
+            clave = (segmento["archivo"], segmento["sha256"])
+            arreglos = self._segmentos.obtener(clave)
+            if arreglos is None:
+                with cronometro("lectura_archivo"):
+                    columnas = leer_segmento(self.archivo.carpeta / segmento["archivo"])
+                arreglos = _arreglos(columnas["id"], columnas["hora_entrada"], columnas["hora_salida"],
+                                     columnas["tipo_cobro"], columnas["cascos"])
+                self._segmentos.guardar(clave, arreglos)
+            partes.append(arreglos)
+        return partes
+
+    def cargar(self, db, desde: datetime, hasta: datetime, tipo_cobro: str | None = None) -> dict:
+        import numpy as np
+        vivos = self._vivos(db, desde, hasta)
+        archivados = self._archivados(desde, hasta)
+        if archivados:
+            ids_archivados = np.concatenate([a["id"] for a in archivados])
+            # Mientras el job archiva un mes, sus filas pueden verse en los dos lados
+            vivos = _filtrar(vivos, ~np.isin(vivos["id"], ids_archivados))
+        columnas = {
+            nombre: np.concatenate([vivos[nombre], *(a[nombre] for a in archivados)])
+            for nombre in vivos
+        }
+        inicio, fin = _segundo(desde), _segundo(hasta)
+        salidas = columnas["salida"]
+        visibles = (columnas["entrada"] < fin) & ((salidas == np.iinfo(np.int64).min) | (salidas >= inicio))
+        if tipo_cobro:
+            visibles &= columnas["tipo"] == tipo_cobro
+        return _filtrar(columnas, visibles)
+
+    # --- Informe ---
+    def informe(self, db, desde: datetime, hasta: datetime, ahora: datetime, tipo_cobro: str | None = None) -> dict:
+        import numpy as np
+        # Rango en horas completas: cada valor de la curva es una hora del reloj
+        desde = _a_la_hora(desde)
+        if _a_la_hora(hasta) != hasta:
+            hasta = _a_la_hora(hasta) + timedelta(hours=1)
+        with cronometro("analitica"):
+            columnas = self.cargar(db, desde, hasta, tipo_cobro)
+            inicio, fin = _segundo(desde), _segundo(hasta)
+            entradas = columnas["entrada"]
+            abiertas = columnas["salida"] == np.iinfo(np.int64).min
+            salidas = np.where(abiertas, _segundo(ahora), columnas["salida"])
+
+            motos = curva_horaria(entradas, salidas, inicio, fin)
+            cascos = curva_horaria(entradas, salidas, inicio, fin, columnas["cascos"])
+            horas = inicio // HORA + np.arange(len(motos["promedio"]))
+            hora_del_dia = horas % 24
+            dia_semana = (horas // 24 + JUEVES) % 7
+
+            # Ingresos del rango por hora del día y por día de la semana
+            nuevas = entradas[entradas >= inicio]
+            ingresos_hora = np.bincount(nuevas // HORA % 24, minlength=24)
+            ingresos_dia = np.bincount((nuevas // 86400 + JUEVES) % 7, minlength=7)
+            horas_por_hora = np.bincount(hora_del_dia, minlength=24)
+            horas_por_dia = np.bincount(dia_semana, minlength=7)
+
+            cerradas = ~abiertas & (entradas >= inicio)
+            minutos = (salidas[cerradas] - entradas[cerradas]) / 60
+            dia_de_entrada = (entradas[cerradas] // 86400 + JUEVES) % 7
+
+            return {
+                "desde": desde,
+                "hasta": hasta,
+                "registros": int(len(entradas)),
+                "por_hora": [
+                    {
+                        "hora": h,
+                        "ocupacion_promedio": _redondear(promedio_m),
+                        "ocupacion_pico": int(pico_m),
+                        "cascos_promedio": _redondear(promedio_c),
+                        "cascos_pico": int(pico_c),
+                        "ingresos_promedio": _redondear(ingresos / dias) if dias else 0,
+                    }
+                    for h, promedio_m, pico_m, promedio_c, pico_c, ingresos, dias in zip(
+                        range(24),
+                        _promedio_por(hora_del_dia, motos["promedio"], 24),
+                        _maximo_por(hora_del_dia, motos["pico"], 24),
+                        _promedio_por(hora_del_dia, cascos["promedio"], 24),
+                        _maximo_por(hora_del_dia, cascos["pico"], 24),
+                        ingresos_hora,
+                        horas_por_hora,
+                    )
+                ],
+                "por_dia_semana": [
+                    {
+                        "dia": DIAS[d],
+                        "ocupacion_promedio": _redondear(promedio),
+                        "ocupacion_pico": int(pico),
+                        "ingresos_promedio": _redondear(ingresos / (horas_dia / 24)) if horas_dia else 0,
+                        "permanencia_mediana_min": _mediana(minutos[dia_de_entrada == d]),
+                    }
+                    for d, promedio, pico, ingresos, horas_dia in zip(
+                        range(7),
+                        _promedio_por(dia_semana, motos["promedio"], 7),
+                        _maximo_por(dia_semana, motos["pico"], 7),
+                        ingresos_dia,
+                        horas_por_dia,
+                    )
+                ],
+                "permanencia": permanencia(minutos, columnas["tipo"][cerradas]),
+                "horas_pico": [
+                    {"hora": EPOCA + timedelta(hours=int(horas[i])), "ocupacion": int(motos["pico"][i])}
+                    for i in np.argsort(-motos["pico"], kind="stable")[:HORAS_PICO]
+                ],
+            }
+
+
+# --- Cálculos ---
+def curva_horaria(entradas, salidas, inicio: int, fin: int, pesos=None) -> dict:
+    """
+    Ocupación de cada hora de [inicio, fin): promedio (integral del nivel
+    entre 3600) y pico. Eventos: +peso al entrar, -peso al salir y un evento
+    de peso 0 en cada borde de hora, para que toda hora tenga al menos uno.
+    """
+    import numpy as np
+    horas = max(0, -(-(fin - inicio) // HORA))
+    if horas == 0:
+        return {"promedio": np.zeros(0), "pico": np.zeros(0, dtype=np.int64)}
+    fin = inicio + horas * HORA
+    desde = np.clip(entradas, inicio, fin)
+    hasta = np.clip(salidas, inicio, fin)
+    validos = desde < hasta
+    if pesos is None:
+        pesos = np.ones(len(entradas), dtype=np.int64)
+    pesos = pesos[validos]
+    bordes = inicio + HORA * np.arange(horas, dtype=np.int64)
+
+    tiempos = np.concatenate([desde[validos], hasta[validos], bordes])
+    deltas = np.concatenate([pesos, -pesos, np.zeros(horas, dtype=np.int64)])
+    orden = np.argsort(tiempos, kind="stable")
+    tiempos, nivel = tiempos[orden], np.cumsum(deltas[orden])
+    duracion = np.diff(np.append(tiempos, fin))
+    # Entre eventos del mismo instante el nivel es intermedio (una moto que sale
+    # y otra que entra no se cuentan juntas): para el pico vale el del último
+    ultimo = np.append(tiempos[1:] != tiempos[:-1], True)
+    comienzos = np.searchsorted((tiempos - inicio) // HORA, np.arange(horas))
+    return {
+        "promedio": np.add.reduceat(nivel * duracion, comienzos) / HORA,
+        "pico": np.maximum.reduceat(np.where(ultimo, nivel, np.iinfo(np.int64).min), comienzos),
+    }
+
+
+def permanencia(minutos, tipos) -> dict:
+    """Histograma y percentiles de minutos de permanencia, total y por tipo de cobro."""
+    import numpy as np
+    limites = np.array(LIMITES_PERMANENCIA, dtype=float)
+
+    def resumen(valores):
+        return {
+            "registros": int(len(valores)),
+            "conteos": np.bincount(np.searchsorted(limites, valores, side="right") - 1,
+                                   minlength=len(limites)).tolist(),
+            "promedio_min": _redondear(valores.mean()) if len(valores) else None,
+            **{f"p{p}_min": _redondear(np.percentile(valores, p)) if len(valores) else None for p in (50, 90, 99)},
+        }
+
+    return {
+        "limites_minutos": list(LIMITES_PERMANENCIA),
+        "total": resumen(minutos),
+        "por_tipo": {str(tipo): resumen(minutos[tipos == tipo]) for tipo in np.unique(tipos)},
+    }
+
+
+def _filtrar(columnas: dict, mascara) -> dict:
+    return {nombre: valores[mascara] for nombre, valores in columnas.items()}
+
+
+def _segundo(fecha: datetime) -> int:
+    import numpy as np
+    return int(np.datetime64(fecha.replace(tzinfo=None), "s").astype(np.int64))
+
+
+def _promedio_por(grupos, valores, n: int):
+    import numpy as np
+    conteos = np.bincount(grupos, minlength=n)
+    return np.bincount(grupos, weights=valores, minlength=n) / np.maximum(conteos, 1)
+
+
+def _maximo_por(grupos, valores, n: int):
+    import numpy as np
+    maximos = np.zeros(n, dtype=np.int64)
+    np.maximum.at(maximos, grupos, valores)
+    return maximos
+
+
+def _mediana(valores):
+    import numpy as np
+    return _redondear(np.median(valores)) if len(valores) else None
+
+
+def _redondear(valor) -> float:
+    return round(float(valor), 2)
+
+
+def _a_la_hora(fecha: datetime) -> datetime:
+    return fecha.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+
+def rango_por_defecto(ahora: datetime) -> tuple[datetime, datetime]:
+    """El último año, hasta el final de la hora en curso."""
+    hasta = _a_la_hora(ahora) + timedelta(hours=1)
+    return hasta - timedelta(days=365), hasta
@@ -0,0 +1,49 @@
+import argparse
+import sys
+from datetime import datetime
+from database import Base, carpeta_archivo, engine
+from migraciones import preparar_esquema
+import archivo
+import models
+
+parser = argparse.ArgumentParser(
+    description="Mueve los registros cerrados antes de un corte a segmentos mensuales comprimidos (ver archivo.py)."
+)
+parser.add_argument("--meses", type=int, default=3, help="meses completos que se quedan en la tabla viva (por defecto 3)")
+parser.add_argument("--hasta", type=datetime.fromisoformat, help="corte explícito (YYYY-MM-DD); reemplaza --meses")
+parser.add_argument("--vacuum", action="store_true", help="compactar la base al terminar (bloquea la base mientras corre)")
+parser.add_argument("--verificar", action="store_true", help="solo revisar que los segmentos coincidan con el manifiesto")
+args = parser.parse_args()
+
+carpeta = carpeta_archivo()
+
+if args.verificar:
+    problemas = archivo.verificar(carpeta)
+    for problema in problemas:
+        print(f"❌ {problema}")
+    if problemas:
+        sys.exit(1)
+    print("✅ Todos los segmentos coinciden con el manifiesto.")
+    sys.exit(0)
+
+hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+if args.hasta:
+    corte = args.hasta
+else:
+    # Primer día del mes, `meses` meses atrás
+    indice_mes = hoy.year * 12 + hoy.month - 1 - args.meses
+    corte = datetime(indice_mes // 12, indice_mes % 12 + 1, 1)
+if corte > hoy:
+    sys.exit("❌ El corte no puede ser posterior a hoy: el día en curso se cuadra desde la tabla viva.")
+
+preparar_esquema(Base.metadata, engine)
+print(f"🗄️ Archivando registros cerrados antes de {corte:%Y-%m-%d} en {carpeta}/ ...")
+tocados = archivo.archivar(engine, carpeta, corte)
+for entrada, movidas in tocados:
+    print(f"   {entrada['mes']}: {movidas} registros movidos, {entrada['filas']} en el segmento ({entrada['bytes'] / 1024:.0f} KiB)")
+print(f"✅ {sum(movidas for _, movidas in tocados)} registros archivados en {len(tocados)} segmentos.")
+
+if args.vacuum and tocados:
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+    print("🧹 Base compactada.")
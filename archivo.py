@@ -0,0 +1,353 @@
+# archivo.py
+import gzip
+import hashlib
+import heapq
+import json
+import os
+from bisect import bisect_right
+from datetime import date, datetime
+from operator import itemgetter
+from pathlib import Path
+from threading import Lock
+from sqlalchemy import bindparam, delete, exists, func, select
+from cache import CacheLRU
+from metricas import cronometro
+from migraciones import bloqueo_escritura
+from models import AsignacionCasillero, Registro
+
+MANIFIESTO = "manifiesto.json"
+FORMATO = 1
+# Segmentos descomprimidos que se guardan en memoria (uno por mes)
+SEGMENTOS_EN_MEMORIA = 6
+
+TABLA = Registro.__table__
+ASIGNACIONES = AsignacionCasillero.__table__
+COLUMNAS = [columna.name for columna in TABLA.columns]
+COLUMNAS_FECHA = {"hora_entrada", "hora_salida", "proximo_pago", "fecha_ultimo_pago"}
+
+
+# --- Formato: un .json.gz por mes de salida, cada columna es una lista ordenada por id ---
+def _a_texto(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def _a_fecha(valor):
+    return datetime.fromisoformat(valor) if valor is not None else None
+
+
+def _sin_zona(valor):
+    # Igual que SQLite: las fechas se comparan sin zona horaria
+    return valor.replace(tzinfo=None) if valor is not None and valor.tzinfo is not None else valor
+
+
+def escribir_atomico(ruta: Path, datos: bytes):
+    """Escribe en un temporal y lo renombra: quien lee ve el archivo viejo o el nuevo, nunca uno a medias."""
+    temporal = ruta.with_name(ruta.name + ".tmp")
+    with open(temporal, "wb") as f:
+        f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def leer_segmento(ruta: Path) -> dict:
+    """Columnas del segmento tal como están guardadas (fechas en texto ISO)."""
+    with gzip.open(ruta, "rt", encoding="utf-8") as f:
+        contenido = json.load(f)
+    if contenido.get("formato") != FORMATO:
+        raise ValueError(f"{ruta.name}: formato de segmento desconocido ({contenido.get('formato')})")
+    columnas = contenido["columnas"]
+    # Segmentos escritos antes de que registros tuviera una columna nueva
+    filas = len(columnas["id"])
+    return {nombre: columnas.get(nombre, [None] * filas) for nombre in COLUMNAS}
+
+
+def leer_manifiesto(carpeta: Path) -> dict:
+    ruta = carpeta / MANIFIESTO
+    if not ruta.exists():
+        return {"formato": FORMATO, "segmentos": []}
+    return json.loads(ruta.read_text(encoding="utf-8"))
+
+
+def _entrada_manifiesto(mes: str, nombre: str, columnas: dict, datos: bytes) -> dict:
+    """Lo que el manifiesto sabe de un segmento: rangos para descartarlo sin abrirlo y el recaudo por día."""
+    resumen = {}
+    for salida, tipo_cobro, valor in zip(columnas["hora_salida"], columnas["tipo_cobro"], columnas["valor_pagado"]):
+        acumulado = resumen.setdefault(salida[:10], {}).setdefault(tipo_cobro, [0, 0])
+        acumulado[0] += 1
+        acumulado[1] += valor or 0
+    return {
+        "mes": mes,
+        "archivo": nombre,
+        "filas": len(columnas["id"]),
+        "bytes": len(datos),
+        "sha256": hashlib.sha256(datos).hexdigest(),
+        "id_min": columnas["id"][0],
+        "id_max": columnas["id"][-1],
+        "entrada_min": min(columnas["hora_entrada"]),
+        "entrada_max": max(columnas["hora_entrada"]),
+        "salida_min": min(columnas["hora_salida"]),
+        "salida_max": max(columnas["hora_salida"]),
+        "resumen": resumen,
+        # Para que el historial de una placa solo abra los meses en que salió
+        "placas": " ".join(sorted({placa for placa in columnas["placa_moto"] if placa})),
+    }
+
+
+# --- Job de archivo ---
+def _archivar_mes(bind, carpeta: Path, inicio: datetime, fin: datetime):
+    """
+    Mueve al segmento del mes los registros cerrados en [inicio, fin),
+    menos el último de cada placa (pagar_mensualidad lo sigue modificando).
+    Todo bajo BEGIN IMMEDIATE: el segmento y el manifiesto se escriben antes
+    del COMMIT que borra las filas. Si el proceso muere en medio, las filas
+    quedan en los dos lados; las lecturas las deduplican por id y la
+    siguiente corrida termina de moverlas.
+    """
+    posterior = TABLA.alias("posterior")
+    tiene_posterior = exists().where(posterior.c.placa_moto == TABLA.c.placa_moto, posterior.c.id > TABLA.c.id)
+    with bloqueo_escritura(bind) as conn:
+        filas = conn.execute(
+            select(TABLA)
+            .where(TABLA.c.hora_salida >= inicio, TABLA.c.hora_salida < fin, tiene_posterior)
+            .order_by(TABLA.c.id)
+        ).all()
+        if not filas:
+            return None
+
+        mes = inicio.strftime("%Y-%m")
+        nombre = f"registros-{mes}.json.gz"
+        ruta = carpeta / nombre
+        por_id = {}
+        if ruta.exists():
+            anteriores = leer_segmento(ruta)
+            for valores in zip(*(anteriores[c] for c in COLUMNAS)):
+                por_id[valores[0]] = valores
+        for fila in filas:
+            por_id[fila.id] = tuple(_a_texto(valor) for valor in fila)
+        ordenadas = [por_id[i] for i in sorted(por_id)]
+        columnas = {nombre_columna: list(valores) for nombre_columna, valores in zip(COLUMNAS, zip(*ordenadas))}
+
+        datos = gzip.compress(
+            json.dumps({"formato": FORMATO, "columnas": columnas}, separators=(",", ":")).encode("utf-8"),
+            compresslevel=9, mtime=0,
+        )
+        escribir_atomico(ruta, datos)
+        entrada = _entrada_manifiesto(mes, nombre, columnas, datos)
+        manifiesto = leer_manifiesto(carpeta)
+        manifiesto["segmentos"] = sorted(
+            [s for s in manifiesto["segmentos"] if s["mes"] != mes] + [entrada], key=itemgetter("mes")
+        )
+        escribir_atomico(carpeta / MANIFIESTO, json.dumps(manifiesto, ensure_ascii=False, indent=1).encode("utf-8"))
+
+        ids = [{"b_id": fila.id} for fila in filas]
+        conn.execute(delete(ASIGNACIONES).where(ASIGNACIONES.c.id_registro == bindparam("b_id")), ids)
+        conn.execute(delete(TABLA).where(TABLA.c.id == bindparam("b_id")), ids)
+    return entrada, len(filas)
+
+
+def archivar(bind, carpeta: Path, corte: datetime) -> list[tuple[dict, int]]:
+    """
+    Archiva los registros cerrados antes de `corte`, un mes por transacción
+    para que la portería no espere más de lo que tarda un mes. Devuelve
+    [(entrada del manifiesto, filas movidas)] de los segmentos tocados.
+    """
+    carpeta.mkdir(parents=True, exist_ok=True)
+    with bind.connect() as conn:
+        primera = conn.execute(select(func.min(TABLA.c.hora_salida))).scalar()
+    tocados = []
+    if primera is None:
+        return tocados
+    inicio = datetime(primera.year, primera.month, 1)
+    while inicio < corte:
+        siguiente = datetime(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+        resultado = _archivar_mes(bind, carpeta, inicio, min(siguiente, corte))
+        if resultado is not None:
+            tocados.append(resultado)
+        inicio = siguiente
+    return tocados
+
+
+def verificar(carpeta: Path) -> list[str]:
+    """Problemas de integridad del archivo (lista vacía si cada segmento coincide con el manifiesto)."""
+    problemas = []
+    for segmento in leer_manifiesto(carpeta)["segmentos"]:
+        ruta = carpeta / segmento["archivo"]
+        if not ruta.exists():
+            problemas.append(f"{segmento['archivo']}: no existe")
+            continue
+        if hashlib.sha256(ruta.read_bytes()).hexdigest() != segmento["sha256"]:
+            problemas.append(f"{segmento['archivo']}: sha256 distinto al del manifiesto")
+            continue
+        if len(leer_segmento(ruta)["id"]) != segmento["filas"]:
+            problemas.append(f"{segmento['archivo']}: número de filas distinto al del manifiesto")
+    return problemas
+
+
+# --- Lectura (la usan /registros/ y /cuadre_caja junto con la tabla viva) ---
+def _puede_tener(segmento: dict, desde_id, entrada, salida, placa) -> bool:
+    if desde_id is not None and segmento["id_max"] <= desde_id:
+        return False
+    if placa and placa not in segmento["placas"]:
+        return False
+    for (desde, hasta), minimo, maximo in (
+        (entrada, segmento["entrada_min"], segmento["entrada_max"]),
+        (salida, segmento["salida_min"], segmento["salida_max"]),
+    ):
+        if (desde is not None and maximo < desde) or (hasta is not None and minimo > hasta):
+            return False
+    return True
+
+
+def _en_rango(desde, hasta):
+    return lambda valor: valor is not None and (desde is None or valor >= desde) and (hasta is None or valor <= hasta)
+
+
+def _fusion_perezosa(segmentos: list, abrir):
+    """
+    Filas de varios segmentos en orden de id. Un segmento solo se abre
+    cuando su id_min puede ser el siguiente: la primera página de un
+    listado no descomprime años de historia.
+    """
+    pendientes = sorted(segmentos, key=itemgetter("id_min"))
+    monticulo = []
+    siguiente_pendiente = 0
+    while True:
+        while siguiente_pendiente < len(pendientes) and (
+            not monticulo or pendientes[siguiente_pendiente]["id_min"] <= monticulo[0][0]
+        ):
+            filas = abrir(pendientes[siguiente_pendiente])
+            fila = next(filas, None)
+            if fila is not None:
+                heapq.heappush(monticulo, (fila["id"], siguiente_pendiente, fila, filas))
+            siguiente_pendiente += 1
+        if not monticulo:
+            return
+        _, orden, fila, filas = heapq.heappop(monticulo)
+        yield fila
+        fila = next(filas, None)
+        if fila is not None:
+            heapq.heappush(monticulo, (fila["id"], orden, fila, filas))
+
+
+class Archivo:
+    """
+    Registros archivados de la carpeta `carpeta`. Relee el manifiesto cuando
+    cambia (el job corre aparte) y guarda en una LRU los segmentos ya
+    descomprimidos.
+    """
+
+    def __init__(self, carpeta: Path, segmentos_en_memoria: int = SEGMENTOS_EN_MEMORIA):
+        self.carpeta = Path(carpeta)
+        self._segmentos = []
+        self._version = None
+        self._lock = Lock()
+        self._descomprimidos = CacheLRU(segmentos_en_memoria, ttl_segundos=3600)
+
+    def segmentos(self) -> list[dict]:
+        try:
+            version = (self.carpeta / MANIFIESTO).stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._segmentos = [
+                        {
+                            **s,
+                            **{clave: _a_fecha(s[clave]) for clave in ("entrada_min", "entrada_max", "salida_min", "salida_max")},
+                            "placas": set(s["placas"].split()),
+                        }
+                        for s in leer_manifiesto(self.carpeta)["segmentos"]
+                    ]
+                    self._version = version
+        return self._segmentos
+
+    def columnas(self, segmento: dict) -> dict:
+        clave = (segmento["archivo"], segmento["sha256"])
+        columnas = self._descomprimidos.obtener(clave)
+        if columnas is None:
+            with cronometro("lectura_archivo"):
+                columnas = leer_segmento(self.carpeta / segmento["archivo"])
+                for nombre in COLUMNAS_FECHA:
+                    columnas[nombre] = [_a_fecha(valor) for valor in columnas[nombre]]
+            self._descomprimidos.guardar(clave, columnas)
+        return columnas
+
+    def filas(self, desde_id=None, entrada=(None, None), salida=(None, None), placa=None, tipo_cobro=None):
+        """
+        Registros archivados (dicts con las columnas de registros) que cumplen
+        los filtros, ordenados por id. Rangos cerrados; None = sin límite.
+        """
+        entrada = tuple(_sin_zona(v) for v in entrada)
+        salida = tuple(_sin_zona(v) for v in salida)
+        candidatos = [s for s in self.segmentos() if _puede_tener(s, desde_id, entrada, salida, placa)]
+        if not candidatos:
+            return iter(())
+
+        condiciones = []
+        if placa:
+            condiciones.append(("placa_moto", lambda valor: valor == placa))
+        if tipo_cobro:
+            condiciones.append(("tipo_cobro", lambda valor: valor == tipo_cobro))
+        if entrada != (None, None):
+            condiciones.append(("hora_entrada", _en_rango(*entrada)))
+        if salida != (None, None):
+            condiciones.append(("hora_salida", _en_rango(*salida)))
+
+        def abrir(segmento):
+            columnas = self.columnas(segmento)
+            ids = columnas["id"]
+            pruebas = [(columnas[nombre], prueba) for nombre, prueba in condiciones]
+            for i in range(bisect_right(ids, desde_id) if desde_id is not None else 0, len(ids)):
+                if all(prueba(valores[i]) for valores, prueba in pruebas):
+                    yield {nombre: columnas[nombre][i] for nombre in COLUMNAS}
+
+        return _fusion_perezosa(candidatos, abrir)
+
+    def rangos_id(self, salida=(None, None)) -> list[tuple[int, int]]:
+        """(id_min, id_max) de los segmentos que pueden tener salidas en el rango."""
+        salida = tuple(_sin_zona(v) for v in salida)
+        return [(s["id_min"], s["id_max"]) for s in self.segmentos() if _puede_tener(s, None, (None, None), salida, None)]
+
+    def totales(self, desde: datetime, hasta: datetime, tipo_cobro: str | None, incluir_hasta: bool, excluir=frozenset()):
+        """
+        [(tipo_cobro, cantidad, total)] de los archivados que salieron en el
+        rango (como resumen._totales_crudos). `excluir`: ids que siguen en la
+        tabla viva (archivo a medio mover); cuentan allá y no aquí.
+        """
+        hasta = _sin_zona(hasta)
+        acumulado = {}
+        for fila in self.filas(salida=(desde, hasta), tipo_cobro=tipo_cobro):
+            if fila["id"] in excluir or (not incluir_hasta and fila["hora_salida"] == hasta):
+                continue
+            cantidad_total = acumulado.setdefault(fila["tipo_cobro"], [0, 0])
+            cantidad_total[0] += 1
+            cantidad_total[1] += fila["valor_pagado"] or 0
+        return [(tipo, cantidad, total) for tipo, (cantidad, total) in acumulado.items()]
+
+    def resumen_diario(self, excluir=frozenset()):
+        """
+        (fecha, tipo_cobro, cantidad, total) de cada día archivado. Sale del
+        manifiesto sin abrir los segmentos, salvo los que tienen ids de
+        `excluir` (los que siguen en la tabla viva): esos se recorren fila
+        por fila saltándose esos ids.
+        """
+        for segmento in self.segmentos():
+            if any(segmento["id_min"] <= i <= segmento["id_max"] for i in excluir):
+                columnas = self.columnas(segmento)
+                if not excluir.isdisjoint(columnas["id"]):
+                    acumulado = {}
+                    for id_registro, salida, tipo_cobro, valor in zip(
+                        columnas["id"], columnas["hora_salida"], columnas["tipo_cobro"], columnas["valor_pagado"]
+                    ):
+                        if id_registro not in excluir:
+                            cantidad_total = acumulado.setdefault((salida.date(), tipo_cobro), [0, 0])
+                            cantidad_total[0] += 1
+                            cantidad_total[1] += valor or 0
+                    for (fecha, tipo_cobro), (cantidad, total) in acumulado.items():
+                        yield fecha, tipo_cobro, cantidad, total
+                    continue
+            for fecha, tipos in segmento["resumen"].items():
+                for tipo_cobro, (cantidad, total) in tipos.items():
+                    yield date.fromisoformat(fecha), tipo_cobro, cantidad, total
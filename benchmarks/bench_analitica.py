@@ -0,0 +1,117 @@
+# benchmarks/bench_analitica.py
+"""Tiempo de GET /analitica/ocupacion sobre un año de registros.
+
+Siembra el historial con la misma función que carga.py, opcionalmente
+archiva los meses viejos (--archivar), y mide el informe del año en frío
+(primera vez: lee los segmentos) y en caliente. Con --verificar compara la
+ocupación promedio por hora del día contra un recorrido fila por fila de
+los registros (lo que haría un informe con el ORM) y mide ese recorrido.
+
+    python benchmarks/bench_analitica.py [--registros 200000] [--archivar] [--verificar]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from carga import RAIZ, sembrar  # noqa: E402
+
+
+def ocupacion_fila_por_fila(db, archivo, desde: datetime, hasta: datetime, ahora: datetime) -> list[float]:
+    """Promedio de motos adentro por hora del día, recorriendo cada registro hora por hora."""
+    from models import Registro
+
+    segundos = defaultdict(float)
+    filas = [(r.hora_entrada, r.hora_salida) for r in db.query(Registro).filter(
+        Registro.hora_entrada < hasta, (Registro.hora_salida.is_(None)) | (Registro.hora_salida >= desde)
+    )]
+    filas += [(f["hora_entrada"], f["hora_salida"]) for f in archivo.filas(entrada=(None, hasta))
+              if f["hora_salida"] >= desde and f["hora_entrada"] < hasta]
+    for entrada, salida in filas:
+        inicio, fin = max(entrada, desde), min(salida or ahora, hasta)
+        hora = inicio.replace(minute=0, second=0, microsecond=0)
+        while hora < fin:
+            siguiente = hora + timedelta(hours=1)
+            segundos[hora.hour] += (min(fin, siguiente) - max(inicio, hora)).total_seconds()
+            hora = siguiente
+    horas_del_rango = (hasta - desde) // timedelta(hours=1)
+    return [segundos[h] / 3600 / (horas_del_rango / 24) for h in range(24)]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registros", type=int, default=200000, help="registros del año a sembrar")
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--archivar", action="store_true", help="archivar todo menos los últimos 3 meses antes de medir")
+    parser.add_argument("--verificar", action="store_true", help="comparar contra el recorrido fila por fila")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    carpeta = tempfile.TemporaryDirectory(prefix="analitica_parqueadero_")
+    ruta = Path(carpeta.name) / "analitica.db"
+    # Antes de importar database/main: el engine se crea con esta URL
+    os.environ["PARQUEADERO_DATABASE_URL"] = f"sqlite:///{ruta}"
+    os.chdir(RAIZ)
+    sys.path.insert(0, str(RAIZ))
+
+    motos = max(5000, args.registros // 10)
+    print(f"🌱 Sembrando {args.registros} registros en {args.dias} días...")
+    print(f"   listo en {sembrar(args.registros, motos, motos // 2, args.dias, args.semilla):.1f}s")
+
+    from database import SessionLocal, carpeta_archivo, engine
+    from analitica import Analitica, rango_por_defecto
+    from archivo import Archivo, archivar
+
+    if args.archivar:
+        hoy = datetime.now()
+        indice_mes = hoy.year * 12 + hoy.month - 1 - 3
+        corte = datetime(indice_mes // 12, indice_mes % 12 + 1, 1)
+        inicio = time.perf_counter()
+        movidos = sum(movidas for _, movidas in archivar(engine, carpeta_archivo(), corte))
+        print(f"🗄️ {movidos} registros archivados en {time.perf_counter() - inicio:.1f}s")
+
+    ahora = datetime.now()
+    desde, hasta = rango_por_defecto(ahora)
+    archivo = Archivo(carpeta_archivo())
+    analitica = Analitica(archivo)
+    db = SessionLocal()
+
+    inicio = time.perf_counter()
+    informe = analitica.informe(db, desde, hasta, ahora)
+    frio = time.perf_counter() - inicio
+    tiempos = []
+    for _ in range(args.repeticiones):
+        inicio = time.perf_counter()
+        analitica.informe(db, desde, hasta, ahora)
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"📊 {informe['registros']} registros en el año")
+    print(f"   en frío: {frio * 1000:.0f} ms · en caliente: mediana {statistics.median(tiempos) * 1000:.0f} ms, "
+          f"máximo {max(tiempos) * 1000:.0f} ms")
+    pico = informe["horas_pico"][0]
+    print(f"   hora pico: {pico['hora']:%Y-%m-%d %H:00} con {pico['ocupacion']} motos")
+
+    codigo = 0
+    if args.verificar:
+        inicio = time.perf_counter()
+        referencia = ocupacion_fila_por_fila(db, archivo, desde, hasta, ahora)
+        print(f"🐢 Fila por fila: {time.perf_counter() - inicio:.1f}s")
+        diferencia = max(abs(h["ocupacion_promedio"] - r) for h, r in zip(informe["por_hora"], referencia))
+        if diferencia > 0.01:
+            print(f"❌ La ocupación por hora difiere hasta en {diferencia:.3f} motos")
+            codigo = 1
+        else:
+            print("✅ La ocupación por hora coincide con el recorrido fila por fila")
+    db.close()
+    carpeta.cleanup()
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
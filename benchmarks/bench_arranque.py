@@ -0,0 +1,90 @@
+# benchmarks/bench_arranque.py
+"""Tiempo desde `import main` hasta la primera respuesta, con 1, 4 y 16 workers.
+
+Cada worker es un proceso aparte (como los de `uvicorn --workers N`) que
+arranca a la vez que los demás sobre la misma base temporal. Se mide dos
+veces: con la base recién creada (primer despliegue) y al reiniciar sobre
+la base ya preparada.
+
+    python benchmarks/bench_arranque.py [--workers 1 4 16]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def hijo():
+    """Un worker: importa main, corre el lifespan y hace una petición."""
+    inicio = time.perf_counter()
+    sys.path.insert(0, str(RAIZ))
+    import asyncio
+    import httpx
+    import main
+    importado = time.perf_counter()
+
+    async def primera_peticion():
+        async with main.app.router.lifespan_context(main.app):
+            listo = time.perf_counter()
+            transporte = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://arranque") as cliente:
+                respuesta = await cliente.get("/registros/activos/")
+                respuesta.raise_for_status()
+            return listo, time.perf_counter()
+
+    listo, respondido = asyncio.run(primera_peticion())
+    print(json.dumps({
+        "importar": importado - inicio,
+        "lifespan": listo - importado,
+        "primera_respuesta": respondido - inicio,
+    }))
+
+
+def lanzar(workers: int, url: str) -> tuple[float, list[dict]]:
+    entorno = dict(os.environ, PARQUEADERO_DATABASE_URL=url)
+    inicio = time.perf_counter()
+    procesos = [
+        subprocess.Popen([sys.executable, __file__, "--hijo"], cwd=RAIZ, env=entorno,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for _ in range(workers)
+    ]
+    salidas = [p.communicate()[0] for p in procesos]
+    total = time.perf_counter() - inicio
+    tiempos = []
+    for proceso, salida in zip(procesos, salidas):
+        if proceso.returncode != 0:
+            raise RuntimeError(f"un worker terminó con código {proceso.returncode}")
+        tiempos.append(json.loads(salida.strip().splitlines()[-1]))
+    return total, tiempos
+
+
+def imprimir(etiqueta: str, workers: int, total: float, tiempos: list[dict]):
+    mediana = lambda clave: statistics.median(t[clave] for t in tiempos) * 1000
+    peor = max(t["primera_respuesta"] for t in tiempos) * 1000
+    print(f"{workers:>3} workers | {etiqueta:<10} | importar {mediana('importar'):7.1f} ms | "
+          f"lifespan {mediana('lifespan'):7.1f} ms | primera respuesta {mediana('primera_respuesta'):7.1f} ms "
+          f"(peor {peor:7.1f} ms) | todos listos en {total * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.hijo:
+        hijo()
+        sys.exit(0)
+
+    print("🚀 Arranque: import main -> primera respuesta (medianas por worker)")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as carpeta:
+            url = f"sqlite:///{carpeta}/arranque.db"
+            imprimir("base nueva", workers, *lanzar(workers, url))
+            imprimir("reinicio", workers, *lanzar(workers, url))
@@ -0,0 +1,128 @@
+# benchmarks/bench_async.py
+"""Rutas sync (Session + pool de hilos) contra rutas async (AsyncSession + aiosqlite).
+
+Levanta uvicorn con uvloop una vez por motor (PARQUEADERO_MOTOR_BD=sync|async),
+cada uno sobre una base temporal nueva, y mide peticiones por segundo y
+latencias p50/p99 de ingreso, consulta de moto, registros activos, cuadre
+del día y salida con `--concurrencia` clientes a la vez.
+
+    python benchmarks/bench_async.py [--motos 1000] [--concurrencia 64]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def levantar(motor: str, url: str, puerto: int):
+    entorno = dict(os.environ, PARQUEADERO_DATABASE_URL=url, PARQUEADERO_MOTOR_BD=motor)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--loop", "uvloop", "--port", str(puerto),
+         "--log-level", "warning", "--timeout-keep-alive", "60"],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def esperar(cliente: httpx.AsyncClient):
+    for _ in range(200):
+        try:
+            if (await cliente.get("/cache/estadisticas")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn no respondió")
+
+
+async def carga(cliente, peticiones, concurrencia: int):
+    """Ejecuta [(método, url, kwargs)] con `concurrencia` peticiones en vuelo. Devuelve (duración, latencias)."""
+    cola = iter(peticiones)
+    latencias = []
+    errores = 0
+
+    async def trabajador():
+        nonlocal errores
+        for metodo, url, kwargs in cola:
+            inicio = time.perf_counter()
+            respuesta = await cliente.request(metodo, url, **kwargs)
+            latencias.append(time.perf_counter() - inicio)
+            errores += respuesta.status_code != 200
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    if errores:
+        raise RuntimeError(f"{errores} respuestas con error")
+    return duracion, latencias
+
+
+def placa(i: int) -> str:
+    """Placa válida (AAA00) distinta para cada i < 26 * 26 * 100."""
+    return f"B{chr(65 + i // 2600)}{chr(65 + i // 100 % 26)}{i % 100:02d}"
+
+
+def percentil(valores, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def medir(motor: str, num_motos: int, concurrencia: int):
+    puerto = puerto_libre()
+    with tempfile.TemporaryDirectory() as carpeta:
+        servidor = levantar(motor, f"sqlite:///{carpeta}/bench.db", puerto)
+        limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}", limits=limites, timeout=60) as cliente:
+                await esperar(cliente)
+                await cliente.post("/propietarios/", params={"nombre": "Bench", "apellido": "Async", "telefono": "3000000000"})
+                placas = [placa(i) for i in range(num_motos)]
+                await carga(cliente, [
+                    ("POST", "/motos/", {"params": {"placa": p, "propietario_telefono": "3000000000"}}) for p in placas
+                ], concurrencia)
+
+                escenarios = [
+                    ("ingreso", [("POST", "/registrar_ingreso", {"json": {"placa": p, "num_cascos": 1 if i < 50 else 0}}) for i, p in enumerate(placas)]),
+                    ("consulta moto", [("GET", f"/motos/{p}", {}) for p in placas]),
+                    ("activos", [("GET", "/registros/activos/", {})] * max(50, num_motos // 20)),
+                    ("cuadre hoy", [("GET", "/cuadre_caja/hoy", {"params": {"incluir_detalles": "false"}})] * num_motos),
+                    ("salida", [("POST", "/registros/salida/", {"params": {"placa_moto": p}}) for p in placas]),
+                ]
+                resultados = []
+                for nombre, peticiones in escenarios:
+                    duracion, latencias = await carga(cliente, peticiones, concurrencia)
+                    resultados.append((nombre, len(peticiones) / duracion, statistics.median(latencias), percentil(latencias, 0.99)))
+                return resultados
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+
+async def principal(num_motos: int, concurrencia: int):
+    print(f"🏍️ {num_motos} motos, {concurrencia} clientes concurrentes, uvicorn --loop uvloop")
+    for motor in ("sync", "async"):
+        for nombre, por_segundo, p50, p99 in await medir(motor, num_motos, concurrencia):
+            print(f"{motor:>5} | {nombre:<14} | {por_segundo:8.0f} req/s | p50 {p50 * 1000:7.1f} ms | p99 {p99 * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--motos", type=int, default=1000)
+    parser.add_argument("--concurrencia", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(principal(args.motos, args.concurrencia))
@@ -0,0 +1,99 @@
+# benchmarks/bench_diario.py
+"""Ingresos y salidas por segundo con el diario de eventos y distintas ventanas.
+
+Levanta uvicorn una vez por escenario, cada uno sobre una base temporal nueva
+con su config.json, y mide ingresos y después salidas con `--concurrencia`
+clientes a la vez:
+
+- WAL + synchronous=NORMAL sin diario: rápido, pero una caída de la máquina
+  puede perder los últimos commits;
+- WAL + synchronous=FULL sin diario: un fsync por operación;
+- WAL + NORMAL con el diario y cada ventana de `--ventanas`: un fsync por
+  tanda de eventos; la respuesta sale con su evento en disco.
+
+    python benchmarks/bench_diario.py [--motos 2000] [--concurrencia 32] [--ventanas 0,1,2,5,10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_async import RAIZ, carga, esperar, percentil, placa, puerto_libre  # noqa: E402
+
+
+def escenarios(ventanas: list[float]) -> list[tuple[str, dict]]:
+    """(nombre, cambios a config.json) de cada medición."""
+    apagado = {"activo": False}
+    return [
+        ("sin diario, NORMAL", {"sqlite": {"synchronous": "NORMAL"}, "diario": apagado}),
+        ("sin diario, FULL", {"sqlite": {"synchronous": "FULL"}, "diario": apagado}),
+    ] + [
+        (f"diario {ventana:g} ms", {"sqlite": {"synchronous": "NORMAL"}, "diario": {"activo": True, "ventana_ms": ventana}})
+        for ventana in ventanas
+    ]
+
+
+async def medir(puerto: int, num_motos: int, concurrencia: int):
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}", limits=limites, timeout=60) as cliente:
+        await esperar(cliente)
+        await cliente.post("/propietarios/", params={"nombre": "Bench", "apellido": "Diario", "telefono": "3000000000"})
+        placas = [placa(i) for i in range(num_motos)]
+        await carga(cliente, [
+            ("POST", "/motos/", {"params": {"placa": p, "propietario_telefono": "3000000000"}}) for p in placas
+        ], concurrencia)
+        resultados = []
+        for nombre, peticiones in (
+            ("ingreso", [("POST", "/registrar_ingreso", {"json": {"placa": p, "num_cascos": 0}}) for p in placas]),
+            ("salida", [("POST", "/registros/salida/", {"params": {"placa_moto": p}}) for p in placas]),
+        ):
+            duracion, latencias = await carga(cliente, peticiones, concurrencia)
+            resultados.append((nombre, len(peticiones) / duracion, statistics.median(latencias), percentil(latencias, 0.99)))
+        return resultados
+
+
+def correr(cambios: dict, num_motos: int, concurrencia: int):
+    with tempfile.TemporaryDirectory(prefix="diario_parqueadero_") as carpeta:
+        ruta = Path(carpeta)
+        config = json.loads((RAIZ / "config.json").read_text(encoding="utf-8"))
+        config["perfil_sqlite"] = "produccion"
+        config.update(cambios)
+        (ruta / "config.json").write_text(json.dumps(config), encoding="utf-8")
+        (ruta / "lotes.json").write_text(json.dumps({"bench": {"url": f"sqlite:///{ruta}/diario.db"}}), encoding="utf-8")
+        puerto = puerto_libre()
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+            cwd=RAIZ, env=dict(os.environ, PARQUEADERO_LOTES=str(ruta / "lotes.json")),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            return asyncio.run(medir(puerto, num_motos, concurrencia))
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--motos", type=int, default=2000, help="motos que entran y salen en cada escenario")
+    parser.add_argument("--concurrencia", type=int, default=32, help="clientes de portería a la vez")
+    parser.add_argument("--ventanas", default="0,1,2,5,10", help="ventanas del diario a medir, en ms")
+    args = parser.parse_args()
+
+    ventanas = [float(v) for v in args.ventanas.split(",") if v]
+    print(f"🏍️ {args.motos} motos, {args.concurrencia} clientes de portería, perfil produccion (WAL)")
+    for nombre, cambios in escenarios(ventanas):
+        for operacion, por_segundo, p50, p99 in correr(cambios, args.motos, args.concurrencia):
+            print(f"{nombre:>18} | {operacion:<7} | {por_segundo:7.0f} op/s | p50 {p50 * 1000:7.1f} ms | p99 {p99 * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,139 @@
+# benchmarks/bench_reportes.py
+"""Latencia de la portería mientras la caja corre reportes largos.
+
+Siembra un año de historial con la misma función que carga.py, levanta
+uvicorn sobre esa base y mide ingresos y salidas (p50/p99) dos veces: solos
+y con `--reportes` clientes que piden sin parar cuadres del año con detalles
+y exportaciones CSV de /registros/. Los reportes van por el engine de solo
+lectura (SessionLocal.lectura()); la portería no debería notarlos.
+
+    python benchmarks/bench_reportes.py [--registros 200000] [--reportes 24] [--perfil produccion]
+    python benchmarks/bench_reportes.py --perfil desarrollo --copia-segundos 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_async import esperar, percentil, puerto_libre  # noqa: E402
+from carga import RAIZ, placa, sembrar  # noqa: E402
+
+
+async def porteria(cliente, placas: list[str], concurrencia: int) -> list[float]:
+    """Ingreso y salida de cada placa; latencias de todas las peticiones."""
+    cola = iter(placas)
+    latencias = []
+
+    async def trabajador():
+        for p in cola:
+            for metodo, url, kwargs in (
+                ("POST", "/registrar_ingreso", {"json": {"placa": p, "num_cascos": 1}}),
+                ("POST", "/registros/salida/", {"params": {"placa_moto": p}}),
+            ):
+                inicio = time.perf_counter()
+                respuesta = await cliente.request(metodo, url, **kwargs)
+                latencias.append(time.perf_counter() - inicio)
+                if respuesta.status_code != 200:
+                    raise RuntimeError(f"{url}: {respuesta.status_code} {respuesta.text[:200]}")
+
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    return latencias
+
+
+async def reportes(cliente, numero: int, hechos: list):
+    """Cuadre del año con 1000 detalles o exportación CSV completa, uno tras otro hasta que se cancele."""
+    hasta = datetime.now()
+    cuadre = {"fecha_inicio": (hasta - timedelta(days=365)).isoformat(), "fecha_fin": hasta.isoformat(), "limite": 1000}
+    while True:
+        if numero % 2:
+            respuesta = await cliente.get("/cuadre_caja", params=cuadre)
+        else:
+            async with cliente.stream("GET", "/registros/", params={"formato": "csv"}) as respuesta:
+                async for _ in respuesta.aiter_bytes():
+                    pass
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"reporte: {respuesta.status_code}")
+        hechos.append(numero)
+
+
+async def medir(puerto: int, placas: list[str], concurrencia: int, clientes_reportes: int) -> tuple[list[float], int]:
+    limites = httpx.Limits(max_connections=concurrencia + clientes_reportes + 4)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}", limits=limites, timeout=120) as cliente:
+        await esperar(cliente)
+        hechos = []
+        tareas = [asyncio.create_task(reportes(cliente, n, hechos)) for n in range(clientes_reportes)]
+        if tareas:
+            await asyncio.sleep(1)  # que los reportes ya estén corriendo
+        latencias = await porteria(cliente, placas, concurrencia)
+        # Los reportes que siguen en cola no cuentan: se cancelan
+        for tarea in tareas:
+            tarea.cancel()
+        fallas = [r for r in await asyncio.gather(*tareas, return_exceptions=True) if isinstance(r, Exception)]
+        if fallas:
+            raise fallas[0]
+        return latencias, len(hechos)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registros", type=int, default=200000, help="registros del año a sembrar")
+    parser.add_argument("--motos", type=int, default=400, help="motos que entran y salen en cada medición")
+    parser.add_argument("--concurrencia", type=int, default=8, help="clientes de portería a la vez")
+    parser.add_argument("--reportes", type=int, default=24, help="clientes de reportes a la vez")
+    parser.add_argument("--perfil", default="produccion", help="perfil_sqlite de config.json")
+    parser.add_argument("--copia-segundos", type=float, help="lectura_copia_segundos: reportes sobre una copia de la base")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    carpeta = tempfile.TemporaryDirectory(prefix="reportes_parqueadero_")
+    ruta = Path(carpeta.name)
+    config = json.loads((RAIZ / "config.json").read_text(encoding="utf-8"))
+    config["perfil_sqlite"] = args.perfil
+    if args.copia_segundos:
+        config["sqlite"] = {**config.get("sqlite", {}), "lectura_copia_segundos": args.copia_segundos}
+    (ruta / "config.json").write_text(json.dumps(config), encoding="utf-8")
+    (ruta / "lotes.json").write_text(json.dumps({"bench": {"url": f"sqlite:///{ruta}/reportes.db"}}), encoding="utf-8")
+    # Antes de importar database: el lote de la siembra y de uvicorn es este
+    os.environ["PARQUEADERO_LOTES"] = str(ruta / "lotes.json")
+    os.chdir(RAIZ)
+    sys.path.insert(0, str(RAIZ))
+
+    motos = max(5000, args.registros // 10)
+    print(f"🌱 Sembrando {args.registros} registros en 365 días...")
+    print(f"   listo en {sembrar(args.registros, motos, motos // 2, 365, args.semilla):.1f}s")
+    # Placas sin registro activo: la siembra las deja todas afuera
+    rondas = [[placa(i) for i in range(inicio, inicio + args.motos)] for inicio in (0, args.motos, 2 * args.motos)]
+
+    puerto = puerto_libre()
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=RAIZ, env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    lectura = f"copia cada {args.copia_segundos:g}s" if args.copia_segundos else "mode=ro sobre la base"
+    print(f"🏍️ perfil {args.perfil}, reportes: {lectura}; {args.concurrencia} clientes de portería")
+    try:
+        # Calentamiento: el primer checkpoint del WAL de la siembra y los imports perezosos no cuentan
+        asyncio.run(medir(puerto, rondas[0][:50], args.concurrencia, 0))
+        for nombre, placas, clientes in (("sola", rondas[1], 0), (f"+{args.reportes} reportes", rondas[2], args.reportes)):
+            latencias, hechos = asyncio.run(medir(puerto, placas, args.concurrencia, clientes))
+            print(f"   portería {nombre:<13} | p50 {statistics.median(latencias) * 1000:7.1f} ms | "
+                  f"p99 {percentil(latencias, 0.99) * 1000:7.1f} ms | máx {max(latencias) * 1000:7.1f} ms"
+                  + (f" | {hechos} reportes" if clientes else ""))
+    finally:
+        servidor.terminate()
+        servidor.wait()
+        carpeta.cleanup()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,75 @@
+# benchmarks/bench_sqlite.py
+"""Commits por segundo con cada perfil de SQLite de database.py.
+
+    python benchmarks/bench_sqlite.py [--commits 2000] [--hilos 4]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database import Base, PERFILES_SQLITE, crear_engine
+from models import Casillero, Moto, Propietario, Registro
+
+
+def preparar(url: str, perfil: dict):
+    engine = crear_engine(url, perfil)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    db.add(Propietario(telefono=3000000000, nombre="BENCH", apellido="SQLITE"))
+    db.add(Casillero(numero=1, disponible=True, cascos_ocupados=0))
+    db.add_all(Moto(placa=f"BEN{i:02d}", propietario_telefono=3000000000) for i in range(100))
+    db.commit()
+    db.close()
+    return engine, Session
+
+
+def commits(Session, cantidad: int, desplazamiento: int) -> int:
+    """Un check-in simulado por commit (insertar registro + tocar el casillero). Devuelve los 'database is locked'."""
+    db = Session()
+    bloqueos = 0
+    hechos = 0
+    while hechos < cantidad:
+        try:
+            db.add(Registro(placa_moto=f"BEN{(desplazamiento + hechos) % 100:02d}", hora_entrada=datetime.now(), cascos=1, id_casillero=1))
+            casillero = db.get(Casillero, 1)
+            casillero.cascos_ocupados = (casillero.cascos_ocupados or 0) + 1
+            db.commit()
+            hechos += 1
+        except OperationalError:
+            db.rollback()
+            bloqueos += 1
+    db.close()
+    return bloqueos
+
+
+def medir(nombre: str, total: int, hilos: int) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as carpeta:
+        engine, Session = preparar(f"sqlite:///{carpeta}/bench.db", PERFILES_SQLITE[nombre])
+        por_hilo = total // hilos
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            bloqueos = sum(pool.map(lambda h: commits(Session, por_hilo, h * por_hilo), range(hilos)))
+        duracion = time.perf_counter() - inicio
+        engine.dispose()
+    return por_hilo * hilos / duracion, bloqueos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--hilos", type=int, default=4)
+    args = parser.parse_args()
+
+    resultados = {nombre: medir(nombre, args.commits, args.hilos) for nombre in PERFILES_SQLITE}
+    base = resultados["desarrollo"][0]
+    for nombre, (por_segundo, bloqueos) in resultados.items():
+        print(f"{nombre:12s} {por_segundo:10.1f} commits/s  (x{por_segundo / base:.2f})  'database is locked': {bloqueos}")
@@ -0,0 +1,125 @@
+# benchmarks/bench_tablero.py
+"""Cientos de pantallas conectadas a /ws/ocupacion mientras entran y salen motos.
+
+Levanta uvicorn sobre una base temporal, abre `--pantallas` WebSockets,
+hace ingresos y salidas por HTTP y mide cuánto tarda cada delta en llegar
+a todas las pantallas. Al final cada pantalla, aplicando solo los deltas
+sobre su instantánea inicial, debe coincidir con una instantánea nueva.
+
+    python benchmarks/bench_tablero.py [--pantallas 300] [--motos 200]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import websockets
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_async import esperar, levantar, placa, puerto_libre  # noqa: E402
+
+
+class Pantalla:
+    """Estado que reconstruiría una pantalla de portería a partir de los eventos."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.estado = None
+        self.llegadas = {}  # seq -> momento de llegada
+
+    def aplicar(self, evento: dict):
+        if evento["evento"] == "instantanea":
+            self.estado = {"seq": evento["seq"], "activos": evento["activos"],
+                           "casilleros": dict(evento["casilleros"]), "recaudo_hoy": evento["recaudo_hoy"]}
+            return
+        if evento["seq"] <= self.estado["seq"]:
+            return
+        self.estado["seq"] = evento["seq"]
+        self.estado["activos"] = evento["activos"]
+        self.estado["casilleros"].update(evento.get("casilleros", {}))
+        if "recaudo_hoy" in evento:
+            self.estado["recaudo_hoy"] = evento["recaudo_hoy"]
+
+    async def escuchar(self, conectadas: asyncio.Event, total: list, ultimo_seq: int):
+        async with websockets.connect(self.url, max_queue=None) as ws:
+            self.aplicar(json.loads(await ws.recv()))
+            total.append(self)
+            if len(total) == total[0]:
+                conectadas.set()
+            while True:
+                evento = json.loads(await ws.recv())
+                self.llegadas[evento["seq"]] = time.perf_counter()
+                self.aplicar(evento)
+                if self.estado["seq"] >= ultimo_seq:
+                    return
+
+
+async def principal(pantallas: int, motos: int):
+    puerto = puerto_libre()
+    with tempfile.TemporaryDirectory() as carpeta:
+        servidor = levantar("sync", f"sqlite:///{carpeta}/tablero.db", puerto)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}", timeout=60) as cliente:
+                await esperar(cliente)
+                await cliente.post("/propietarios/", params={"nombre": "Bench", "apellido": "Tablero", "telefono": "3000000000"})
+                placas = [placa(i) for i in range(motos)]
+                for p in placas:
+                    await cliente.post("/motos/", params={"placa": p, "propietario_telefono": "3000000000"})
+
+                conectadas = asyncio.Event()
+                lista = [pantallas]  # el primer elemento es el total esperado
+                url = f"ws://127.0.0.1:{puerto}/ws/ocupacion"
+                tablero = [Pantalla(url) for _ in range(pantallas)]
+                tareas = [asyncio.create_task(p.escuchar(conectadas, lista, 2 * motos)) for p in tablero]
+                await asyncio.wait_for(conectadas.wait(), 120)
+                print(f"📺 {pantallas} pantallas conectadas")
+
+                enviados = {}
+                inicio = time.perf_counter()
+                # Base nueva: la secuencia arranca en 0 y cada petición publica un delta
+                for i, p in enumerate(placas + placas):
+                    if i < motos:
+                        respuesta = await cliente.post("/registrar_ingreso", json={"placa": p, "num_cascos": i % 3 if i < 60 else 0})
+                    else:
+                        respuesta = await cliente.post("/registros/salida/", params={"placa_moto": p})
+                    respuesta.raise_for_status()
+                    enviados[i + 1] = time.perf_counter()
+                await asyncio.wait_for(asyncio.gather(*tareas), 300)
+                duracion = time.perf_counter() - inicio
+
+                retrasos = [
+                    llegada - enviados[seq]
+                    for pantalla in tablero for seq, llegada in pantalla.llegadas.items() if seq in enviados
+                ]
+                retrasos.sort()
+                print(f"✉️  {len(retrasos)} deltas entregados en {duracion:.2f}s ({len(retrasos) / duracion:.0f}/s)")
+                print(f"⏱️  retraso respuesta HTTP -> pantalla: p50 {statistics.median(retrasos) * 1000:.1f} ms, "
+                      f"p99 {retrasos[int(len(retrasos) * 0.99)] * 1000:.1f} ms")
+
+                async with websockets.connect(url) as ws:
+                    final = json.loads(await ws.recv())
+                distintas = sum(
+                    p.estado["activos"] != final["activos"] or p.estado["casilleros"] != final["casilleros"]
+                    for p in tablero
+                )
+                if distintas:
+                    print(f"❌ {distintas} pantallas no coinciden con la instantánea final")
+                    return 1
+                print("✅ Todas las pantallas coinciden con la instantánea final.")
+                return 0
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pantallas", type=int, default=300)
+    parser.add_argument("--motos", type=int, default=200)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(principal(args.pantallas, args.motos)))
@@ -0,0 +1,291 @@
+# benchmarks/carga.py
+"""Prueba de carga de los flujos de portería y caja, con resultados en JSON.
+
+Siembra propietarios, motos e historial sintéticos (de 10k a 1M registros)
+en una base temporal, levanta la app en el mismo proceso (httpx +
+ASGITransport, con su lifespan) y recorre estos escenarios:
+
+    ingreso   POST /registrar_ingreso de motos que están afuera
+    mixto     tráfico de portería: ingresos, salidas y cuadre del día mezclados
+    salida    POST /registros/salida/ de las motos que quedaron adentro
+    cuadre    GET /cuadre_caja sobre ventanas de 1 a 31 días del historial
+
+Para cada uno reporta peticiones/s, latencias p50/p95/p99, consultas SQL
+por petición y los códigos HTTP. Con --comparar se contrasta contra un JSON
+anterior (otro commit) y el proceso sale con código 1 si algo empeoró más
+que --umbral.
+
+    python benchmarks/carga.py --registros 100000 --peticiones 2000
+    python benchmarks/carga.py --registros 100000 --comparar benchmarks/resultados/abc1234.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+LETRAS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+TIPOS_COBRO = ["por_horas"] * 8 + ["por_dia"] + ["mensualidad"]
+TAMANO_LOTE = 50000
+
+
+def placa(i: int) -> str:
+    """Placa válida (AAA00) distinta para cada i < 26**3 * 100."""
+    bloque = i // 100
+    return f"{LETRAS[bloque // 676 % 26]}{LETRAS[bloque // 26 % 26]}{LETRAS[bloque % 26]}{i % 100:02d}"
+
+
+def commit_actual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True).stdout.strip() or "desconocido"
+    except OSError:
+        return "desconocido"
+
+
+# --- Siembra de datos sintéticos ---
+def sembrar(registros: int, motos: int, propietarios: int, dias: int, semilla: int) -> float:
+    """Inserta los datos con INSERT masivos y reconstruye el resumen diario. Devuelve los segundos."""
+    from sqlalchemy import insert
+    from database import Base, SessionLocal, engine
+    from migraciones import preparar_esquema
+    import models
+    import resumen
+
+    inicio = time.perf_counter()
+    preparar_esquema(Base.metadata, engine)
+    azar = random.Random(semilla)
+    ahora = datetime.now().replace(microsecond=0)
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.Propietario), [
+            {"telefono": 3000000000 + i, "nombre": "CARGA", "apellido": f"P{i}"} for i in range(propietarios)
+        ])
+        conn.execute(insert(models.Moto), [
+            {"placa": placa(i), "propietario_telefono": 3000000000 + i % propietarios, "tipo_vehiculo": "moto"}
+            for i in range(motos)
+        ])
+        # Como en producción, los id crecen con la hora de entrada
+        paso = (dias * 86400 - 86400) / registros
+        for desde in range(0, registros, TAMANO_LOTE):
+            lote = []
+            for n in range(desde, min(desde + TAMANO_LOTE, registros)):
+                entrada = ahora - timedelta(days=dias) + timedelta(seconds=n * paso + azar.random() * paso)
+                salida = entrada + timedelta(minutes=azar.randrange(10, 600))
+                tipo_cobro = azar.choice(TIPOS_COBRO)
+                valor = {"por_horas": 1100 * ((salida - entrada).seconds // 3600 + 1), "por_dia": 7000}.get(tipo_cobro, 45000)
+                lote.append({
+                    "placa_moto": placa(azar.randrange(motos)),
+                    "hora_entrada": entrada,
+                    "hora_salida": salida,
+                    "valor_pagado": valor,
+                    "cascos": 0,
+                    "tipo_cobro": tipo_cobro,
+                })
+            conn.execute(insert(models.Registro), lote)
+        conn.exec_driver_sql("ANALYZE")
+
+    db = SessionLocal()
+    resumen.reconstruir(db)
+    db.commit()
+    db.close()
+    return time.perf_counter() - inicio
+
+
+# --- Tráfico ---
+def percentil(ordenados, p: float) -> float:
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def correr(cliente, peticiones, concurrencia: int, consultas) -> dict:
+    """Lanza [(método, url, kwargs)] con `concurrencia` en vuelo y resume latencias, consultas y códigos."""
+    cola = iter(peticiones)
+    latencias = []
+    codigos = {}
+
+    async def trabajador():
+        for metodo, url, kwargs in cola:
+            inicio = time.perf_counter()
+            respuesta = await cliente.request(metodo, url, **kwargs)
+            latencias.append(time.perf_counter() - inicio)
+            codigos[respuesta.status_code] = codigos.get(respuesta.status_code, 0) + 1
+
+    consultas_antes = next(consultas)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    consultas_hechas = next(consultas) - consultas_antes - 1
+    latencias.sort()
+    total = len(latencias)
+    return {
+        "peticiones": total,
+        "segundos": round(duracion, 3),
+        "peticiones_por_segundo": round(total / duracion, 1),
+        "p50_ms": round(percentil(latencias, 0.50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 0.95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 0.99) * 1000, 2),
+        "consultas_por_peticion": round(consultas_hechas / total, 2),
+        "codigos": {str(codigo): cantidad for codigo, cantidad in sorted(codigos.items())},
+    }
+
+
+def ingreso(p: str, azar: random.Random):
+    # Pocos traen casco: con 50 casilleros de 2 la capacidad se agota rápido
+    return ("POST", "/registrar_ingreso", {"json": {"placa": p, "num_cascos": 1 if azar.random() < 0.1 else 0}})
+
+
+def salida(p: str):
+    return ("POST", "/registros/salida/", {"params": {"placa_moto": p}})
+
+
+async def escenarios(args) -> dict:
+    import httpx
+    import main
+    from sqlalchemy import event
+
+    # Contador de sentencias SQL (sync y, si está activo, el engine async)
+    consultas = itertools.count()
+    engines = [main.engine] + ([main.engine_async.sync_engine] if main.engine_async is not None else [])
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", lambda *a: next(consultas))
+
+    azar = random.Random(args.semilla + 1)
+    placas = [placa(i) for i in azar.sample(range(args.motos), min(args.motos, 2 * args.peticiones))]
+    entran, fuera = placas[:args.peticiones // 2], placas[args.peticiones // 2:]
+    resultados = {}
+
+    async with main.app.router.lifespan_context(main.app):
+        # Un error de la app cuenta como 500 en el reporte en vez de cortar la corrida
+        transporte = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://carga", timeout=120) as cliente:
+            resultados["ingreso"] = await correr(cliente, [ingreso(p, azar) for p in entran], args.concurrencia, consultas)
+
+            # Portería real: sale la mitad de los que están adentro, entran otros y la caja mira el día
+            mixto = [salida(p) for p in entran[::2]] + [ingreso(p, azar) for p in fuera]
+            mixto += [("GET", "/cuadre_caja/hoy", {"params": {"incluir_detalles": "false"}})] * (len(mixto) // 10)
+            azar.shuffle(mixto)
+            resultados["mixto"] = await correr(cliente, mixto, args.concurrencia, consultas)
+
+            adentro = entran[1::2] + fuera
+            resultados["salida"] = await correr(cliente, [salida(p) for p in adentro], args.concurrencia, consultas)
+
+            hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            cuadres = []
+            for _ in range(max(50, args.peticiones // 10)):
+                inicio = hoy - timedelta(days=azar.randrange(1, args.dias))
+                fin = inicio + timedelta(days=azar.randrange(1, 32))
+                cuadres.append(("GET", "/cuadre_caja", {"params": {
+                    "fecha_inicio": inicio.isoformat(), "fecha_fin": fin.isoformat(), "incluir_detalles": "false",
+                }}))
+            resultados["cuadre"] = await correr(cliente, cuadres, args.concurrencia, consultas)
+    return resultados
+
+
+# --- Reporte y comparación ---
+def imprimir(resultados: dict):
+    for nombre, r in resultados.items():
+        codigos = ", ".join(f"{c}×{n}" for c, n in r["codigos"].items())
+        print(f"{nombre:<8} | {r['peticiones_por_segundo']:8.1f} req/s | p50 {r['p50_ms']:7.1f} | p95 {r['p95_ms']:7.1f} | "
+              f"p99 {r['p99_ms']:7.1f} ms | {r['consultas_por_peticion']:5.1f} consultas/pet | {codigos}")
+
+
+def comparar(actual: dict, anterior: dict, umbral: float) -> int:
+    """Imprime la variación contra otra corrida; devuelve cuántas métricas empeoraron más que `umbral`."""
+    print(f"\n📊 Comparación con {anterior['commit']} ({anterior['fecha']})")
+    if anterior["escala"] != actual["escala"]:
+        print("⚠️ Las escalas no coinciden; la comparación es orientativa.")
+    regresiones = 0
+    for nombre, r in actual["escenarios"].items():
+        previo = anterior["escenarios"].get(nombre)
+        if previo is None:
+            continue
+        cambios = []
+        # (métrica, True si más alto es mejor)
+        for metrica, mas_es_mejor in (("peticiones_por_segundo", True), ("p99_ms", False), ("consultas_por_peticion", False)):
+            antes, ahora = previo[metrica], r[metrica]
+            variacion = (ahora - antes) / antes if antes else 0.0
+            peor = -variacion if mas_es_mejor else variacion
+            marca = "❌" if peor > umbral else "  "
+            regresiones += peor > umbral
+            cambios.append(f"{marca}{metrica} {antes} → {ahora} ({variacion:+.1%})")
+        print(f"{nombre:<8} | " + " | ".join(cambios))
+    return regresiones
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registros", type=int, default=10000, help="registros históricos a sembrar (10k a 1M)")
+    parser.add_argument("--motos", type=int, default=None, help="por defecto registros / 10, mínimo 5000")
+    parser.add_argument("--propietarios", type=int, default=None, help="por defecto motos / 2")
+    parser.add_argument("--dias", type=int, default=365, help="días de historial")
+    parser.add_argument("--peticiones", type=int, default=2000, help="ingresos del primer escenario")
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--base", help="archivo SQLite a usar; si ya existe no se vuelve a sembrar")
+    parser.add_argument("--salida", help="JSON de resultados (por defecto benchmarks/resultados/<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    parser.add_argument("--umbral", type=float, default=0.10, help="empeoramiento tolerado al comparar (0.10 = 10%%)")
+    args = parser.parse_args()
+    args.motos = args.motos or max(5000, args.registros // 10)
+    args.propietarios = args.propietarios or max(1, args.motos // 2)
+    if args.motos < 2 * args.peticiones:
+        parser.error("--motos debe ser al menos el doble de --peticiones")
+
+    carpeta = None
+    if args.base:
+        ruta = Path(args.base).resolve()
+    else:
+        carpeta = tempfile.TemporaryDirectory(prefix="carga_parqueadero_")
+        ruta = Path(carpeta.name) / "carga.db"
+    sembrada = ruta.exists()
+    # Antes de importar database/main: el engine se crea con esta URL
+    os.environ["PARQUEADERO_DATABASE_URL"] = f"sqlite:///{ruta}"
+    os.chdir(RAIZ)
+    sys.path.insert(0, str(RAIZ))
+
+    siembra = None
+    if not sembrada:
+        print(f"🌱 Sembrando {args.registros} registros, {args.motos} motos, {args.propietarios} propietarios...")
+        siembra = sembrar(args.registros, args.motos, args.propietarios, args.dias, args.semilla)
+        print(f"   listo en {siembra:.1f}s")
+
+    resultados = asyncio.run(escenarios(args))
+    imprimir(resultados)
+
+    corrida = {
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "motor_bd": os.getenv("PARQUEADERO_MOTOR_BD", "config"),
+        "escala": {
+            "registros": args.registros, "motos": args.motos, "propietarios": args.propietarios,
+            "dias": args.dias, "peticiones": args.peticiones, "concurrencia": args.concurrencia,
+        },
+        "siembra_segundos": round(siembra, 2) if siembra is not None else None,
+        "escenarios": resultados,
+    }
+    destino = Path(args.salida) if args.salida else RAIZ / "benchmarks" / "resultados" / f"{corrida['commit']}.json"
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_text(json.dumps(corrida, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"💾 Resultados en {destino}")
+
+    codigo = 0
+    if args.comparar:
+        anterior = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        if comparar(corrida, anterior, args.umbral):
+            codigo = 1
+    if carpeta is not None:
+        carpeta.cleanup()
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
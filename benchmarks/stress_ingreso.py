@@ -0,0 +1,137 @@
+# benchmarks/stress_ingreso.py
+"""Ingresos y salidas concurrentes contra /registrar_ingreso y /registros/salida/.
+
+Lanza cientos de peticiones en paralelo sobre una base temporal y verifica
+que ningún casillero supere capacidad_por_casillero, que la ocupación de
+la base coincida con el índice en memoria y que ninguna placa quede con
+dos registros activos.
+
+    python benchmarks/stress_ingreso.py [--motos 400] [--rondas 3] [--claves]
+
+Con --claves cada petición lleva su propia Idempotency-Key, como las que
+manda la página de ingreso.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+def preparar_entorno():
+    carpeta = tempfile.mkdtemp(prefix="stress_parqueadero_")
+    os.environ["PARQUEADERO_DATABASE_URL"] = f"sqlite:///{carpeta}/stress.db"
+    os.chdir(RAIZ)  # main.py monta static/ y templates/ relativos al directorio actual
+
+
+async def rafaga(cliente, peticiones, claves: bool = False):
+    async def una(metodo, url, **kwargs):
+        if claves:
+            kwargs["headers"] = {"Idempotency-Key": str(uuid.uuid4())}
+        respuesta = await cliente.request(metodo, url, **kwargs)
+        return respuesta.status_code
+    return await asyncio.gather(*(una(*p[:2], **p[2]) for p in peticiones))
+
+
+def verificar(main):
+    from sqlalchemy import func
+    import models
+
+    db = main.SessionLocal()
+    errores = []
+    capacidad = main.indice_casilleros.capacidad
+    activos = dict(
+        db.query(models.AsignacionCasillero.id_casillero, func.sum(models.AsignacionCasillero.cascos))
+        .join(models.Registro)
+        .filter(models.Registro.hora_salida.is_(None))
+        .group_by(models.AsignacionCasillero.id_casillero)
+        .all()
+    )
+    for casillero in db.query(models.Casillero).all():
+        ocupados = casillero.cascos_ocupados or 0
+        if ocupados > capacidad:
+            errores.append(f"casillero {casillero.numero}: {ocupados} cascos > {capacidad}")
+        if ocupados != activos.get(casillero.id, 0):
+            errores.append(f"casillero {casillero.numero}: cascos_ocupados={ocupados}, asignaciones={activos.get(casillero.id, 0)}")
+        if ocupados != main.indice_casilleros.ocupacion(casillero.id):
+            errores.append(f"casillero {casillero.numero}: índice={main.indice_casilleros.ocupacion(casillero.id)}, base={ocupados}")
+    duplicadas = (
+        db.query(models.Registro.placa_moto)
+        .filter(models.Registro.hora_salida.is_(None))
+        .group_by(models.Registro.placa_moto)
+        .having(func.count() > 1)
+        .all()
+    )
+    errores += [f"placa {placa} con varios registros activos" for (placa,) in duplicadas]
+    db.close()
+    return errores
+
+
+async def ejecutar(num_motos: int, rondas: int, claves: bool):
+    import httpx
+    import main
+    import models
+
+    # ASGITransport no ejecuta el lifespan: se entra a mano para preparar la base
+    async with main.app.router.lifespan_context(main.app):
+        return await probar(main, models, httpx, num_motos, rondas, claves)
+
+
+async def probar(main, models, httpx, num_motos: int, rondas: int, claves: bool):
+    db = main.SessionLocal()
+    db.add(models.Propietario(telefono=3000000000, nombre="STRESS", apellido="TEST"))
+    placas = [f"STR{i % 100:02d}{chr(65 + i // 100)}" for i in range(num_motos)]
+    db.add_all(models.Moto(placa=placa, propietario_telefono=3000000000) for placa in placas)
+    db.commit()
+    db.close()
+
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://stress") as cliente:
+        for ronda in range(rondas):
+            dentro = set()
+            peticiones = []
+            # Cada placa entra dos veces a la vez: solo una debe ganar
+            for placa in placas + random.sample(placas, len(placas) // 4):
+                peticiones.append(("POST", "/registrar_ingreso", {"json": {"placa": placa, "num_cascos": random.randint(0, 2)}}))
+                dentro.add(placa)
+            random.shuffle(peticiones)
+            inicio = time.perf_counter()
+            codigos = await rafaga(cliente, peticiones, claves)
+            duracion = time.perf_counter() - inicio
+            aceptados = codigos.count(200)
+            print(f"ronda {ronda + 1}: {len(peticiones)} ingresos en {duracion:.2f}s "
+                  f"({len(peticiones) / duracion:.0f}/s), aceptados={aceptados}, rechazados={len(codigos) - aceptados}")
+            errores = [f"ingreso respondió {codigo}" for codigo in codigos if codigo >= 500]
+            errores += verificar(main)
+
+            salidas = [("POST", "/registros/salida/", {"params": {"placa_moto": placa}}) for placa in dentro]
+            salidas += random.sample(salidas, len(salidas) // 4)
+            inicio = time.perf_counter()
+            await rafaga(cliente, salidas, claves)
+            duracion = time.perf_counter() - inicio
+            print(f"ronda {ronda + 1}: {len(salidas)} salidas en {duracion:.2f}s ({len(salidas) / duracion:.0f}/s)")
+
+            errores += verificar(main)
+            if errores:
+                for error in errores:
+                    print(f"❌ {error}")
+                return 1
+    print("✅ Ningún casillero superó la capacidad y la ocupación es consistente.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--motos", type=int, default=400)
+    parser.add_argument("--rondas", type=int, default=3)
+    parser.add_argument("--claves", action="store_true", help="una Idempotency-Key por petición")
+    args = parser.parse_args()
+    preparar_entorno()
+    sys.exit(asyncio.run(ejecutar(args.motos, args.rondas, args.claves)))
@@ -0,0 +1,58 @@
+# busqueda.py
+from bisect import bisect_left, insort
+from string import ascii_uppercase, digits
+from threading import Lock
+
+ALFABETO_PLACA = ascii_uppercase + digits
+
+
+# --- Índice de prefijos (lista ordenada + bisect) ---
+class IndicePrefijos:
+    """
+    Claves ordenadas para autocompletar: las que empiezan por un prefijo
+    quedan contiguas, así que bisect encuentra la primera y basta con
+    leer las k siguientes. `valores` guarda los datos que se devuelven.
+    """
+
+    def __init__(self):
+        self._claves = []
+        self.valores = {}
+        self._lock = Lock()
+
+    def cargar(self, pares):
+        with self._lock:
+            self.valores = dict(pares)
+            self._claves = sorted(self.valores)
+
+    def guardar(self, clave: str, valor):
+        with self._lock:
+            if clave not in self.valores:
+                insort(self._claves, clave)
+            self.valores[clave] = valor
+
+    def quitar(self, clave: str):
+        with self._lock:
+            if self.valores.pop(clave, None) is not None:
+                del self._claves[bisect_left(self._claves, clave)]
+
+    def __len__(self):
+        return len(self._claves)
+
+    def prefijo(self, prefijo: str, k: int):
+        with self._lock:
+            inicio = bisect_left(self._claves, prefijo)
+            claves = self._claves[inicio:inicio + k]
+            return [self.valores[c] for c in claves if c.startswith(prefijo)]
+
+    def similares(self, texto: str, k: int, alfabeto: str = ALFABETO_PLACA):
+        """Claves a un carácter de distancia (cambio, falta o sobra una letra)."""
+        variantes = set()
+        for i in range(len(texto) + 1):
+            if i < len(texto):
+                variantes.add(texto[:i] + texto[i + 1:])
+                variantes.update(texto[:i] + c + texto[i + 1:] for c in alfabeto)
+            variantes.update(texto[:i] + c + texto[i:] for c in alfabeto)
+        variantes.discard(texto)
+        with self._lock:
+            encontradas = sorted(v for v in variantes if v in self.valores)
+            return [self.valores[c] for c in encontradas[:k]]
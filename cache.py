@@ -0,0 +1,88 @@
+# cache.py
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+# --- Cache LRU con expiración (TTL) y contadores de aciertos ---
+class CacheLRU:
+    """
+    Cache en memoria del proceso, acotada a `max_entradas` (se descarta la
+    menos usada) y con vencimiento de `ttl_segundos` por entrada. Las
+    escrituras en la base invalidan las claves afectadas.
+
+    Cada invalidación sube `version`. Quien lee de la base la toma antes de
+    consultar y se la pasa a `guardar`: si hubo una invalidación en medio,
+    lo leído puede ser el valor viejo y no se guarda.
+    """
+
+    def __init__(self, max_entradas: int = 10000, ttl_segundos: float = 300):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._datos = OrderedDict()  # clave -> (vence, valor)
+        self._lock = Lock()
+        self._version = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def version(self) -> int:
+        return self._version
+
+    def guardar(self, clave, valor, version: int | None = None):
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._datos[clave] = (time.monotonic() + self.ttl_segundos, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, *claves):
+        with self._lock:
+            self._version += 1
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def invalidar_si(self, condicion):
+        """Borra las entradas cuyo valor cumple `condicion(valor)`."""
+        with self._lock:
+            self._version += 1
+            for clave in [c for c, (_, valor) in self._datos.items() if condicion(valor)]:
+                del self._datos[clave]
+
+    def configurar(self, max_entradas: int, ttl_segundos: float):
+        """Nuevos límites; las entradas ya guardadas conservan su vencimiento."""
+        with self._lock:
+            self.max_entradas = max_entradas
+            self.ttl_segundos = ttl_segundos
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._version += 1
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+            }
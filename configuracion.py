@@ -0,0 +1,178 @@
+# configuracion.py
+import asyncio
+import json
+from pathlib import Path
+from threading import Lock
+from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
+
+
+# --- Esquema de config.json (instantáneas inmutables) ---
+class Franja(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    desde: str = Field(pattern=r"^\d{2}:\d{2}$")
+    hasta: str = Field(pattern=r"^\d{2}:\d{2}$")
+    tarifa_hora: int = Field(ge=0)
+
+
+class TarifasVehiculo(BaseModel):
+    # Solo lo que cambia respecto a la tarifa general; lo que falta se hereda
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    tarifa_hora: int | None = Field(default=None, ge=0)
+    tolerancia_minutos: int | None = Field(default=None, ge=0, lt=60)
+    tope_horas: int | None = Field(default=None, ge=1)
+    tarifa_dia: int | None = Field(default=None, ge=0)
+    tarifa_mensualidad: int | None = Field(default=None, ge=0)
+    franjas: tuple[Franja, ...] | None = None
+
+
+class TarifasExtra(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    franjas: tuple[Franja, ...] = ()
+    vehiculos: dict[str, TarifasVehiculo] = {}
+
+
+class CacheConsultas(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    max_entradas: int = Field(default=10000, ge=1)
+    ttl_segundos: float = Field(default=300, gt=0)
+
+
+class ConfigMetricas(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # null: sin log de peticiones lentas; con un valor, imprime las que tarden más (ms) con su SQL
+    peticion_lenta_ms: float | None = Field(default=None, ge=0)
+    sentencias_en_log: int = Field(default=10, ge=1)
+
+
+class ConfigIdempotencia(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # Respuestas de ingresos, salidas y pagos por Idempotency-Key (en memoria y en la base)
+    max_entradas: int = Field(default=10000, ge=1)
+    ttl_segundos: float = Field(default=86400, gt=0)
+
+
+class ConfigDiario(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # Diario de eventos de portería con commit en grupo (ver diario.py)
+    activo: bool = False
+    ventana_ms: float = Field(default=2, ge=0, le=100)
+    max_eventos: int = Field(default=512, ge=1)
+
+
+class Configuracion(BaseModel):
+    # extra="allow": claves que solo leen otros módulos (p. ej. "sqlite" en database.py)
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+    tarifa_hora: int = Field(ge=0)
+    tolerancia_minutos: int = Field(ge=0, lt=60)
+    tarifa_dia: int = Field(ge=0)
+    tope_horas: int = Field(default=7, ge=1)
+    tarifa_mensualidad: int = Field(default=45000, ge=0)
+    tarifas: TarifasExtra = TarifasExtra()
+    total_casilleros: int = Field(ge=1)
+    capacidad_por_casillero: int = Field(ge=1)
+    perfil_sqlite: str = "desarrollo"
+    # "async": check-in, salida, consulta de motos y cuadre con AsyncSession (aiosqlite)
+    motor_bd: Literal["sync", "async"] = "sync"
+    cache_consultas: CacheConsultas = CacheConsultas()
+    metricas: ConfigMetricas = ConfigMetricas()
+    idempotencia: ConfigIdempotencia = ConfigIdempotencia()
+    diario: ConfigDiario = ConfigDiario()
+
+    @field_validator("perfil_sqlite")
+    @classmethod
+    def _perfil_conocido(cls, valor):
+        from database import PERFILES_SQLITE
+        if valor not in PERFILES_SQLITE:
+            raise ValueError(f"perfil desconocido, usa: {', '.join(PERFILES_SQLITE)}")
+        return valor
+
+    @model_validator(mode="after")
+    def _tarifas_compilan(self):
+        # Una tabla que no compila se rechaza al leer el archivo, no al aplicarla
+        from tarifas import MotorTarifas
+        MotorTarifas.desde_config(self.tarifas_dict())
+        return self
+
+    def tarifas_dict(self) -> dict:
+        """Claves que usa tarifas.MotorTarifas.desde_config (sin las que un vehículo no sobrescribe)."""
+        return self.model_dump(include={
+            "tarifa_hora", "tolerancia_minutos", "tarifa_dia", "tope_horas", "tarifa_mensualidad", "tarifas",
+        }, exclude_none=True)
+
+
+def leer(ruta: Path) -> Configuracion:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return Configuracion.model_validate(json.load(f))
+
+
+# --- Gestor con recarga en caliente ---
+class GestorConfiguracion:
+    """
+    Guarda la configuración vigente como una instantánea inmutable. Los
+    endpoints solo leen `gestor.actual` (una referencia), así que nunca se
+    bloquean; recargar() valida el archivo nuevo, cambia la referencia de
+    una vez y avisa a los suscriptores con (anterior, nueva) para que
+    reconstruyan solo lo que cambió. Si un suscriptor falla, la recarga se
+    deshace completa: vuelve la instantánea anterior y los suscriptores que
+    ya la aplicaron reciben (nueva, anterior).
+    """
+
+    def __init__(self, ruta: Path, suscriptores: list | None = None):
+        self.ruta = ruta
+        self.actual = leer(ruta)
+        # Lista compartida: varios gestores (uno por lote) avisan a los mismos suscriptores
+        self._suscriptores = suscriptores if suscriptores is not None else []
+        self._lock = Lock()  # serializa recargas, no lecturas
+
+    def suscribir(self, funcion):
+        self._suscriptores.append(funcion)
+
+    def recargar(self) -> bool:
+        with self._lock:
+            try:
+                nueva = leer(self.ruta)
+            except (OSError, ValueError, ValidationError) as e:
+                print(f"⚠️ config.json inválido, se mantiene la configuración anterior: {e}")
+                return False
+            anterior = self.actual
+            if nueva == anterior:
+                return False
+            self.actual = nueva
+            aplicados = []
+            for funcion in self._suscriptores:
+                try:
+                    funcion(anterior, nueva)
+                except Exception as e:
+                    print(f"❌ Error aplicando la nueva configuración en {funcion.__name__}: {e}; se mantiene la anterior")
+                    self._deshacer(aplicados, nueva, anterior)
+                    return False
+                aplicados.append(funcion)
+            print(f"🔄 Configuración recargada desde {self.ruta.name}")
+            return True
+
+    def _deshacer(self, aplicados, nueva, anterior):
+        self.actual = anterior
+        for funcion in reversed(aplicados):
+            try:
+                funcion(nueva, anterior)
+            except Exception as e:
+                print(f"❌ No se pudo deshacer {funcion.__name__}: {e}")
+
+    async def observar(self, stop_event: asyncio.Event | None = None):
+        """Vigila config.json con watchfiles y recarga en un hilo aparte cuando cambia."""
+        from watchfiles import awatch
+        from starlette.concurrency import run_in_threadpool
+
+        # Se vigila la carpeta: los editores suelen reemplazar el archivo al guardar
+        es_config = lambda cambio, ruta: Path(ruta).name == self.ruta.name
+        async for _ in awatch(self.ruta.parent, watch_filter=es_config, stop_event=stop_event):
+            await run_in_threadpool(self.recargar)
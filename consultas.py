@@ -0,0 +1,42 @@
+# consultas.py
+# Consultas calientes sobre registros. Las rutas y resumen.py las ejecutan, y
+# migraciones.verificar_planes compila estas mismas sentencias para revisar
+# con EXPLAIN QUERY PLAN que cada una use su índice.
+from datetime import datetime
+from sqlalchemy import func, select
+from models import Registro
+
+
+def registro_activo(placa: str):
+    """El registro sin salida de `placa` (ix_registros_activos_placa)."""
+    return select(Registro).where(Registro.placa_moto == placa, Registro.hora_salida.is_(None))
+
+
+def registros_activos(placas):
+    """Registros sin salida de varias placas, para los lotes (ix_registros_activos_placa)."""
+    return select(Registro).where(Registro.placa_moto.in_(set(placas)), Registro.hora_salida.is_(None))
+
+
+def ultimo_registro(placa: str):
+    """El registro más reciente de `placa`, activo o no (ix_registros_placa_id)."""
+    return select(Registro).where(Registro.placa_moto == placa).order_by(Registro.id.desc()).limit(1)
+
+
+def totales_salida(desde: datetime, hasta: datetime, tipo_cobro: str | None, incluir_hasta: bool):
+    """(tipo_cobro, cantidad, total) de los registros que salieron en el rango (ix_registros_salida)."""
+    filtros = [
+        Registro.hora_salida != None,
+        Registro.hora_salida >= desde,
+        Registro.hora_salida <= hasta if incluir_hasta else Registro.hora_salida < hasta,
+    ]
+    if tipo_cobro:
+        filtros.append(Registro.tipo_cobro == tipo_cobro)
+    return (
+        select(
+            Registro.tipo_cobro,
+            func.count(Registro.id),
+            func.coalesce(func.sum(func.coalesce(Registro.valor_pagado, 0)), 0),
+        )
+        .where(*filtros)
+        .group_by(Registro.tipo_cobro)
+    )
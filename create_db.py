@@ -1,6 +1,7 @@
 from database import Base, engine
-from models import Propietario, Moto, Casillero, Registro
+from migraciones import preparar_esquema
+from models import Propietario, Moto, Casillero, Registro, ResumenDiario
 
 print("📦 Creando las tablas en la base de datos...")
-Base.metadata.create_all(bind=engine)
+preparar_esquema(Base.metadata, engine)
 print("✅ Tablas creadas correctamente.")
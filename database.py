@@ -1,18 +1,335 @@
 # database.py
-from sqlalchemy import create_engine
+import json
+import os
+import re
+import sqlite3
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # --- Configuración de la base de datos SQLite ---
-DATABASE_URL = "sqlite:///./parqueadero.db"
+DATABASE_URL = os.getenv("PARQUEADERO_DATABASE_URL", "sqlite:///./parqueadero.db")
+CONFIG_PATH = Path(__file__).parent / "config.json"
 
-# Crea el motor que conecta con la base de datos
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
 
-# Crea la sesión para interactuar con la base de datos
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# --- Lotes (un parqueadero = un archivo SQLite y su propio config.json) ---
+# lotes.json: {"centro": {"url": "sqlite:///./centro.db", "config": "config_centro.json"}, ...}.
+# Sin ese archivo hay un solo lote, "principal", con PARQUEADERO_DATABASE_URL
+# y config.json, como antes. El primer lote (o PARQUEADERO_LOTE) es el de las
+# rutas sin prefijo /lotes/<lote> y el de los scripts.
+LOTES_PATH = Path(os.getenv("PARQUEADERO_LOTES", Path(__file__).parent / "lotes.json"))
+LOTE_PRINCIPAL = "principal"
+
+
+def leer_lotes(ruta: Path = LOTES_PATH) -> dict[str, dict]:
+    """{lote: {"url": ..., "config": Path}}, en el orden del archivo."""
+    if not ruta.exists():
+        return {LOTE_PRINCIPAL: {"url": DATABASE_URL, "config": CONFIG_PATH}}
+    lotes = {}
+    for lote, datos in json.loads(ruta.read_text(encoding="utf-8")).items():
+        if not re.fullmatch(r"[a-z0-9_-]+", lote):
+            raise ValueError(f"{ruta.name}: id de lote inválido '{lote}' (minúsculas, números, - y _)")
+        lotes[lote] = {"url": datos["url"], "config": ruta.parent / datos.get("config", "config.json")}
+    if not lotes:
+        raise ValueError(f"{ruta.name} no define ningún lote")
+    return lotes
+
+
+LOTES = leer_lotes()
+LOTE_POR_DEFECTO = os.getenv("PARQUEADERO_LOTE") or next(iter(LOTES))
+if LOTE_POR_DEFECTO not in LOTES:
+    raise ValueError(f"PARQUEADERO_LOTE={LOTE_POR_DEFECTO} no está en {LOTES_PATH.name}")
+# Lote de la petición en curso (lo pone lotes.MiddlewareLotes; pasa al pool de hilos con el contexto)
+lote_actual: ContextVar[str] = ContextVar("lote_actual", default=LOTE_POR_DEFECTO)
+
+
+def url_lote(lote: str | None = None) -> str:
+    return LOTES[lote or lote_actual.get()]["url"]
+
+
+def ruta_config(lote: str | None = None) -> Path:
+    return LOTES[lote or lote_actual.get()]["config"]
+
+
+def carpeta_archivo(url: str | None = None) -> Path:
+    """
+    Carpeta de los segmentos archivados de registros: junto a la base del
+    lote (parqueadero_archivo/); PARQUEADERO_ARCHIVO la cambia para el lote
+    por defecto.
+    """
+    url = url or url_lote()
+    if os.getenv("PARQUEADERO_ARCHIVO") and url == url_lote(LOTE_POR_DEFECTO):
+        return Path(os.environ["PARQUEADERO_ARCHIVO"])
+    base = Path(url.split(":///", 1)[-1])
+    return base.with_name(f"{base.stem}_archivo")
+
+
+def ruta_base(url: str | None = None) -> Path:
+    """Archivo SQLite de la URL (por defecto, la del lote actual)."""
+    return Path((url or url_lote()).split(":///", 1)[-1])
+
+
+def carpeta_diario(url: str | None = None) -> Path:
+    """Carpeta del diario de eventos de portería (diario.py), junto a la base del lote."""
+    base = ruta_base(url)
+    return base.with_name(f"{base.stem}_diario")
+
+
+# --- Perfiles de SQLite (se elige con "perfil_sqlite" en config.json) ---
+# "desarrollo" deja los valores por defecto de SQLite (rollback journal,
+# synchronous=FULL). "produccion" usa WAL, que permite leer mientras otro
+# escribe y, con synchronous=NORMAL, solo hace fsync en los checkpoints.
+PERFILES_SQLITE = {
+    "desarrollo": {
+        "journal_mode": None,
+        "synchronous": None,
+        "busy_timeout_ms": None,
+        "cache_size_kb": None,
+        "mmap_size_mb": None,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "lectura_pool_size": 2,
+        "lectura_pool_timeout": 120,
+        "lectura_copia_segundos": None,
+    },
+    "produccion": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout_ms": 5000,
+        "cache_size_kb": 32768,
+        "mmap_size_mb": 256,
+        "pool_size": 8,
+        "max_overflow": 16,
+        "pool_timeout": 10,
+        "lectura_pool_size": 2,
+        "lectura_pool_timeout": 120,
+        "lectura_copia_segundos": None,
+    },
+}
+
+
+def cargar_perfil(config: dict | None = None) -> dict:
+    """Perfil elegido en el config.json del lote, con las claves de "sqlite" sobrescribiendo las del perfil."""
+    if config is None:
+        ruta = ruta_config()
+        config = json.loads(ruta.read_text(encoding="utf-8")) if ruta.exists() else {}
+    nombre = config.get("perfil_sqlite", "desarrollo")
+    if nombre not in PERFILES_SQLITE:
+        raise ValueError(f"Perfil de SQLite desconocido: {nombre}. Usa: {', '.join(PERFILES_SQLITE)}")
+    return {**PERFILES_SQLITE[nombre], **config.get("sqlite", {})}
+
+
+def aplicar_pragmas(dbapi_connection, perfil: dict, solo_lectura: bool = False):
+    cursor = dbapi_connection.cursor()
+    if solo_lectura:
+        # journal_mode y synchronous son de quien escribe
+        cursor.execute("PRAGMA query_only = ON")
+    else:
+        if perfil["journal_mode"]:
+            cursor.execute(f"PRAGMA journal_mode = {perfil['journal_mode']}")
+        if perfil["synchronous"]:
+            cursor.execute(f"PRAGMA synchronous = {perfil['synchronous']}")
+    if perfil["busy_timeout_ms"]:
+        cursor.execute(f"PRAGMA busy_timeout = {int(perfil['busy_timeout_ms'])}")
+    if perfil["cache_size_kb"]:
+        # Valor negativo = tamaño en KiB en lugar de páginas
+        cursor.execute(f"PRAGMA cache_size = -{int(perfil['cache_size_kb'])}")
+    if perfil["mmap_size_mb"]:
+        cursor.execute(f"PRAGMA mmap_size = {int(perfil['mmap_size_mb']) * 1024 * 1024}")
+    cursor.close()
+
+
+def crear_engine(url: str | None = None, perfil: dict | None = None):
+    """Crea un engine de SQLite (por defecto, el del lote actual) que aplica los PRAGMA del perfil en cada conexión nueva."""
+    perfil = perfil or cargar_perfil()
+    nuevo_engine = create_engine(
+        url or url_lote(),
+        connect_args={"check_same_thread": False},
+        pool_size=perfil["pool_size"],
+        max_overflow=perfil["max_overflow"],
+        pool_timeout=perfil["pool_timeout"],
+    )
+
+    @event.listens_for(nuevo_engine, "connect")
+    def _al_conectar(dbapi_connection, connection_record):
+        aplicar_pragmas(dbapi_connection, perfil)
+
+    return nuevo_engine
+
+
+def crear_engine_async(url: str | None = None, perfil: dict | None = None, solo_lectura: bool = False):
+    """
+    Engine asíncrono (aiosqlite) sobre la misma base y con los mismos PRAGMA
+    (con `solo_lectura`, el de reportes: ver crear_engine_lectura).
+    aiosqlite se importa aquí: solo hace falta con motor_bd = "async".
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    perfil = perfil or cargar_perfil()
+    url = url or url_lote()
+    if solo_lectura:
+        url, pool = _url_lectura(url, perfil)
+    else:
+        pool = {"pool_size": perfil["pool_size"], "max_overflow": perfil["max_overflow"], "pool_timeout": perfil["pool_timeout"]}
+    nuevo_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1), **pool)
+
+    @event.listens_for(nuevo_engine.sync_engine, "connect")
+    def _al_conectar(dbapi_connection, connection_record):
+        aplicar_pragmas(dbapi_connection, perfil, solo_lectura)
+
+    return nuevo_engine
+
+
+# --- Conexión de reportes (solo lectura, separada de la portería) ---
+# Cuadres, listados y exportaciones abren sus sesiones con
+# SessionLocal.lectura(): otro engine, con conexiones mode=ro y su propio
+# pool, pequeño ("lectura_pool_size"): los reportes de más esperan turno
+# sin ocupar CPU ni conexiones de los ingresos. Con WAL (perfil
+# "produccion") leer no frena los commits. Sin WAL, o para aislar del todo
+# el archivo de la portería, "lectura_copia_segundos" hace que los reportes
+# lean una copia de la base (API de backup de SQLite) que se renueva cuando
+# tiene más de esos segundos; cada conexión se reabre con la misma
+# frecuencia, así que un reporte ve datos de a lo sumo el doble de atrás.
+def ruta_copia_lectura(url: str) -> Path:
+    base = Path(url.split(":///", 1)[-1])
+    return base.with_name(f"{base.stem}_lectura{base.suffix}")
+
+
+def _url_lectura(url: str, perfil: dict) -> tuple[str, dict]:
+    """URL mode=ro (de la base o de su copia) y argumentos de pool del engine de reportes."""
+    pool = {"pool_size": perfil["lectura_pool_size"], "max_overflow": 0, "pool_timeout": perfil["lectura_pool_timeout"]}
+    if perfil["lectura_copia_segundos"]:
+        ruta = ruta_copia_lectura(url)
+        pool["pool_recycle"] = perfil["lectura_copia_segundos"]
+    else:
+        ruta = Path(url.split(":///", 1)[-1])
+    return f"sqlite:///file:{ruta.resolve().as_posix()}?mode=ro&uri=true", pool
+
+
+def crear_engine_lectura(url: str | None = None, perfil: dict | None = None):
+    """Engine de solo lectura para reportes (por defecto, del lote actual); no escribe ni cambia el journal."""
+    perfil = perfil or cargar_perfil()
+    url_ro, pool = _url_lectura(url or url_lote(), perfil)
+    nuevo_engine = create_engine(url_ro, connect_args={"check_same_thread": False}, **pool)
+
+    @event.listens_for(nuevo_engine, "connect")
+    def _al_conectar(dbapi_connection, connection_record):
+        aplicar_pragmas(dbapi_connection, perfil, solo_lectura=True)
+
+    return nuevo_engine
+
+
+class CopiaLectura:
+    """Copia de la base para reportes, renovada con la API de backup cuando envejece."""
+
+    def __init__(self, url: str, cada_segundos: float):
+        self.origen = Path(url.split(":///", 1)[-1])
+        self.destino = ruta_copia_lectura(url)
+        self.cada_segundos = cada_segundos
+        self.renovada = 0.0
+        self._lock = Lock()
+
+    def al_dia(self):
+        if time.monotonic() - self.renovada < self.cada_segundos:
+            return
+        with self._lock:
+            if time.monotonic() - self.renovada < self.cada_segundos:
+                return
+            temporal = self.destino.with_name(self.destino.name + ".tmp")
+            origen = sqlite3.connect(f"file:{self.origen.resolve().as_posix()}?mode=ro", uri=True)
+            destino = sqlite3.connect(temporal)
+            try:
+                # Por tramos: entre uno y otro la portería puede hacer commit
+                origen.backup(destino, pages=1024, sleep=0.001)
+            finally:
+                destino.close()
+                origen.close()
+            # Reemplazo atómico: las sesiones abiertas terminan con la copia anterior
+            os.replace(temporal, self.destino)
+            self.renovada = time.monotonic()
+
+
+# --- Sesiones repartidas por lote ---
+class SesionesPorLote:
+    """
+    Reemplaza al sessionmaker único: cada lote tiene su engine y su
+    sessionmaker (creados al primer uso, con el perfil de su config.json) y
+    SessionLocal() abre la sesión en la base del lote actual.
+    SessionLocal.lectura() hace lo mismo con el engine de reportes.
+    """
+
+    def __init__(self, lotes: dict[str, dict]):
+        self.lotes = lotes
+        self._fabricas = {}
+        self._lecturas = {}
+        self._lock = Lock()
+
+    def perfil(self, lote: str | None = None) -> dict:
+        datos = self.lotes[lote or lote_actual.get()]
+        return cargar_perfil(json.loads(datos["config"].read_text(encoding="utf-8")) if datos["config"].exists() else {})
+
+    def fabrica(self, lote: str | None = None) -> sessionmaker:
+        lote = lote or lote_actual.get()
+        fabrica = self._fabricas.get(lote)
+        if fabrica is None:
+            if lote not in self.lotes:
+                raise KeyError(f"Lote desconocido: {lote}")
+            with self._lock:
+                fabrica = self._fabricas.get(lote)
+                if fabrica is None:
+                    fabrica = sessionmaker(
+                        autocommit=False, autoflush=False, bind=crear_engine(self.lotes[lote]["url"], self.perfil(lote))
+                    )
+                    self._fabricas[lote] = fabrica
+        return fabrica
+
+    def fabrica_lectura(self, lote: str | None = None) -> tuple[sessionmaker, CopiaLectura | None]:
+        lote = lote or lote_actual.get()
+        lectura = self._lecturas.get(lote)
+        if lectura is None:
+            if lote not in self.lotes:
+                raise KeyError(f"Lote desconocido: {lote}")
+            with self._lock:
+                lectura = self._lecturas.get(lote)
+                if lectura is None:
+                    url, perfil = self.lotes[lote]["url"], self.perfil(lote)
+                    copia = CopiaLectura(url, perfil["lectura_copia_segundos"]) if perfil["lectura_copia_segundos"] else None
+                    lectura = (sessionmaker(autocommit=False, autoflush=False, bind=crear_engine_lectura(url, perfil)), copia)
+                    self._lecturas[lote] = lectura
+        return lectura
+
+    def engine(self, lote: str | None = None):
+        return self.fabrica(lote).kw["bind"]
+
+    def engine_lectura(self, lote: str | None = None):
+        return self.fabrica_lectura(lote)[0].kw["bind"]
+
+    def copia_al_dia(self, lote: str | None = None):
+        """Renueva la copia de reportes del lote si le toca (nada si los reportes leen la base)."""
+        copia = self.fabrica_lectura(lote)[1]
+        if copia is not None:
+            copia.al_dia()
+
+    def __call__(self, **kwargs):
+        return self.fabrica()(**kwargs)
+
+    def lectura(self, **kwargs):
+        fabrica, copia = self.fabrica_lectura()
+        if copia is not None:
+            copia.al_dia()
+        return fabrica(**kwargs)
+
+
+# Crea la sesión para interactuar con la base de datos del lote actual
+SessionLocal = SesionesPorLote(LOTES)
+
+# Engine del lote por defecto (scripts y benchmarks)
+engine = SessionLocal.engine(LOTE_POR_DEFECTO)
 
 # Base para los modelos
 Base = declarative_base()
@@ -24,3 +341,10 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_db_lectura():
+    db = SessionLocal.lectura()
+    try:
+        yield db
+    finally:
+        db.close()
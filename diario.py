@@ -0,0 +1,332 @@
+# diario.py
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Condition, Lock, Thread
+from sqlalchemy import text, update
+from metricas import cronometro
+from models import AsignacionCasillero, EstadoDiario, Registro
+import resumen as resumen_diario
+
+# Un archivo del diario más viejo que esto ya no es el abierto de ningún
+# worker: cada uno cambia de archivo a medianoche (Diario.podar)
+ARCHIVO_AJENO_CERRADO = timedelta(days=2)
+
+# Turnos del diario que la petición en curso debe esperar antes de responder (lo pone MiddlewareDiario)
+turnos_pendientes: ContextVar[list | None] = ContextVar("turnos_pendientes", default=None)
+
+
+# --- Eventos: lo necesario para rehacer cada operación sobre la base ---
+def _texto(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def _fecha(valor):
+    return datetime.fromisoformat(valor) if valor is not None else None
+
+
+def evento(tipo: str, registro: Registro, **extra) -> dict:
+    if tipo == "entrada":
+        datos = {
+            "placa_moto": registro.placa_moto,
+            "hora_entrada": _texto(registro.hora_entrada),
+            "cascos": registro.cascos,
+            "id_casillero": registro.id_casillero,
+            "tipo_cobro": registro.tipo_cobro,
+            "proximo_pago": _texto(registro.proximo_pago),
+            "observaciones": registro.observaciones,
+            "asignaciones": [[a.id_casillero, a.cascos] for a in registro.asignaciones],
+        }
+    elif tipo == "salida":
+        datos = {"hora_salida": _texto(registro.hora_salida), "valor_pagado": registro.valor_pagado}
+    elif tipo == "pago":
+        datos = {"tipo_cobro": registro.tipo_cobro, "proximo_pago": _texto(registro.proximo_pago), **extra}
+    else:
+        raise ValueError(f"Tipo de evento desconocido: {tipo}")
+    return {"tipo": tipo, "registro": registro.id, **datos}
+
+
+def rehacer(db, ev: dict) -> bool:
+    """Aplica un evento del diario sobre registros y resumen diario. False si ya no aplica."""
+    if ev["tipo"] == "entrada":
+        if db.get(Registro, ev["registro"]) is not None:
+            return False
+        db.add(Registro(
+            id=ev["registro"],
+            placa_moto=ev["placa_moto"],
+            hora_entrada=_fecha(ev["hora_entrada"]),
+            cascos=ev["cascos"],
+            id_casillero=ev["id_casillero"],
+            tipo_cobro=ev["tipo_cobro"],
+            proximo_pago=_fecha(ev["proximo_pago"]),
+            observaciones=ev["observaciones"],
+            asignaciones=[AsignacionCasillero(id_casillero=c, cascos=uso) for c, uso in ev["asignaciones"]],
+        ))
+        db.flush()
+        return True
+    registro = db.get(Registro, ev["registro"])
+    if registro is None:
+        return False
+    if ev["tipo"] == "salida":
+        if registro.hora_salida is not None:
+            return False
+        registro.hora_salida, registro.valor_pagado = _fecha(ev["hora_salida"]), ev["valor_pagado"]
+        resumen_diario.registrar_cobro(db, registro)
+    else:
+        registro.tipo_cobro, registro.proximo_pago = ev["tipo_cobro"], _fecha(ev["proximo_pago"])
+        resumen_diario.mover_cobro(db, registro, ev["tipo_anterior"])
+    db.flush()
+    return True
+
+
+# --- Formato: una línea por evento, "crc32 json"; una línea a medias (caída) se descarta ---
+def _linea(ev: dict) -> bytes:
+    cuerpo = json.dumps(ev, ensure_ascii=False, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(cuerpo), cuerpo)
+
+
+def leer_archivo(ruta: Path) -> list[dict]:
+    eventos = []
+    with open(ruta, "rb") as f:
+        for linea in f:
+            crc, _, cuerpo = linea.rstrip(b"\n").partition(b" ")
+            if not linea.endswith(b"\n") or crc != b"%08x" % zlib.crc32(cuerpo):
+                break
+            eventos.append(json.loads(cuerpo))
+    return eventos
+
+
+# --- Diario de eventos de portería con commit en grupo ---
+class Diario:
+    """
+    Diario append-only de entradas, salidas y pagos. Cada operación hace su
+    transacción como siempre, pero la base puede ir sin fsync por commit
+    (WAL + synchronous=NORMAL): lo que la hace durable es este diario. Las
+    peticiones que llegan dentro de `ventana_ms` comparten una sola
+    escritura + fsync, y cada una responde cuando su evento ya está en
+    disco. Al arrancar, recuperar() rehace sobre la base los eventos que
+    esta perdió en una caída (los de número mayor a su marca).
+
+    El número de evento (`seq`) sale de diario_estado en la misma
+    transacción de la operación, así que la marca de la base y sus datos
+    siempre van juntos.
+    """
+
+    def __init__(self, carpeta: Path, activo: bool = False, ventana_ms: float = 2, max_eventos: int = 512):
+        self.carpeta = carpeta
+        self.configurar(activo, ventana_ms, max_eventos)
+        self._cola = []  # líneas por escribir
+        self._encolados = 0  # turnos entregados (uno por evento)
+        self._escritos = 0  # turnos ya en disco
+        self._esperas = []  # (turno, loop, future)
+        self._cond = Condition()
+        self._lock_archivo = Lock()
+        self._archivo = None
+        self._hilo = None
+        self._parar = False
+        self.tandas = 0
+
+    def configurar(self, activo: bool, ventana_ms: float, max_eventos: int):
+        self.activo = activo
+        self.ventana_ms = ventana_ms
+        self.max_eventos = max_eventos
+
+    # --- En la transacción de la operación ---
+    def preparar(self, db, tipo: str, registros: list, **extra) -> list[dict]:
+        """Eventos numerados de `registros`, sin commit (nada si el diario está apagado)."""
+        if not self.activo or not registros:
+            return []
+        db.flush()  # ids de los registros nuevos
+        ultimo = db.execute(
+            update(EstadoDiario).where(EstadoDiario.id == 1)
+            .values(ultimo_evento=EstadoDiario.ultimo_evento + len(registros))
+            .returning(EstadoDiario.ultimo_evento)
+        ).scalar_one()
+        primero = ultimo - len(registros) + 1
+        return [{"seq": primero + i, **evento(tipo, registro, **extra)} for i, registro in enumerate(registros)]
+
+    # --- Después del commit ---
+    def anotar(self, eventos: list[dict]):
+        """Encola los eventos; la respuesta espera su fsync en MiddlewareDiario (o aquí, sin middleware)."""
+        if not eventos:
+            return
+        lineas = [_linea(ev) for ev in eventos]
+        with self._cond:
+            if self._hilo is None:
+                self._hilo = Thread(target=self._escribir, name="diario", daemon=True)
+                self._hilo.start()
+            self._cola += lineas
+            self._encolados += len(lineas)
+            turno = self._encolados
+            self._cond.notify_all()
+        pendientes = turnos_pendientes.get()
+        if pendientes is not None:
+            pendientes.append(turno)
+        else:
+            self.esperar_bloqueante(turno)
+
+    def esperar_bloqueante(self, turno: int):
+        with self._cond:
+            self._cond.wait_for(lambda: self._escritos >= turno)
+
+    async def esperar(self, turno: int):
+        with self._cond:
+            if self._escritos >= turno:
+                return
+            futuro = asyncio.get_running_loop().create_future()
+            self._esperas.append((turno, futuro.get_loop(), futuro))
+        await futuro
+
+    # --- Hilo escritor: junta la ventana, escribe y hace un solo fsync ---
+    def _escribir(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._cola or self._parar)
+                if not self._cola:
+                    return
+                limite = time.monotonic() + self.ventana_ms / 1000
+                while len(self._cola) < self.max_eventos and not self._parar:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                tanda, self._cola = self._cola[:self.max_eventos], self._cola[self.max_eventos:]
+            try:
+                with self._lock_archivo:
+                    archivo = self._abrir()
+                    archivo.write(b"".join(tanda))
+                    archivo.flush()
+                    os.fsync(archivo.fileno())
+            except OSError as e:
+                # Sin diario la operación ya quedó en la base: se responde igual, sin la garantía del fsync
+                print(f"❌ No se pudo escribir el diario de eventos: {e}")
+            with self._cond:
+                self._escritos += len(tanda)
+                self.tandas += 1
+                listas = [espera for espera in self._esperas if espera[0] <= self._escritos]
+                self._esperas = [espera for espera in self._esperas if espera[0] > self._escritos]
+                self._cond.notify_all()
+            for _, loop, futuro in listas:
+                loop.call_soon_threadsafe(lambda f=futuro: f.done() or f.set_result(None))
+
+    def _abrir(self):
+        if self._archivo is None:
+            self.carpeta.mkdir(parents=True, exist_ok=True)
+            nombre = f"eventos-{datetime.now():%Y%m%d%H%M%S%f}-{os.getpid()}.log"
+            self._archivo = open(self.carpeta / nombre, "ab")
+        return self._archivo
+
+    def cerrar(self):
+        """Escribe lo pendiente y detiene el hilo (apagado de la app)."""
+        with self._cond:
+            self._parar = True
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join()
+        with self._cond:
+            self._hilo, self._parar = None, False
+        with self._lock_archivo:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+
+    # --- Recuperación y poda ---
+    def archivos(self) -> list[Path]:
+        return sorted(self.carpeta.glob("eventos-*.log")) if self.carpeta.exists() else []
+
+    def recuperar(self, sesiones) -> int:
+        """Rehace en la base los eventos del diario posteriores a su marca. Devuelve cuántos aplicó."""
+        with sesiones() as db:
+            db.execute(text("INSERT OR IGNORE INTO diario_estado (id, ultimo_evento) VALUES (1, 0)"))
+            # Tomar el bloqueo de escritura antes de leer la marca: otro worker puede estar recuperando
+            db.execute(update(EstadoDiario).where(EstadoDiario.id == 1).values(ultimo_evento=EstadoDiario.ultimo_evento))
+            marca = db.get(EstadoDiario, 1).ultimo_evento
+            eventos = {ev["seq"]: ev for ruta in self.archivos() for ev in leer_archivo(ruta) if ev["seq"] > marca}
+            aplicados = omitidos = 0
+            for seq in sorted(eventos):
+                if rehacer(db, eventos[seq]):
+                    aplicados += 1
+                else:
+                    omitidos += 1
+                marca = seq
+            if eventos:
+                db.get(EstadoDiario, 1).ultimo_evento = marca
+                # La ocupación de los casilleros sale de las asignaciones activas
+                from migraciones import _recalcular_ocupacion
+                _recalcular_ocupacion(db.connection())
+            db.commit()
+        if aplicados or omitidos:
+            print(f"🔁 Diario: {aplicados} eventos rehechos en la base" + (f", {omitidos} ya no aplicaban" if omitidos else ""))
+        return aplicados
+
+    def podar(self, ruta_base: Path) -> int:
+        """
+        Deja la base durable (un commit con synchronous=FULL) y borra los
+        archivos del diario cuyos eventos ya están todos en ella. El archivo
+        abierto se cierra: el próximo evento empieza uno nuevo.
+        """
+        if not self.archivos():
+            return 0
+        with self._lock_archivo:
+            actual = Path(self._archivo.name) if self._archivo is not None else None
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+        conexion = sqlite3.connect(ruta_base, timeout=30)
+        try:
+            conexion.execute("PRAGMA synchronous = FULL")
+            with conexion:
+                conexion.execute("UPDATE diario_estado SET ultimo_evento = ultimo_evento WHERE id = 1")
+                fila = conexion.execute("SELECT ultimo_evento FROM diario_estado WHERE id = 1").fetchone()
+        finally:
+            conexion.close()
+        marca = fila[0] if fila else 0
+        propios = f"-{os.getpid()}.log"
+        borrados = 0
+        for ruta in self.archivos():
+            viejo = time.time() - ruta.stat().st_mtime > ARCHIVO_AJENO_CERRADO.total_seconds()
+            if not (ruta == actual or ruta.name.endswith(propios) or viejo):
+                continue
+            if all(ev["seq"] <= marca for ev in leer_archivo(ruta)):
+                ruta.unlink()
+                borrados += 1
+        return borrados
+
+
+# --- Middleware ASGI: responder solo con el evento en disco ---
+class MiddlewareDiario:
+    """
+    En las rutas de portería, las operaciones anotan su turno del diario y
+    la respuesta sale cuando ese turno ya pasó el fsync. La espera es en el
+    event loop: el hilo de la operación queda libre para la siguiente.
+    Va por dentro de la idempotencia: una respuesta guardada ya es durable.
+    """
+
+    def __init__(self, app, rutas, diario):
+        self.app = app
+        self.rutas = set(rutas)
+        self.diario = diario
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.rutas:
+            await self.app(scope, receive, send)
+            return
+        pendientes = []
+        token = turnos_pendientes.set(pendientes)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and pendientes:
+                with cronometro("diario"):
+                    await self.diario.esperar(max(pendientes))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            turnos_pendientes.reset(token)
@@ -0,0 +1,105 @@
+# exportacion.py
+import csv
+import heapq
+import io
+import json
+from datetime import date, datetime
+from itertools import islice
+from operator import itemgetter
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from database import SessionLocal
+
+LIMITE_MAXIMO = 1000
+TAMANO_BLOQUE = 1000
+FORMATOS = {"json", "ndjson", "csv"}
+
+
+def validar_paginacion(limite: int, formato: str):
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        raise HTTPException(status_code=400, detail=f"El límite debe estar entre 1 y {LIMITE_MAXIMO}.")
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Usa: {', '.join(sorted(FORMATOS))}.")
+
+
+# --- Unir filas de la base con las de otra fuente (p. ej. el archivo) ---
+def fusionar(filas, extra, clave: str):
+    """
+    Une dos secuencias de dicts ya ordenadas por `clave`. Si una clave está
+    en las dos (el archivo a medio mover), queda solo la de `filas`.
+    """
+    anterior = object()
+    for fila in heapq.merge(filas, extra, key=itemgetter(clave)):
+        if fila[clave] != anterior:
+            anterior = fila[clave]
+            yield fila
+
+
+# --- Página con cursor (keyset) ---
+def pagina(consulta, limite: int, clave: str, extra=None):
+    """
+    Ejecuta `consulta` (ya filtrada por `clave > cursor` y ordenada por
+    `clave`) y devuelve los datos con el cursor de la página siguiente.
+    `extra`: más filas (dicts) con el mismo filtro y orden que se intercalan.
+    """
+    filas = (dict(fila._mapping) for fila in consulta.limit(limite + 1))
+    if extra is not None:
+        filas = fusionar(filas, extra, clave)
+    filas = list(islice(filas, limite + 1))
+    siguiente = filas[limite - 1][clave] if len(filas) > limite else None
+    return {"datos": filas[:limite], "siguiente_cursor": siguiente}
+
+
+# --- Exportación por streaming (NDJSON / CSV) ---
+def _texto(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _bloques(construir_consulta, formato: str, construir_extra=None, clave: str = "id"):
+    # Sesión propia (de reportes): el generador sigue vivo después de que termina el endpoint
+    db = SessionLocal.lectura()
+    try:
+        filas = (dict(fila._mapping) for fila in construir_consulta(db).execution_options(yield_per=TAMANO_BLOQUE))
+        if construir_extra is not None:
+            filas = fusionar(filas, construir_extra(), clave)
+        buffer = io.StringIO()
+        escritor = None
+        pendientes = 0
+        for fila in filas:
+            datos = {k: _texto(v) for k, v in fila.items()}
+            if formato == "csv":
+                if escritor is None:
+                    escritor = csv.DictWriter(buffer, fieldnames=list(datos))
+                    escritor.writeheader()
+                escritor.writerow(datos)
+            else:
+                buffer.write(json.dumps(datos, ensure_ascii=False))
+                buffer.write("\n")
+            pendientes += 1
+            if pendientes >= TAMANO_BLOQUE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pendientes = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def respuesta_streaming(construir_consulta, formato: str, nombre: str, construir_extra=None):
+    """
+    StreamingResponse que recorre la consulta por bloques: la memoria no
+    crece con la tabla. `construir_extra()` da filas ordenadas por id que
+    se intercalan con las de la consulta.
+    """
+    bloques = _bloques(construir_consulta, formato, construir_extra)
+    if formato == "csv":
+        return StreamingResponse(
+            bloques,
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{nombre}.csv"'},
+        )
+    return StreamingResponse(bloques, media_type="application/x-ndjson")
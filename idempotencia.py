@@ -0,0 +1,274 @@
+# idempotencia.py
+import asyncio
+import hashlib
+import json
+import time
+from collections import namedtuple
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, and_, bindparam, delete, event, not_, or_, select, text, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from models import RespuestaIdempotente
+
+Respuesta = namedtuple("Respuesta", "huella codigo tipo_contenido cuerpo")
+# Lo que MiddlewareMetricas lee de scope["route"]: un reintento cuenta en su ruta
+EtiquetaRuta = namedtuple("EtiquetaRuta", "path")
+
+LARGO_MAXIMO_CLAVE = 255
+# Reclamo sin respuesta más viejo que esto: el worker que lo tenía murió
+RECLAMO_ABANDONADO = timedelta(seconds=30)
+# Cuánto espera un reintento a que termine la primera petición con su clave
+ESPERA_EN_CURSO = 10
+
+
+def guardable(codigo: int) -> bool:
+    """5xx y 409 (choque al reservar) son transitorios: el reintento debe ejecutarse de nuevo."""
+    return codigo < 500 and codigo != 409
+
+
+# --- Respaldo en la base (sobrevive reinicios y lo ven todos los workers) ---
+# Sentencias sobre la tabla y no sobre el modelo: van en cada petición con
+# clave y así se saltan el camino ORM de UPDATE/SELECT. El reclamo va en
+# texto porque el ON CONFLICT de SQLAlchemy no entra al caché de
+# compilación; pisa la fila solo si es reclamable (ver _reclamable).
+TABLA = RespuestaIdempotente.__table__
+RECLAMAR = text(
+    "INSERT INTO respuestas_idempotentes (clave, huella, creada) VALUES (:clave, :huella, :creada) "
+    "ON CONFLICT (clave) DO UPDATE SET huella = excluded.huella, creada = excluded.creada, "
+    "codigo = NULL, tipo_contenido = NULL, cuerpo = NULL "
+    "WHERE creada < :vencida OR (codigo IS NULL AND creada < :abandonada)"
+).bindparams(*(bindparam(nombre, type_=DateTime()) for nombre in ("creada", "vencida", "abandonada")))
+
+
+class AlmacenIdempotencia:
+    def __init__(self, sesiones, ttl_segundos: float):
+        self.sesiones = sesiones
+        self.ttl_segundos = ttl_segundos
+
+    def _limites(self, ahora: datetime) -> dict:
+        return {"vencida": ahora - timedelta(seconds=self.ttl_segundos), "abandonada": ahora - RECLAMO_ABANDONADO}
+
+    def _reclamable(self, ahora: datetime):
+        """Filas que otra petición puede pisar: vencidas, o reclamadas por un worker que murió."""
+        limites = self._limites(ahora)
+        return or_(
+            TABLA.c.creada < limites["vencida"],
+            and_(TABLA.c.codigo.is_(None), TABLA.c.creada < limites["abandonada"]),
+        )
+
+    def consultar(self, clave: str) -> Respuesta | None:
+        """
+        Lo guardado con `clave` (codigo=None mientras la otra petición no ha
+        respondido), o None si está libre. Solo lee: no toma el bloqueo de escritura.
+        """
+        with self.sesiones() as db:
+            fila = db.execute(
+                select(TABLA.c.huella, TABLA.c.codigo, TABLA.c.tipo_contenido, TABLA.c.cuerpo)
+                .where(TABLA.c.clave == clave, not_(self._reclamable(datetime.now())))
+            ).first()
+            return None if fila is None else Respuesta(*fila)
+
+    def reclamar(self, db, clave: str, huella: str) -> bool:
+        """
+        Escribe el reclamo dentro de la transacción de `db` (la de la ruta);
+        False si otra petición ya tiene la clave.
+        """
+        ahora = datetime.now()
+        return db.execute(RECLAMAR, {"clave": clave, "huella": huella, "creada": ahora, **self._limites(ahora)}).rowcount == 1
+
+    def guardar(self, clave: str, respuesta: Respuesta):
+        with self.sesiones() as db:
+            db.execute(
+                update(TABLA)
+                .where(TABLA.c.clave == clave, TABLA.c.huella == respuesta.huella)
+                .values(codigo=respuesta.codigo, tipo_contenido=respuesta.tipo_contenido, cuerpo=respuesta.cuerpo)
+            )
+            db.commit()
+
+    def liberar(self, clave: str, huella: str):
+        """Suelta un reclamo sin respuesta guardable: el próximo reintento se ejecuta."""
+        with self.sesiones() as db:
+            db.execute(delete(TABLA).where(TABLA.c.clave == clave, TABLA.c.huella == huella, TABLA.c.codigo.is_(None)))
+            db.commit()
+
+    def purgar(self) -> int:
+        limite = datetime.now() - timedelta(seconds=self.ttl_segundos)
+        with self.sesiones() as db:
+            borradas = db.execute(delete(RespuestaIdempotente).where(RespuestaIdempotente.creada < limite)).rowcount
+            db.commit()
+        return borradas
+
+
+# --- Reclamo en el commit de la ruta ---
+# La clave no se reclama en una transacción aparte: el primer commit de la
+# ruta inserta la fila en la misma transacción que el ingreso, la salida o
+# el pago. Si otra petición con la clave ya la escribió, ese commit falla
+# con ClaveEnUso y la ruta deshace lo suyo; una petición que no escribe
+# nada tampoco escribe su clave.
+class ClaveEnUso(Exception):
+    """Otra petición con la misma Idempotency-Key ya escribió: esta no debe hacerlo."""
+
+
+class Reclamo:
+    def __init__(self, almacen: AlmacenIdempotencia, clave: str, huella: str):
+        self.almacen = almacen
+        self.clave = clave
+        self.huella = huella
+        self.escrito = False  # el reclamo ya está en la base (commit de la ruta)
+        self.perdido = False  # otra petición tenía la clave: la respuesta de esta se descarta
+
+
+reclamo_actual: ContextVar[Reclamo | None] = ContextVar("reclamo_actual", default=None)
+
+
+@event.listens_for(Session, "before_commit")
+def _reclamar_en_commit(db):
+    reclamo = reclamo_actual.get()
+    if reclamo is None or reclamo.escrito:
+        return
+    if reclamo.perdido or not reclamo.almacen.reclamar(db, reclamo.clave, reclamo.huella):
+        reclamo.perdido = True
+        raise ClaveEnUso(reclamo.clave)
+    db.info["reclamo"] = reclamo
+
+
+@event.listens_for(Session, "after_commit")
+def _reclamo_escrito(db):
+    reclamo = db.info.pop("reclamo", None)
+    if reclamo is not None:
+        reclamo.escrito = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _reclamo_deshecho(db):
+    db.info.pop("reclamo", None)
+
+
+# --- Middleware ASGI ---
+async def _leer_cuerpo(receive) -> bytes:
+    partes = []
+    while True:
+        mensaje = await receive()
+        partes.append(mensaje.get("body", b""))
+        if not mensaje.get("more_body"):
+            return b"".join(partes)
+
+
+async def _responder(send, codigo: int, cuerpo: bytes, tipo_contenido: str | None, extra=()):
+    encabezados = [(b"content-length", str(len(cuerpo)).encode()), *extra]
+    if tipo_contenido:
+        encabezados.append((b"content-type", tipo_contenido.encode()))
+    await send({"type": "http.response.start", "status": codigo, "headers": encabezados})
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+async def _error(send, codigo: int, detalle: str):
+    await _responder(send, codigo, json.dumps({"detail": detalle}, ensure_ascii=False).encode(), "application/json")
+
+
+class MiddlewareIdempotencia:
+    """
+    Idempotency-Key en los POST de `rutas`. La primera petición con una
+    clave se ejecuta y su respuesta queda en `cache` (LRU con TTL) y, si la
+    ruta escribió, en `almacen`; un reintento la recibe igual, con
+    Idempotent-Replayed: true. Si no está en `cache` (otro worker, reinicio)
+    la ruta corre, pero su commit choca con el reclamo y se descarta. Si
+    llega mientras la primera sigue en curso, espera su respuesta.
+    """
+
+    def __init__(self, app, rutas, cache, almacen: AlmacenIdempotencia):
+        self.app = app
+        self.rutas = set(rutas)
+        self.cache = cache
+        self.almacen = almacen
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.rutas:
+            await self.app(scope, receive, send)
+            return
+        clave = Headers(scope=scope).get("idempotency-key")
+        if not clave:
+            await self.app(scope, receive, send)
+            return
+        if len(clave) > LARGO_MAXIMO_CLAVE:
+            await _error(send, 400, f"La Idempotency-Key no puede pasar de {LARGO_MAXIMO_CLAVE} caracteres.")
+            return
+
+        cuerpo = await _leer_cuerpo(receive)
+        huella = hashlib.sha256(b"\n".join([
+            scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), cuerpo,
+        ])).hexdigest()
+
+        respuesta = self.cache.obtener(clave)
+        limite = time.monotonic() + ESPERA_EN_CURSO
+        while respuesta is None:
+            # Sin consultar antes la base: lo normal es una clave nueva, y si
+            # otra petición ya la tiene, la ruta no alcanza a escribir
+            if await self._ejecutar(scope, receive, send, clave, huella, cuerpo):
+                return
+            respuesta = await run_in_threadpool(self.almacen.consultar, clave)
+            while respuesta is not None and respuesta.codigo is None and respuesta.huella == huella:
+                if time.monotonic() > limite:
+                    await _error(send, 409, "Hay otra petición con la misma Idempotency-Key en curso; reintenta.")
+                    return
+                await asyncio.sleep(0.05)
+                respuesta = await run_in_threadpool(self.almacen.consultar, clave)
+            # None: la otra petición soltó la clave (5xx); esta se ejecuta de nuevo
+
+        if respuesta.huella != huella:
+            await _error(send, 422, "La Idempotency-Key ya se usó con otra petición.")
+            return
+        self.cache.guardar(clave, respuesta)
+        scope["route"] = EtiquetaRuta(scope["path"])
+        await _responder(send, respuesta.codigo, respuesta.cuerpo, respuesta.tipo_contenido,
+                         [(b"idempotent-replayed", b"true")])
+
+    async def _ejecutar(self, scope, receive, send, clave: str, huella: str, cuerpo: bytes) -> bool:
+        """
+        Corre la ruta y entrega su respuesta. False, sin enviar nada, si otra
+        petición ya tiene la clave: el llamador espera la respuesta de ella.
+        """
+        codigo, tipo_contenido, partes, mensajes = 500, None, [], []
+        entregado = False
+
+        async def recibir():
+            nonlocal entregado
+            if not entregado:
+                entregado = True
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+            return await receive()
+
+        async def enviar(mensaje):
+            nonlocal codigo, tipo_contenido
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+                tipo_contenido = Headers(raw=mensaje["headers"]).get("content-type")
+            elif mensaje["type"] == "http.response.body":
+                partes.append(mensaje.get("body", b""))
+            mensajes.append(mensaje)
+
+        reclamo = Reclamo(self.almacen, clave, huella)
+        token = reclamo_actual.set(reclamo)
+        try:
+            await self.app(scope, recibir, enviar)
+        except Exception:
+            if not reclamo.perdido:
+                raise
+        finally:
+            reclamo_actual.reset(token)
+        if not reclamo.escrito and (reclamo.perdido or await run_in_threadpool(self.almacen.consultar, clave)):
+            # Otra petición con la clave escribió mientras esta corría
+            return False
+
+        respuesta = Respuesta(huella, codigo, tipo_contenido, b"".join(partes))
+        if guardable(codigo):
+            self.cache.guardar(clave, respuesta)
+            if reclamo.escrito:
+                await run_in_threadpool(self.almacen.guardar, clave, respuesta)
+        elif reclamo.escrito:
+            await run_in_threadpool(self.almacen.liberar, clave, huella)
+        for mensaje in mensajes:
+            await send(mensaje)
+        return True
@@ -0,0 +1,98 @@
+# lotes.py
+import json
+from contextlib import contextmanager
+from threading import RLock
+from database import lote_actual
+
+PREFIJO = "/lotes/"
+
+
+@contextmanager
+def en_lote(lote: str):
+    """Corre el bloque como si fuera una petición de `lote` (sesiones, índices, caches y config)."""
+    token = lote_actual.set(lote)
+    try:
+        yield
+    finally:
+        lote_actual.reset(token)
+
+
+# --- Un objeto por lote detrás de un solo nombre ---
+class PorLote:
+    """
+    Reemplaza a un objeto global de main.py (índice, cache, motor de
+    tarifas...) por uno por lote. `crear()` corre dentro del lote la primera
+    vez que se usa, así que lee la configuración y la base de ese lote; los
+    atributos y llamadas van al objeto del lote de la petición en curso.
+    """
+
+    __slots__ = ("_crear", "_objetos", "_lock")
+
+    def __init__(self, crear):
+        self._crear = crear
+        self._objetos = {}
+        self._lock = RLock()
+
+    def de(self, lote: str | None = None):
+        """El objeto de `lote` (por defecto, el de la petición en curso)."""
+        lote = lote or lote_actual.get()
+        objeto = self._objetos.get(lote)
+        if objeto is None:
+            with self._lock:
+                if lote not in self._objetos:
+                    with en_lote(lote):
+                        self._objetos[lote] = self._crear()
+                objeto = self._objetos[lote]
+        return objeto
+
+    def reemplazar(self, objeto):
+        """Cambia el objeto del lote actual (p. ej. el motor de tarifas recompilado)."""
+        self._objetos[lote_actual.get()] = objeto
+
+    def creados(self) -> list:
+        return list(self._objetos.values())
+
+    def __getattr__(self, nombre):
+        return getattr(self.de(), nombre)
+
+    def __call__(self, *args, **kwargs):
+        return self.de()(*args, **kwargs)
+
+    def __len__(self):
+        return len(self.de())
+
+
+# --- Middleware ASGI: /lotes/<lote>/<ruta> ---
+class MiddlewareLotes:
+    """
+    /lotes/<lote>/<ruta> atiende <ruta> con la base y el estado de <lote>
+    (como un Mount: el prefijo pasa a root_path). Las rutas sin prefijo son
+    del lote por defecto, así que las pantallas y clientes de un solo lote
+    siguen igual. Va por fuera de los demás middlewares: idempotencia y
+    métricas ya ven el lote.
+    """
+
+    def __init__(self, app, lotes):
+        self.app = app
+        self.lotes = set(lotes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or not scope["path"].startswith(PREFIJO):
+            await self.app(scope, receive, send)
+            return
+        lote, _, resto = scope["path"][len(PREFIJO):].partition("/")
+        if lote not in self.lotes:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 4404})
+                return
+            cuerpo = json.dumps({"detail": f"Lote desconocido: {lote}"}, ensure_ascii=False).encode()
+            await send({"type": "http.response.start", "status": 404, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(cuerpo)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": cuerpo})
+            return
+        ruta = "/" + resto
+        scope = {**scope, "path": ruta, "raw_path": ruta.encode(),
+                 "root_path": scope.get("root_path", "") + PREFIJO + lote}
+        with en_lote(lote):
+            await self.app(scope, receive, send)
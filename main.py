@@ -1,43 +1,148 @@
-from fastapi import FastAPI, Depends, Request, HTTPException, Query, Form, APIRouter
+from fastapi import FastAPI, Depends, Request, HTTPException, Query, Form, APIRouter, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from database import SessionLocal, engine, get_db
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import and_, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import (
+    LOTE_POR_DEFECTO, LOTES, SessionLocal, carpeta_archivo, carpeta_diario, crear_engine_async, get_db_lectura, lote_actual,
+    ruta_base, ruta_config,
+)
 import models
 from datetime import datetime, timedelta
 from datetime import timezone
-import pytz
+from functools import lru_cache
+from itertools import islice
+from contextlib import asynccontextmanager
 from math import ceil
 import json
+import os
+import asyncio
 from pathlib import Path
 import re
-from dateutil.relativedelta import relativedelta
 from models import Registro, Casillero, Moto
-
-app = FastAPI()
+from ocupacion import IndiceOcupacion
+from cache import CacheLRU
+from busqueda import IndicePrefijos
+from tarifas import MotorTarifas
+from configuracion import GestorConfiguracion
+from tablero import CanalOcupacion
+from vencimientos import AgendaMensualidades
+from metricas import Metricas, MiddlewareMetricas, cronometro
+from idempotencia import AlmacenIdempotencia, MiddlewareIdempotencia
+import resumen as resumen_diario
+import consultas
+from exportacion import fusionar, pagina, respuesta_streaming, validar_paginacion
+from archivo import Archivo
+from analitica import Analitica, rango_por_defecto
+from migraciones import avisar_planes, preparar_esquema
+from lotes import MiddlewareLotes, PorLote, en_lote
+from diario import Diario, MiddlewareDiario
+
+# --- Arranque y apagado (lifespan) ---
+# Importar main no toca la base: el trabajo de arranque corre aquí, una vez
+# por proceso, cuando uvicorn (o el TestClient) levanta la aplicación.
+# Cada lote prepara su base y vigila su config.json; las tareas heredan el lote.
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    parar_tareas = asyncio.Event()
+    tareas = []
+    for lote in LOTES:
+        with en_lote(lote):
+            await run_in_threadpool(preparar_base)
+            tareas += [
+                asyncio.create_task(configuracion.observar(parar_tareas)),
+                asyncio.create_task(agenda_mensualidades.programar(hora_colombia, cambio_de_dia, parar_tareas)),
+            ]
+        if len(LOTES) > 1:
+            print(f"🅿️ Lote {lote} listo")
+    yield
+    parar_tareas.set()
+    await asyncio.gather(*tareas, return_exceptions=True)
+    if engine_async is not None:
+        for motor in engine_async.creados() + engine_async_lectura.creados():
+            await motor.dispose()
+    for diario_lote in diario.creados():
+        diario_lote.cerrar()
+
+app = FastAPI(lifespan=ciclo_de_vida)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 
+# --- Varios parqueaderos (lotes) en un despliegue ---
+# Cada lote de lotes.json tiene su base y su config.json; sus rutas son las
+# mismas bajo /lotes/<lote>/ (las rutas sin prefijo son del lote por defecto).
+# El estado en memoria de abajo (configuración, caches, índices, tablero...)
+# es PorLote: cada nombre apunta al objeto del lote de la petición en curso.
 
-# --- Crear todas las tablas ---
-models.Base.metadata.create_all(bind=engine)
-
-# --- Cargar configuración ---
+# --- Cargar configuración (instantánea validada; se recarga cuando cambia config.json) ---
 BASE_DIR = Path(__file__).parent
-CONFIG_PATH = BASE_DIR / "config.json"
-with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-    config = json.load(f)
-
-
-
+suscriptores_config = []
+configuracion = PorLote(lambda: GestorConfiguracion(ruta_config(), suscriptores_config))
+# Lo que es de todo el proceso (métricas, motor_bd) sale del lote por defecto
+config = configuracion.de(LOTE_POR_DEFECTO).actual
+
+# --- Caches de consultas de la portería (placa -> moto, teléfono -> propietario) ---
+def crear_cache_consultas():
+    cache_consultas = configuracion.actual.cache_consultas
+    return CacheLRU(cache_consultas.max_entradas, cache_consultas.ttl_segundos)
+
+cache_motos = PorLote(crear_cache_consultas)
+cache_propietarios = PorLote(crear_cache_consultas)
+
+# --- Registros archivados (segmentos mensuales comprimidos, ver archivar.py) ---
+archivo = PorLote(lambda: Archivo(carpeta_archivo()))
+analitica = PorLote(lambda: Analitica(archivo.de()))
+
+# --- Idempotency-Key en ingresos, salidas y pagos ---
+# Un reintento con la misma clave recibe la respuesta guardada en lugar de
+# registrar dos veces. Se agrega antes que las métricas para que estas
+# queden por fuera y también midan los reintentos.
+RUTAS_IDEMPOTENTES = (
+    "/registros/", "/registrar_ingreso", "/registros/lote",
+    "/registros/salida/", "/registros/salida/lote", "/registros/pago_mensualidad/",
+)
+cache_idempotencia = PorLote(lambda: CacheLRU(
+    configuracion.actual.idempotencia.max_entradas, configuracion.actual.idempotencia.ttl_segundos
+))
+almacen_idempotencia = PorLote(lambda: AlmacenIdempotencia(SessionLocal, configuracion.actual.idempotencia.ttl_segundos))
+
+# --- Diario de eventos de portería (commit en grupo, ver diario.py) ---
+# Con "diario": {"activo": true} entradas, salidas y pagos quedan en un
+# archivo append-only con un fsync por tanda; la respuesta sale cuando su
+# evento está en disco. Va por dentro de la idempotencia (se agrega antes).
+diario = PorLote(lambda: Diario(carpeta_diario(), **configuracion.actual.diario.model_dump()))
+app.add_middleware(MiddlewareDiario, rutas=RUTAS_IDEMPOTENTES, diario=diario)
+app.add_middleware(
+    MiddlewareIdempotencia, rutas=RUTAS_IDEMPOTENTES, cache=cache_idempotencia, almacen=almacen_idempotencia
+)
+
+# --- Métricas por ruta (GET /metrics) ---
+metricas = Metricas(config.metricas.peticion_lenta_ms, config.metricas.sentencias_en_log)
+for lote in LOTES:
+    metricas.instrumentar(SessionLocal.engine(lote))
+    metricas.instrumentar(SessionLocal.engine_lectura(lote))
+app.add_middleware(MiddlewareMetricas, metricas=metricas)
+
+
+
+
+# --- Motor de tarifas (compilado desde config.json) ---
+motor_tarifas = PorLote(lambda: MotorTarifas.desde_config(configuracion.actual.tarifas_dict()))
 
 # --- Función hora Colombia ---
+@lru_cache(maxsize=1)
+def zona_colombia():
+    import pytz  # se carga con la primera petición, no al importar
+    return pytz.timezone("America/Bogota")
+
 def hora_colombia():
-    tz = pytz.timezone("America/Bogota")
-    return datetime.now(tz)
+    return datetime.now(zona_colombia())
 
 # --- Dependencia para obtener la sesión DB ---
 def get_db():
@@ -47,19 +152,241 @@ def get_db():
     finally:
         db.close()
 
+# --- Motor asíncrono opcional (motor_bd en config.json o PARQUEADERO_MOTOR_BD) ---
+MOTOR_BD = os.getenv("PARQUEADERO_MOTOR_BD", config.motor_bd)
+def crear_engine_async_instrumentado(solo_lectura: bool = False):
+    motor = crear_engine_async(solo_lectura=solo_lectura)
+    metricas.instrumentar(motor.sync_engine)
+    return motor
+
+engine_async = PorLote(crear_engine_async_instrumentado) if MOTOR_BD == "async" else None
+SesionAsync = PorLote(lambda: async_sessionmaker(engine_async.de(), autoflush=False)) if engine_async is not None else None
+# Reportes en modo async: engine de solo lectura aparte, como SessionLocal.lectura()
+engine_async_lectura = PorLote(lambda: crear_engine_async_instrumentado(solo_lectura=True)) if engine_async is not None else None
+SesionAsyncLectura = (
+    PorLote(lambda: async_sessionmaker(engine_async_lectura.de(), autoflush=False)) if engine_async is not None else None
+)
+
+async def get_db_async():
+    async with SesionAsync() as db:
+        yield db
+
+async def get_db_async_lectura():
+    await run_in_threadpool(SessionLocal.copia_al_dia)
+    async with SesionAsyncLectura() as db:
+        yield db
+
 # --- Inicializar casilleros ---
 def inicializar_casilleros():
+    """Crea de una vez los casilleros que falten hasta total_casilleros."""
+    total = configuracion.actual.total_casilleros
+    with SessionLocal() as db:
+        ultimo = db.query(func.max(models.Casillero.numero)).scalar() or 0
+        if ultimo >= total:
+            return
+        # Un solo INSERT masivo; OR IGNORE por si otro worker arrancó a la vez
+        db.execute(
+            sqlite_insert(models.Casillero).on_conflict_do_nothing(index_elements=["numero"]),
+            [{"numero": i, "disponible": True, "cascos_ocupados": 0} for i in range(ultimo + 1, total + 1)],
+        )
+        db.commit()
+    print(f"✅ {total} casilleros inicializados")
+
+# --- Índice de ocupación de casilleros (se construye una vez al arrancar) ---
+indice_casilleros = PorLote(lambda: IndiceOcupacion(configuracion.actual.capacidad_por_casillero))
+
+def cargar_indice_casilleros():
     db = SessionLocal()
-    total = config["total_casilleros"]
-    existentes = db.query(models.Casillero).count()
-    for i in range(existentes + 1, total + 1):
-        casillero = models.Casillero(numero=i, disponible=True)
-        db.add(casillero)
-    db.commit()
+    casilleros = db.query(models.Casillero.id, models.Casillero.numero).all()
+    ocupacion = dict(
+        db.query(models.AsignacionCasillero.id_casillero, func.sum(models.AsignacionCasillero.cascos))
+        .join(models.Registro)
+        .filter(models.Registro.hora_salida.is_(None))
+        .group_by(models.AsignacionCasillero.id_casillero)
+        .all()
+    )
     db.close()
-    print(f"✅ {total} casilleros inicializados")
+    indice_casilleros.cargar(casilleros, ocupacion)
+
+# Con varios workers sobre una base, otro proceso pudo ocupar o liberar un
+# casillero sin que este índice se enterara: ante un 409 de la base, o si el
+# índice no encuentra espacio, se trae la ocupación real y se vuelve a planear.
+INTENTOS_RESERVA = 3
+
+def sincronizar_casilleros(db: Session, ids=None):
+    """Pasa al índice la ocupación de la base (de `ids` o de todos los casilleros)."""
+    consulta = db.query(models.Casillero.id, models.Casillero.cascos_ocupados)
+    if ids is not None:
+        consulta = consulta.filter(models.Casillero.id.in_(set(ids)))
+    # Leer y aplicar bajo el lock: ni un confirmar() ni otra sincronización
+    # caben en medio, así que una lectura vieja no pisa a una más nueva
+    with indice_casilleros.lock:
+        indice_casilleros.sincronizar(dict(consulta.all()))
+
+def reservar_casilleros(db: Session, num_cascos: int):
+    """indice_casilleros.reservar; si no hay espacio en el índice, lo confirma contra la base."""
+    plan = indice_casilleros.reservar(num_cascos)
+    if plan is None:
+        sincronizar_casilleros(db)
+        plan = indice_casilleros.reservar(num_cascos)
+    return plan
+
+
+# --- Índices de búsqueda por prefijo (placas y teléfonos) ---
+indice_placas = PorLote(IndicePrefijos)
+indice_telefonos = PorLote(IndicePrefijos)
+
+def dato_placa(placa: str, propietario_telefono):
+    return {"placa": placa, "propietario_telefono": propietario_telefono}
+
+def dato_telefono(telefono, nombre: str, apellido: str):
+    return {"telefono": telefono, "nombre": nombre, "apellido": apellido}
+
+def cargar_indices_busqueda():
+    db = SessionLocal()
+    indice_placas.cargar(
+        (placa, dato_placa(placa, telefono))
+        for placa, telefono in db.query(models.Moto.placa, models.Moto.propietario_telefono)
+    )
+    indice_telefonos.cargar(
+        (str(telefono), dato_telefono(telefono, nombre, apellido))
+        for telefono, nombre, apellido in db.query(
+            models.Propietario.telefono, models.Propietario.nombre, models.Propietario.apellido
+        )
+    )
+    db.close()
+
+
+# --- Resumen diario de recaudo (se llena desde registros si está vacío) ---
+def inicializar_resumen_diario():
+    db = SessionLocal()
+    resumen_diario.reconstruir_si_vacio(db, archivo)
+    db.close()
+
+
+# --- Tablero en vivo (WebSocket /ws/ocupacion) ---
+# Estado en memoria que se actualiza con cada commit de ingreso, salida o
+# pago: las pantallas reciben deltas y nunca consultan la base.
+def crear_canal_ocupacion():
+    indice = indice_casilleros.de()
+    return CanalOcupacion(lambda ids: {indice.numero(i): indice.ocupacion(i) for i in ids})
+
+canal_ocupacion = PorLote(crear_canal_ocupacion)
+
+def cargar_tablero():
+    hoy = hora_colombia().date()
+    inicio = datetime.combine(hoy, datetime.min.time())
+    db = SessionLocal()
+    activos = db.query(func.count(Registro.id)).filter(Registro.hora_salida.is_(None)).scalar()
+    totales = resumen_diario.totales_por_tipo(db, inicio, inicio + timedelta(days=1, microseconds=-1), None, hoy)
+    db.close()
+    canal_ocupacion.cargar(activos, hoy, totales)
+
+def instantanea_tablero():
+    return canal_ocupacion.instantanea(hora_colombia().date(), indice_casilleros.casilleros())
 
-inicializar_casilleros()
+
+# --- Agenda de mensualidades (vencidas, vencen hoy y esta semana) ---
+# Se carga al arrancar y cada medianoche; entre tanto la mueven los
+# ingresos y los pagos. GET /mensualidades/vencimientos la lee sin consultar la base.
+agenda_mensualidades = PorLote(AgendaMensualidades)
+
+def cargar_agenda_mensualidades():
+    db = SessionLocal()
+    ultimos = db.query(func.max(Registro.id).label("id")).group_by(Registro.placa_moto).subquery()
+    pares = (
+        db.query(Registro.placa_moto, Registro.proximo_pago)
+        .join(ultimos, Registro.id == ultimos.c.id)
+        .filter(Registro.tipo_cobro == "mensualidad")
+        .all()
+    )
+    db.close()
+    agenda_mensualidades.cargar(pares, hora_colombia().date())
+
+def cambio_de_dia():
+    cargar_agenda_mensualidades()
+    diario.podar(ruta_base())
+    borradas = almacen_idempotencia.purgar()
+    if borradas:
+        print(f"🧹 {borradas} respuestas idempotentes vencidas borradas")
+
+def agendar(registro: Registro):
+    """Pasa a la agenda el último registro de la placa (si no es de mensualidad, la placa sale)."""
+    proximo_pago = registro.proximo_pago if registro.tipo_cobro == "mensualidad" else None
+    agenda_mensualidades.actualizar(registro.placa_moto, proximo_pago)
+
+# --- Recarga en caliente de config.json ---
+# Cada suscriptor reconstruye solo su parte y solo si su sección cambió;
+# las peticiones en curso siguen con los objetos que ya tenían.
+# Corren en el lote cuyo config.json cambió.
+def aplicar_tarifas(anterior, nueva):
+    if anterior.tarifas_dict() != nueva.tarifas_dict():
+        motor_tarifas.reemplazar(MotorTarifas.desde_config(nueva.tarifas_dict()))
+        print(f"💲 Tarifas recompiladas ({', '.join(motor_tarifas.tablas)})")
+
+def aplicar_casilleros(anterior, nueva):
+    if nueva.capacidad_por_casillero != anterior.capacidad_por_casillero:
+        indice_casilleros.cambiar_capacidad(nueva.capacidad_por_casillero)
+        db = SessionLocal()
+        db.execute(update(models.Casillero).values(
+            disponible=func.coalesce(models.Casillero.cascos_ocupados, 0) < nueva.capacidad_por_casillero
+        ))
+        db.commit()
+        db.close()
+        print(f"📦 Capacidad por casillero: {nueva.capacidad_por_casillero}")
+    if nueva.total_casilleros > anterior.total_casilleros:
+        inicializar_casilleros()
+        db = SessionLocal()
+        for casillero_id, numero in db.query(models.Casillero.id, models.Casillero.numero).filter(
+            models.Casillero.numero > anterior.total_casilleros
+        ):
+            indice_casilleros.agregar_casillero(casillero_id, numero)
+        db.close()
+    elif nueva.total_casilleros < anterior.total_casilleros:
+        print("⚠️ Reducir total_casilleros no retira casilleros existentes; se ignora hasta reiniciar.")
+
+def aplicar_cache(anterior, nueva):
+    if nueva.cache_consultas != anterior.cache_consultas:
+        for cache in (cache_motos, cache_propietarios):
+            cache.configurar(nueva.cache_consultas.max_entradas, nueva.cache_consultas.ttl_segundos)
+
+def aplicar_metricas(anterior, nueva):
+    if nueva.metricas != anterior.metricas and lote_actual.get() == LOTE_POR_DEFECTO:
+        metricas.configurar(nueva.metricas.peticion_lenta_ms, nueva.metricas.sentencias_en_log)
+
+def aplicar_idempotencia(anterior, nueva):
+    if nueva.idempotencia != anterior.idempotencia:
+        cache_idempotencia.configurar(nueva.idempotencia.max_entradas, nueva.idempotencia.ttl_segundos)
+        almacen_idempotencia.de().ttl_segundos = nueva.idempotencia.ttl_segundos
+
+def aplicar_diario(anterior, nueva):
+    if nueva.diario != anterior.diario:
+        diario.configurar(**nueva.diario.model_dump())
+        print(f"📓 Diario de eventos {'activo' if nueva.diario.activo else 'apagado'} (ventana {nueva.diario.ventana_ms:g} ms)")
+
+def avisar_perfil_sqlite(anterior, nueva):
+    if nueva.perfil_sqlite != anterior.perfil_sqlite or nueva.model_extra.get("sqlite") != anterior.model_extra.get("sqlite"):
+        print("⚠️ El perfil de SQLite se aplica al abrir el engine: reinicia para usar el nuevo.")
+    if nueva.motor_bd != anterior.motor_bd:
+        print("⚠️ motor_bd elige las rutas al arrancar: reinicia para cambiar entre sync y async.")
+
+suscriptores_config.extend((aplicar_tarifas, aplicar_casilleros, aplicar_cache, aplicar_metricas, aplicar_idempotencia,
+                            aplicar_diario, avisar_perfil_sqlite))
+
+# --- Preparación de la base (la llama ciclo_de_vida al arrancar, una vez por lote) ---
+def preparar_base():
+    preparar_esquema(models.Base.metadata, SessionLocal.engine())
+    avisar_planes(SessionLocal.engine())
+    # Antes de cargar índices y tablero: lo que la base perdió en una caída vuelve del diario
+    diario.recuperar(SessionLocal)
+    diario.podar(ruta_base())
+    inicializar_casilleros()
+    cargar_indice_casilleros()
+    cargar_indices_busqueda()
+    inicializar_resumen_diario()
+    cargar_tablero()
+    cargar_agenda_mensualidades()
+    almacen_idempotencia.purgar()
 
 # --- ENDPOINTS ---
 
@@ -93,20 +420,29 @@ def crear_propietario(nombre: str, apellido: str, telefono: str, db: Session = D
     db.add(nuevo_propietario)
     db.commit()
     db.refresh(nuevo_propietario)
+    cache_propietarios.invalidar(telefono)
+    indice_telefonos.guardar(telefono, dato_telefono(nuevo_propietario.telefono, nuevo_propietario.nombre, nuevo_propietario.apellido))
 
     return {"mensaje": "Propietario creado correctamente", "data": {"nombre": nombre, "apellido": apellido, "telefono": telefono}}
 
 # Consultar un propietario
 @app.get("/propietarios/{telefono}")
 def obtener_propietario(telefono: str, db: Session = Depends(get_db)):
+    en_cache = cache_propietarios.obtener(telefono)
+    if en_cache is not None:
+        return en_cache
+    version = cache_propietarios.version()
+
     propietario = db.query(models.Propietario).filter(models.Propietario.telefono == telefono).first()
     if not propietario:
         raise HTTPException(status_code=404, detail="Propietario no encontrado")
-    return {
+    respuesta = {
         "nombre": propietario.nombre,
         "apellido": propietario.apellido,
         "telefono": propietario.telefono
     }
+    cache_propietarios.guardar(telefono, respuesta, version)
+    return respuesta
 
 
 # 🧾 Editar propietario existente
@@ -130,6 +466,13 @@ def editar_propietario(
     db.commit()
     db.refresh(propietario)
 
+    # El nombre del propietario también va en la respuesta cacheada de sus motos
+    afectados = {str(telefono), str(propietario.telefono)}
+    cache_propietarios.invalidar(*afectados)
+    cache_motos.invalidar_si(lambda m: str(m["propietario"]["telefono"]) in afectados)
+    indice_telefonos.quitar(str(telefono))
+    indice_telefonos.guardar(str(propietario.telefono), dato_telefono(propietario.telefono, propietario.nombre, propietario.apellido))
+
     return {
         "mensaje": "Propietario actualizado correctamente",
         "data": {
@@ -142,23 +485,69 @@ def editar_propietario(
 
 
 
-#Ver propietarios
+#Ver propietarios (paginado con cursor; formato=ndjson|csv exporta por streaming)
+def consulta_propietarios(db: Session, cursor: int | None):
+    consulta = db.query(
+        models.Propietario.telefono.label("telefono"),
+        models.Propietario.nombre.label("nombre"),
+        models.Propietario.apellido.label("apellido"),
+    )
+    if cursor is not None:
+        consulta = consulta.filter(models.Propietario.telefono > cursor)
+    return consulta.order_by(models.Propietario.telefono)
+
+
 @app.get("/propietarios/")
-def listar_propietarios(db: Session = Depends(get_db)):
-    propietarios = db.query(models.Propietario).all()
-    return [
-        {
-            "telefono": p.telefono,
-            "nombre": p.nombre,
-            "apellido": p.apellido
-        }
-        for p in propietarios
-    ]
+def listar_propietarios(
+    cursor: int | None = None,
+    limite: int = 100,
+    formato: str = "json",
+    db: Session = Depends(get_db_lectura)
+):
+    validar_paginacion(limite, formato)
+    if formato != "json":
+        return respuesta_streaming(lambda s: consulta_propietarios(s, cursor), formato, "propietarios")
+    return pagina(consulta_propietarios(db, cursor), limite, "telefono")
+
+
+# Autocompletar placas y teléfonos por prefijo
+@app.get("/buscar")
+def buscar(q: str, k: int = 10, similares: bool = False):
+    if k < 1 or k > 100:
+        raise HTTPException(status_code=400, detail="k debe estar entre 1 y 100.")
+    q = q.strip().upper()
+    if not q:
+        return {"placas": [], "telefonos": [], "similares": []}
+
+    # Solo dígitos: es un teléfono; si no, una placa
+    if q.isdigit():
+        return {"placas": [], "telefonos": indice_telefonos.prefijo(q, k), "similares": []}
+
+    placas = indice_placas.prefijo(q, k)
+    # Placa casi completa sin coincidencias: sugerir las que difieren en un carácter
+    cercanas = indice_placas.similares(q, k) if similares and len(q) >= 5 and not placas else []
+    return {"placas": placas, "telefonos": [], "similares": cercanas}
+
+
+# Estadísticas de las caches de consulta
+@app.get("/cache/estadisticas")
+def estadisticas_cache():
+    return {
+        "motos": cache_motos.estadisticas(),
+        "propietarios": cache_propietarios.estadisticas(),
+        "idempotencia": cache_idempotencia.estadisticas(),
+    }
+
+
+# Métricas en formato de texto de Prometheus
+@app.get("/metrics")
+def exportar_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
 
 
 # Crear moto
 @app.post("/motos/")
-def crear_moto(placa: str, propietario_telefono: str, db: Session = Depends(get_db)):
+def crear_moto(placa: str, propietario_telefono: str, tipo_vehiculo: str = "moto", db: Session = Depends(get_db)):
 
     # Validar formato de la placa (3 letras + 2 números + opcional 1 letra)
     if not re.match(r"^[A-Z]{3}[0-9]{2}[A-Z]?$", placa.upper()):
@@ -166,6 +555,9 @@ def crear_moto(placa: str, propietario_telefono: str, db: Session = Depends(get_
 
     placa = placa.upper()
 
+    if tipo_vehiculo not in motor_tarifas.tablas:
+        raise HTTPException(status_code=400, detail=f"Tipo de vehículo inválido. Usa: {', '.join(motor_tarifas.tablas)}.")
+
     # Verificar que el propietario exista
     propietario = db.query(models.Propietario).filter(models.Propietario.telefono == propietario_telefono).first()
     if not propietario:
@@ -177,38 +569,70 @@ def crear_moto(placa: str, propietario_telefono: str, db: Session = Depends(get_
         return {"mensaje": f"La moto con placa {placa} ya está registrada."}
 
     # Crear y guardar la nueva moto
-    moto = models.Moto(placa=placa, propietario_telefono=propietario_telefono)
+    moto = models.Moto(placa=placa, propietario_telefono=propietario_telefono, tipo_vehiculo=tipo_vehiculo)
     db.add(moto)
     db.commit()
     db.refresh(moto)
+    cache_motos.invalidar(placa)
+    indice_placas.guardar(placa, dato_placa(placa, moto.propietario_telefono))
 
     return {"mensaje": "Moto registrada correctamente", "data": {"placa": moto.placa}}
 
 
-# Ver todas las motos
+# Ver motos (paginado con cursor; formato=ndjson|csv exporta por streaming)
+def consulta_motos(db: Session, cursor: str | None):
+    consulta = db.query(
+        models.Moto.placa.label("placa"),
+        models.Moto.propietario_telefono.label("propietario_telefono"),
+    )
+    if cursor is not None:
+        consulta = consulta.filter(models.Moto.placa > cursor.upper())
+    return consulta.order_by(models.Moto.placa)
+
+
 @app.get("/motos/")
-def listar_motos(db: Session = Depends(get_db)):
-    motos = db.query(models.Moto).all()
-    return motos
+def listar_motos(
+    cursor: str | None = None,
+    limite: int = 100,
+    formato: str = "json",
+    db: Session = Depends(get_db_lectura)
+):
+    validar_paginacion(limite, formato)
+    if formato != "json":
+        return respuesta_streaming(lambda s: consulta_motos(s, cursor), formato, "motos")
+    return pagina(consulta_motos(db, cursor), limite, "placa")
 
 @app.get("/motos/{placa}")
 def obtener_moto(placa: str, db: Session = Depends(get_db)):
     placa = placa.upper()
-    moto = db.query(models.Moto).filter(models.Moto.placa == placa).first()
-    if not moto:
+    en_cache = cache_motos.obtener(placa)
+    if en_cache is not None:
+        return en_cache
+    version = cache_motos.version()
+
+    # Moto y propietario en una sola consulta
+    fila = (
+        db.query(models.Moto, models.Propietario)
+        .outerjoin(models.Propietario, models.Propietario.telefono == models.Moto.propietario_telefono)
+        .filter(models.Moto.placa == placa)
+        .first()
+    )
+    if not fila:
         raise HTTPException(status_code=404, detail="Moto no encontrada")
+    moto, propietario = fila
 
-    propietario = db.query(models.Propietario).filter(models.Propietario.telefono == moto.propietario_telefono).first()
-
-    return {
+    respuesta = {
         "placa": moto.placa,
         "propietario": {
             "nombre": propietario.nombre if propietario else "Desconocido",
             "apellido": propietario.apellido if propietario else "Desconocido",
             "telefono": moto.propietario_telefono
         },
-        "tipo_cobro": moto.tipo_cobro if hasattr(moto, "tipo_cobro") else "No definido"
+        "tipo_cobro": moto.tipo_cobro if hasattr(moto, "tipo_cobro") else "No definido",
+        "tipo_vehiculo": moto.tipo_vehiculo
     }
+    cache_motos.guardar(placa, respuesta, version)
+    return respuesta
 
 # Editar Moto
 @app.put("/motos/{placa}")
@@ -233,6 +657,8 @@ def editar_moto(placa: str, nuevo_telefono: str, db: Session = Depends(get_db)):
     moto.propietario_telefono = nuevo_telefono
     db.commit()
     db.refresh(moto)
+    cache_motos.invalidar(placa)
+    indice_placas.guardar(placa, dato_placa(placa, moto.propietario_telefono))
 
     return {
         "mensaje": f"Teléfono actualizado correctamente para la moto {placa}",
@@ -246,15 +672,13 @@ def editar_moto(placa: str, nuevo_telefono: str, db: Session = Depends(get_db)):
 
 
 
-# Registrar entrada
-@app.post("/registros/")
-def crear_registro(
-    placa: str,
-    tipo_cobro: str = "por_horas",
-    num_cascos: int = 0,
-    observaciones: str | None = None,
-    db: Session = Depends(get_db)
-):
+# --- Helpers de ingreso (compartidos por /registros/ y /registros/lote) ---
+def validar_ingreso(placa: str, tipo_cobro: str, num_cascos: int):
+    # El lote llega como JSON sin modelo: los tipos se revisan aquí y no en pydantic
+    if not isinstance(placa, str) or not isinstance(tipo_cobro, str):
+        raise HTTPException(status_code=422, detail="La placa y el tipo de cobro deben ser texto.")
+    if not isinstance(num_cascos, int) or isinstance(num_cascos, bool):
+        raise HTTPException(status_code=422, detail="El número de cascos debe ser un entero (0, 1 o 2).")
     placa = placa.upper()
     tipo_cobro = tipo_cobro.lower().replace(" ", "_")
     if tipo_cobro not in ["por_horas", "por_dia", "mensualidad"]:
@@ -262,144 +686,131 @@ def crear_registro(
 
     if num_cascos < 0 or num_cascos > 2:
         raise HTTPException(status_code=400, detail="El número de cascos debe ser 0, 1 o 2.")
+    return placa, tipo_cobro
+
+
+def escribir_ingreso(db: Session, placa: str, tipo_cobro: str, num_cascos: int, observaciones: str | None, plan):
+    """Aplica un plan ya reservado en el índice: casilleros + registro, sin commit."""
+    capacidad = indice_casilleros.capacidad
+    for casillero_id, uso in plan:
+        # UPDATE condicional: la base rechaza el cambio si el casillero se llenaría
+        ocupados = func.coalesce(models.Casillero.cascos_ocupados, 0)
+        resultado = db.execute(
+            update(models.Casillero)
+            .where(models.Casillero.id == casillero_id, ocupados + uso <= capacidad)
+            .values(cascos_ocupados=ocupados + uso, disponible=ocupados + uso < capacidad)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount != 1:
+            raise HTTPException(status_code=409, detail=f"Espacio insuficiente en casillero {indice_casilleros.numero(casillero_id)} al reservar.")
 
-    # Verificar moto
-    moto = db.query(models.Moto).filter(models.Moto.placa == placa).first()
-    if not moto:
-        raise HTTPException(status_code=404, detail="Moto no registrada.")
-
-    # Verificar registro activo
-    activo = db.query(models.Registro).filter(
-        models.Registro.placa_moto == placa,
-        models.Registro.hora_salida.is_(None)
-    ).first()
-    if activo:
-        raise HTTPException(status_code=400, detail="La moto ya tiene un registro activo.")
-
-    # Helper: ocupación real en un casillero (basado en registros activos)
-    def ocupacion_actual(casillero_id: int) -> int:
-        registros_activos = db.query(models.Registro).filter(
-            models.Registro.id_casillero == casillero_id,
-            models.Registro.hora_salida.is_(None)
-        ).all()
-        return sum(r.cascos or 0 for r in registros_activos)
-
-    # Traer casilleros ordenados (por 'numero' si lo tienes, si no por id)
-    casilleros = db.query(models.Casillero).order_by(models.Casillero.id).all()
-
-    # Construir listas con ocupación actual
-    parciales = []  # (casillero_obj, ocup)
-    vacios = []     # casillero_obj
-    suficientes = []  # casilleros con espacio >= num_cascos (para buscar único casillero)
-
-    for c in casilleros:
-        ocup = ocupacion_actual(c.id)
-        espacio = 2 - ocup
-        if espacio >= num_cascos and num_cascos > 0:
-            # casillero que por sí solo puede albergar TODOS los cascos de la moto
-            suficientes.append((c, ocup))
-        if ocup == 0:
-            vacios.append(c)
-        elif ocup < 2:
-            parciales.append((c, ocup))
-        # si ocup >= 2 => no disponible
-
-    # Ordenar por numero/id ascendente para determinismo
-    suficientes.sort(key=lambda t: getattr(t[0], "numero", t[0].id))
-    parciales.sort(key=lambda t: getattr(t[0], "numero", t[0].id))
-    vacios.sort(key=lambda c: getattr(c, "numero", c.id))
-
-    asignaciones = []  # lista de (casillero_obj, uso)
-    restante = num_cascos
-    id_casillero_principal = None
-    casilleros_asignados_numeros = []
-
-    # --------- PRIORIDAD: si num_cascos > 0 buscamos un único casillero capaz de alojarlos todos ----------
-    if num_cascos > 0:
-        if suficientes:
-            # elegimos el primer casillero (menor número) que tenga espacio >= num_cascos
-            c_obj, ocup = suficientes[0]
-            uso = num_cascos
-            asignaciones.append((c_obj, uso))
-            restante -= uso
-            id_casillero_principal = c_obj.id
-        else:
-            # No existe casillero único con suficiente espacio -> combinar parciales + vacios
-            # 1) llenar parciales (menor número)
-            for c_obj, ocup in parciales:
-                if restante <= 0:
-                    break
-                espacio = 2 - ocup
-                uso = min(espacio, restante)
-                if uso > 0:
-                    asignaciones.append((c_obj, uso))
-                    restante -= uso
-                    if id_casillero_principal is None:
-                        id_casillero_principal = c_obj.id
-            # 2) usar vacíos
-            for c_obj in vacios:
-                if restante <= 0:
-                    break
-                uso = min(2, restante)
-                asignaciones.append((c_obj, uso))
-                restante -= uso
-                if id_casillero_principal is None:
-                    id_casillero_principal = c_obj.id
-
-    # Si aún hay restante => no hay capacidad
-    if restante > 0:
-        raise HTTPException(status_code=400, detail="No hay casilleros con capacidad suficiente para los cascos solicitados.")
-
-    # --------- Aplicar asignaciones (actualizar casillero.cascos_ocupados y disponible) ----------
-    # Primero recalculamos ocupaciones por seguridad y acumulamos actualizaciones,
-    # luego hacemos solo UN commit al final para mantener consistencia.
-    for c_obj, uso in asignaciones:
-        ocup_act = ocupacion_actual(c_obj.id)
-        espacio = 2 - ocup_act
-        if espacio <= 0:
-            raise HTTPException(status_code=400, detail=f"Espacio insuficiente en casillero {getattr(c_obj,'numero',c_obj.id)} al reservar.")
-        uso_final = min(uso, espacio)
-        c_obj.cascos_ocupados = (c_obj.cascos_ocupados or 0) + uso_final
-        c_obj.disponible = False if c_obj.cascos_ocupados >= 2 else True
-        db.add(c_obj)
-        casilleros_asignados_numeros.append(getattr(c_obj, "numero", c_obj.id))
-
-    # Guardar cambios de casilleros una sola vez
-    db.commit()
+    # Hora de Colombia sin zona, igual que hora_salida, para que las franjas y la duración cuadren
+    ahora = hora_colombia().replace(tzinfo=None)
 
     # --------- Calcular proximo pago ----------
     proximo_pago = None
     if tipo_cobro == "por_dia":
-        proximo_pago = datetime.now() + timedelta(days=1)
+        proximo_pago = ahora + timedelta(days=1)
     elif tipo_cobro == "mensualidad":
-        proximo_pago = datetime.now() + timedelta(days=30)
+        proximo_pago = ahora + timedelta(days=30)
 
-    # --------- Crear registro ----------
     nuevo_registro = models.Registro(
         placa_moto=placa,
-        hora_entrada=datetime.now(),
+        hora_entrada=ahora,
         cascos=num_cascos,
-        id_casillero=id_casillero_principal,
+        id_casillero=plan[0][0] if plan else None,
         tipo_cobro=tipo_cobro,
         proximo_pago=proximo_pago,
-        observaciones=observaciones
+        observaciones=observaciones,
+        asignaciones=[
+            models.AsignacionCasillero(id_casillero=casillero_id, cascos=uso)
+            for casillero_id, uso in plan
+        ],
     )
     db.add(nuevo_registro)
-    db.commit()
-    db.refresh(nuevo_registro)
+    return nuevo_registro
 
+
+def respuesta_ingreso(registro: Registro, plan):
     return {
         "mensaje": "Registro creado exitosamente.",
-        "placa": nuevo_registro.placa_moto,
-        "hora_entrada": nuevo_registro.hora_entrada,
-        "tipo_cobro": nuevo_registro.tipo_cobro,
-        "cascos": nuevo_registro.cascos,
-        "casilleros_asignados": casilleros_asignados_numeros,
-        "observaciones": nuevo_registro.observaciones,
-        "proximo_pago": nuevo_registro.proximo_pago,
+        "placa": registro.placa_moto,
+        "hora_entrada": registro.hora_entrada,
+        "tipo_cobro": registro.tipo_cobro,
+        "cascos": registro.cascos,
+        "casilleros_asignados": [indice_casilleros.numero(casillero_id) for casillero_id, _ in plan],
+        "observaciones": registro.observaciones,
+        "proximo_pago": registro.proximo_pago,
     }
 
 
+# Registrar entrada
+@app.post("/registros/")
+def crear_registro(
+    placa: str,
+    tipo_cobro: str = "por_horas",
+    num_cascos: int = 0,
+    observaciones: str | None = None,
+    db: Session = Depends(get_db)
+):
+    placa, tipo_cobro = validar_ingreso(placa, tipo_cobro, num_cascos)
+
+    # Verificar moto
+    moto = db.query(models.Moto).filter(models.Moto.placa == placa).first()
+    if not moto:
+        raise HTTPException(status_code=404, detail="Moto no registrada.")
+
+    # Verificar registro activo
+    activo = db.scalars(consultas.registro_activo(placa)).first()
+    if activo:
+        raise HTTPException(status_code=400, detail="La moto ya tiene un registro activo.")
+
+    # --------- Reservar casilleros en el índice de ocupación en memoria ----------
+    # Misma regla de siempre: un único casillero que aloje todos los cascos
+    # (menor número) o, si no existe, llenar parciales y luego vacíos. La
+    # reserva es atómica: otro ingreso simultáneo ya no ve ese espacio libre.
+    for intento in range(1, INTENTOS_RESERVA + 1):
+        with cronometro("asignacion_casilleros"):
+            plan = reservar_casilleros(db, num_cascos)
+        if plan is None:
+            raise HTTPException(status_code=400, detail="No hay casilleros con capacidad suficiente para los cascos solicitados.")
+
+        # --------- Casilleros + registro en una sola transacción ----------
+        try:
+            nuevo_registro = escribir_ingreso(db, placa, tipo_cobro, num_cascos, observaciones, plan)
+            eventos = diario.preparar(db, "entrada", [nuevo_registro])
+            db.commit()
+        except IntegrityError:
+            # Índice único parcial: otro ingreso de la misma placa ganó la carrera
+            db.rollback()
+            indice_casilleros.cancelar(plan)
+            raise HTTPException(status_code=400, detail="La moto ya tiene un registro activo.")
+        except HTTPException as e:
+            db.rollback()
+            indice_casilleros.cancelar(plan)
+            if e.status_code != 409 or intento == INTENTOS_RESERVA:
+                raise
+            # La base vio el casillero más lleno que el índice: otro worker lo ocupó.
+            # Se sincronizan todos (son pocos) para que el nuevo plan vea también los que se liberaron
+            sincronizar_casilleros(db)
+            continue
+        except Exception:
+            db.rollback()
+            indice_casilleros.cancelar(plan)
+            raise
+        break
+    indice_casilleros.confirmar(plan)
+    diario.anotar(eventos)
+    db.refresh(nuevo_registro)
+    agendar(nuevo_registro)
+    canal_ocupacion.publicar(
+        {"evento": "ingreso", "placa": placa, "tipo_cobro": tipo_cobro},
+        casilleros=[casillero_id for casillero_id, _ in plan], activos=1,
+    )
+
+    return respuesta_ingreso(nuevo_registro, plan)
+
+
 @app.post("/registrar_ingreso")
 async def registrar_ingreso(request: Request, db: Session = Depends(get_db)):
     data = await request.json()
@@ -409,8 +820,9 @@ async def registrar_ingreso(request: Request, db: Session = Depends(get_db)):
     observaciones = data.get("observaciones", None)
 
     try:
-        # Reutilizamos tu lógica existente en /registros/
-        return crear_registro(
+        # Reutilizamos tu lógica existente en /registros/, fuera del event loop
+        return await run_in_threadpool(
+            crear_registro,
             placa=placa,
             tipo_cobro=tipo_cobro,
             num_cascos=num_cascos,
@@ -423,28 +835,194 @@ async def registrar_ingreso(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Registrar entradas en lote
+@app.post("/registros/lote")
+async def registrar_ingresos_lote(request: Request, db: Session = Depends(get_db)):
+    data = await request.json()
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail="Se esperaba una lista de ingresos.")
+    return await run_in_threadpool(crear_registros_lote, data, db)
+
+
+def crear_registros_lote(items: list, db: Session):
+    """
+    Ingresa varias motos con una sola validación (consultas IN), una sola
+    pasada de asignación de casilleros y un solo commit. Cada elemento
+    recibe su propio resultado: una placa inválida no tumba el lote.
+    """
+    resultados = [None] * len(items)
+    validos = []  # (posicion, placa, tipo_cobro, num_cascos, observaciones)
+    vistas = set()
+
+    def error(posicion, placa, e: HTTPException):
+        resultados[posicion] = {"ok": False, "placa": placa, "status_code": e.status_code, "detalle": e.detail}
+
+    for posicion, item in enumerate(items):
+        placa = item.get("placa", "") if isinstance(item, dict) else None
+        try:
+            if not isinstance(item, dict):
+                raise HTTPException(status_code=422, detail="Cada elemento del lote debe ser un objeto JSON.")
+            placa, tipo_cobro = validar_ingreso(placa, item.get("tipo_cobro", "por_horas"), item.get("num_cascos", 0))
+            if not isinstance(item.get("observaciones"), (str, type(None))):
+                raise HTTPException(status_code=422, detail="Las observaciones deben ser texto.")
+            if placa in vistas:
+                raise HTTPException(status_code=400, detail="Placa repetida en el lote.")
+        except HTTPException as e:
+            error(posicion, placa, e)
+            continue
+        vistas.add(placa)
+        validos.append((posicion, placa, tipo_cobro, item.get("num_cascos", 0), item.get("observaciones")))
+
+    # --- Validar todas las placas con dos consultas IN ---
+    placas = [v[1] for v in validos]
+    registradas = {p for (p,) in db.query(models.Moto.placa).filter(models.Moto.placa.in_(placas))} if placas else set()
+    con_activo = set(
+        db.scalars(consultas.registros_activos(placas).with_only_columns(models.Registro.placa_moto))
+    ) if placas else set()
+
+    # --- Reservar casilleros para todo el lote en una sola pasada ---
+    reservados = []  # (posicion, placa, tipo_cobro, num_cascos, observaciones, plan)
+    sincronizado = False
+    with indice_casilleros.lock:
+        try:
+            for posicion, placa, tipo_cobro, num_cascos, observaciones in validos:
+                if placa not in registradas:
+                    error(posicion, placa, HTTPException(status_code=404, detail="Moto no registrada."))
+                    continue
+                if placa in con_activo:
+                    error(posicion, placa, HTTPException(status_code=400, detail="La moto ya tiene un registro activo."))
+                    continue
+                with cronometro("asignacion_casilleros"):
+                    plan = indice_casilleros.reservar(num_cascos)
+                    if plan is None and not sincronizado:
+                        # Otro worker pudo liberar casilleros: se confirma contra la base una vez por lote
+                        sincronizar_casilleros(db)
+                        sincronizado = True
+                        plan = indice_casilleros.reservar(num_cascos)
+                if plan is None:
+                    error(posicion, placa, HTTPException(status_code=400, detail="No hay casilleros con capacidad suficiente para los cascos solicitados."))
+                    continue
+                reservados.append((posicion, placa, tipo_cobro, num_cascos, observaciones, plan))
+        except Exception:
+            # Una reserva que quede colgada en el índice no la corrige ni sincronizar()
+            for *_, plan in reservados:
+                indice_casilleros.cancelar(plan)
+            raise
+
+    # --- Escribir todo en una sola transacción ---
+    try:
+        nuevos = [
+            (posicion, escribir_ingreso(db, placa, tipo_cobro, num_cascos, observaciones, plan), plan)
+            for posicion, placa, tipo_cobro, num_cascos, observaciones, plan in reservados
+        ]
+        eventos = diario.preparar(db, "entrada", [registro for _, registro, _ in nuevos])
+        db.commit()
+    except Exception:
+        # Un conflicto con un ingreso concurrente (o un casillero que otro
+        # worker llenó): se deshace el lote y se reintenta cada elemento por
+        # separado con la ruta normal, que sincroniza el índice y replanea.
+        db.rollback()
+        for *_, plan in reservados:
+            indice_casilleros.cancelar(plan)
+        for posicion, placa, tipo_cobro, num_cascos, observaciones, _ in reservados:
+            try:
+                resultados[posicion] = {"ok": True, **crear_registro(placa, tipo_cobro, num_cascos, observaciones, db=db)}
+            except HTTPException as e:
+                error(posicion, placa, e)
+        return resultados
+    for *_, plan in nuevos:
+        indice_casilleros.confirmar(plan)
+    diario.anotar(eventos)
+
+    for posicion, registro, plan in nuevos:
+        resultados[posicion] = {"ok": True, **respuesta_ingreso(registro, plan)}
+        agendar(registro)
+    if nuevos:
+        canal_ocupacion.publicar(
+            {"evento": "ingresos", "placas": [registro.placa_moto for _, registro, _ in nuevos]},
+            casilleros={casillero_id for _, _, plan in nuevos for casillero_id, _ in plan}, activos=len(nuevos),
+        )
+    return resultados
 
-#Ver registros
-@app.get("/registros/")
-def listar_registros(db: Session = Depends(get_db)):
-    registros = db.query(models.Registro).all()
-    return [
-        {
-            "id": r.id,
-            "placa": r.placa_moto,
-            "cascos": r.cascos,
-            "hora_entrada": r.hora_entrada,
-            "hora_salida": r.hora_salida,
-            "valor_pagado": r.valor_pagado,
-            "casillero": r.id_casillero
+
+
+#Ver registros (paginado con cursor y filtros; formato=ndjson|csv exporta por streaming)
+def consulta_registros(
+    db: Session,
+    cursor: int | None,
+    fecha_inicio: datetime | None,
+    fecha_fin: datetime | None,
+    placa: str | None,
+    tipo_cobro: str | None,
+):
+    consulta = db.query(
+        models.Registro.id.label("id"),
+        models.Registro.placa_moto.label("placa"),
+        models.Registro.cascos.label("cascos"),
+        models.Registro.hora_entrada.label("hora_entrada"),
+        models.Registro.hora_salida.label("hora_salida"),
+        models.Registro.valor_pagado.label("valor_pagado"),
+        models.Registro.id_casillero.label("casillero"),
+        models.Registro.tipo_cobro.label("tipo_cobro"),
+    )
+    if cursor is not None:
+        consulta = consulta.filter(models.Registro.id > cursor)
+    if fecha_inicio is not None:
+        consulta = consulta.filter(models.Registro.hora_entrada >= fecha_inicio)
+    if fecha_fin is not None:
+        consulta = consulta.filter(models.Registro.hora_entrada <= fecha_fin)
+    if placa:
+        consulta = consulta.filter(models.Registro.placa_moto == placa.upper())
+    if tipo_cobro:
+        consulta = consulta.filter(models.Registro.tipo_cobro == tipo_cobro)
+    return consulta.order_by(models.Registro.id)
+
+
+def registros_archivados(
+    cursor: int | None,
+    fecha_inicio: datetime | None,
+    fecha_fin: datetime | None,
+    placa: str | None,
+    tipo_cobro: str | None,
+):
+    """Mismos filtros, columnas y orden que consulta_registros, sobre el archivo."""
+    for r in archivo.filas(desde_id=cursor, entrada=(fecha_inicio, fecha_fin), placa=placa.upper() if placa else None, tipo_cobro=tipo_cobro):
+        yield {
+            "id": r["id"],
+            "placa": r["placa_moto"],
+            "cascos": r["cascos"],
+            "hora_entrada": r["hora_entrada"],
+            "hora_salida": r["hora_salida"],
+            "valor_pagado": r["valor_pagado"],
+            "casillero": r["id_casillero"],
+            "tipo_cobro": r["tipo_cobro"],
         }
-        for r in registros
-    ]
+
+
+@app.get("/registros/")
+def listar_registros(
+    cursor: int | None = None,
+    limite: int = 100,
+    fecha_inicio: datetime | None = None,
+    fecha_fin: datetime | None = None,
+    placa: str | None = None,
+    tipo_cobro: str | None = None,
+    formato: str = "json",
+    db: Session = Depends(get_db_lectura)
+):
+    validar_paginacion(limite, formato)
+    filtros = (fecha_inicio, fecha_fin, placa, tipo_cobro)
+    if formato != "json":
+        return respuesta_streaming(
+            lambda s: consulta_registros(s, cursor, *filtros), formato, "registros",
+            construir_extra=lambda: registros_archivados(cursor, *filtros),
+        )
+    return pagina(consulta_registros(db, cursor, *filtros), limite, "id", extra=registros_archivados(cursor, *filtros))
 
 
 #Ver registros activos
 @app.get("/registros/activos/")
-def listar_registros_activos(db: Session = Depends(get_db)):
+def listar_registros_activos(db: Session = Depends(get_db_lectura)):
     activos = db.query(models.Registro).filter(models.Registro.hora_salida == None).all()
     return [
         {
@@ -457,62 +1035,41 @@ def listar_registros_activos(db: Session = Depends(get_db)):
         for r in activos
     ]
 
-@app.post("/registros/salida/")
-def registrar_salida(placa_moto: str, db: Session = Depends(get_db)):
-    registro = db.query(Registro).filter(
-        Registro.placa_moto == placa_moto.upper(),
-        Registro.hora_salida.is_(None)
-    ).first()
-
-    if not registro:
-        return {"mensaje": f"No hay registro activo para la moto con placa {placa_moto}"}
-
+# --- Helpers de salida (compartidos por /registros/salida/ y /registros/salida/lote) ---
+def calcular_cobro(registro: Registro, hora_salida: datetime):
+    """Valor y mensaje de la salida de un registro: (valor_total, mensaje, horas, minutos)."""
     # Normalizar zona horaria
     hora_entrada = registro.hora_entrada
     if hora_entrada.tzinfo is not None:
         hora_entrada = hora_entrada.replace(tzinfo=None)
 
-    hora_salida = datetime.now(pytz.timezone("America/Bogota")).replace(tzinfo=None)
-    registro.hora_salida = hora_salida
-
-    tiempo_total = hora_salida - hora_entrada
-    total_segundos = int(tiempo_total.total_seconds())
-    horas_ent = total_segundos // 3600
-    minutos_ent = (total_segundos % 3600) // 60
-
+    tipo_vehiculo = registro.moto.tipo_vehiculo if registro.moto else None
+    cobro = motor_tarifas.cotizar(registro.tipo_cobro, hora_entrada, hora_salida, tipo_vehiculo)
+    horas_ent, minutos_ent, valor_total = cobro.horas, cobro.minutos, cobro.valor
     tipo_cobro = registro.tipo_cobro.lower()
-    valor_total = 0
     mensaje = ""
 
     # ===== COBRO POR HORAS =====
     if tipo_cobro == "por_horas":
-        if horas_ent < 7:
-            horas_cobradas = horas_ent
-            if minutos_ent > 10:
-                horas_cobradas += 1
-            elif minutos_ent == 0 and horas_ent == 0:
-                horas_cobradas = 1  # mínimo 1 hora
-            valor_total = horas_cobradas * 1100
+        if not cobro.supera_tope:
             mensaje = f"Tiempo: {horas_ent} hora(s) y {minutos_ent} minuto(s). Valor a pagar: ${valor_total:,}"
         else:
-            valor_total = 7000
+            tope = motor_tarifas.tabla(tipo_vehiculo).tope_horas
             mensaje = (
                 f"Tiempo: {horas_ent} hora(s) y {minutos_ent} minuto(s). "
-                f"Supera las 7 horas, puede cobrar por día (${valor_total}) o mantener cobro por horas."
+                f"Supera las {tope} horas, puede cobrar por día (${valor_total}) o mantener cobro por horas."
             )
 
     # ===== COBRO POR DÍA =====
     elif tipo_cobro == "por_dia":
-        valor_total = 7000
         mensaje = f"Cobro diario aplicado. Tiempo total: {horas_ent} hora(s) y {minutos_ent} minuto(s). Valor: ${valor_total:,}"
 
     # ===== COBRO MENSUALIDAD =====
     elif tipo_cobro == "mensualidad":
-        valor_total = 45000  # valor mensual fijo
         if registro.proximo_pago is None:
             mensaje = "Esta moto está registrada con mensualidad, pero no tiene fecha de pago configurada."
         else:
-            hoy = datetime.now(pytz.timezone("America/Bogota")).date()
+            hoy = hora_colombia().date()
             proximo_pago = registro.proximo_pago.date()
             dias_mora = (hoy - proximo_pago).days
             if dias_mora > 0:
@@ -522,16 +1079,49 @@ def registrar_salida(placa_moto: str, db: Session = Depends(get_db)):
             else:
                 mensaje = f"El próximo pago es el {proximo_pago}."
 
+    return valor_total, mensaje, horas_ent, minutos_ent
+
+
+def cerrar_registro(db: Session, registro: Registro, hora_salida: datetime, valor_total):
+    """
+    Cierra el registro y libera sus casilleros, sin commit. Devuelve las
+    asignaciones liberadas, o None si otra salida ya lo había cerrado.
+    """
+    # Cerrar el registro solo si sigue abierto: dos salidas simultáneas no lo cobran dos veces
+    cerrado = db.execute(
+        update(Registro)
+        .where(Registro.id == registro.id, Registro.hora_salida.is_(None))
+        .values(hora_salida=hora_salida, valor_pagado=valor_total)
+        .execution_options(synchronize_session=False)
+    )
+    if cerrado.rowcount != 1:
+        return None
+
     # ✅ Guardar correctamente el valor pagado
+    registro.hora_salida = hora_salida
     registro.valor_pagado = valor_total
 
-    db.commit()
-    db.refresh(registro)
+    # Liberar exactamente los cascos que el registro ocupó en cada casillero
+    asignaciones = [(a.id_casillero, a.cascos) for a in registro.asignaciones]
+    for casillero_id, cascos in asignaciones:
+        db.execute(
+            update(models.Casillero)
+            .where(models.Casillero.id == casillero_id)
+            .values(
+                cascos_ocupados=func.max(func.coalesce(models.Casillero.cascos_ocupados, 0) - cascos, 0),
+                disponible=True,
+            )
+            .execution_options(synchronize_session=False)
+        )
+    resumen_diario.registrar_cobro(db, registro)
+    return asignaciones
 
+
+def respuesta_salida(registro: Registro, mensaje: str, valor_total, horas_ent: int, minutos_ent: int):
     return {
         "mensaje": mensaje,
         "placa": registro.placa_moto,
-        "tipo_cobro": tipo_cobro,
+        "tipo_cobro": registro.tipo_cobro.lower(),
         "hora_entrada": registro.hora_entrada,
         "hora_salida": registro.hora_salida,
         "valor_total": valor_total,
@@ -539,24 +1129,127 @@ def registrar_salida(placa_moto: str, db: Session = Depends(get_db)):
     }
 
 
+@app.post("/registros/salida/")
+def registrar_salida(placa_moto: str, db: Session = Depends(get_db)):
+    registro = db.scalars(consultas.registro_activo(placa_moto.upper())).first()
+
+    if not registro:
+        return {"mensaje": f"No hay registro activo para la moto con placa {placa_moto}"}
+
+    hora_salida = hora_colombia().replace(tzinfo=None)
+    valor_total, mensaje, horas_ent, minutos_ent = calcular_cobro(registro, hora_salida)
+
+    asignaciones = cerrar_registro(db, registro, hora_salida, valor_total)
+    if asignaciones is None:
+        db.rollback()
+        return {"mensaje": f"No hay registro activo para la moto con placa {placa_moto}"}
+
+    eventos = diario.preparar(db, "salida", [registro])
+    db.commit()
+    diario.anotar(eventos)
+    db.refresh(registro)
+
+    # Ocupación real de la base: el ingreso pudo ser de otro worker
+    if asignaciones:
+        sincronizar_casilleros(db, [casillero_id for casillero_id, _ in asignaciones])
+    canal_ocupacion.publicar(
+        {"evento": "salida", "placa": registro.placa_moto, "valor": valor_total},
+        casilleros=[casillero_id for casillero_id, _ in asignaciones], activos=-1,
+        hoy=hora_salida.date(), cobros=[(registro.tipo_cobro, 1, valor_total)],
+    )
+
+    return respuesta_salida(registro, mensaje, valor_total, horas_ent, minutos_ent)
+
+
+# Registrar salidas en lote
+@app.post("/registros/salida/lote")
+async def registrar_salidas_lote(request: Request, db: Session = Depends(get_db)):
+    data = await request.json()
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail="Se esperaba una lista de placas.")
+    placas = [str(p.get("placa_moto", "") if isinstance(p, dict) else p) for p in data]
+    return await run_in_threadpool(cerrar_registros_lote, placas, db)
+
+
+def cerrar_registros_lote(placas: list[str], db: Session):
+    """Salidas de varias motos con una consulta IN y un solo commit; un resultado por placa."""
+    normalizadas = [p.upper() for p in placas]
+    activos = {
+        r.placa_moto: r
+        for r in db.scalars(
+            consultas.registros_activos(normalizadas)
+            .options(selectinload(Registro.asignaciones), selectinload(Registro.moto))
+        )
+    } if normalizadas else {}
+
+    hora_salida = hora_colombia().replace(tzinfo=None)
+    resultados = []
+    liberadas = []
+    cerrados = []
+    for placa_moto, placa in zip(placas, normalizadas):
+        registro = activos.pop(placa, None)  # pop: una placa repetida solo sale una vez
+        if registro is None:
+            resultados.append({"ok": False, "placa": placa, "mensaje": f"No hay registro activo para la moto con placa {placa_moto}"})
+            continue
+        valor_total, mensaje, horas_ent, minutos_ent = calcular_cobro(registro, hora_salida)
+        asignaciones = cerrar_registro(db, registro, hora_salida, valor_total)
+        if asignaciones is None:
+            # Otra salida concurrente lo cerró primero; el UPDATE condicional no cambió nada
+            resultados.append({"ok": False, "placa": placa, "mensaje": f"No hay registro activo para la moto con placa {placa_moto}"})
+            continue
+        liberadas += asignaciones
+        cerrados.append((len(resultados), registro, mensaje, valor_total, horas_ent, minutos_ent))
+        resultados.append(None)
+
+    eventos = diario.preparar(db, "salida", [registro for _, registro, *_ in cerrados])
+    db.commit()
+    diario.anotar(eventos)
+    if liberadas:
+        sincronizar_casilleros(db, [casillero_id for casillero_id, _ in liberadas])
+
+    for posicion, registro, mensaje, valor_total, horas_ent, minutos_ent in cerrados:
+        resultados[posicion] = {"ok": True, **respuesta_salida(registro, mensaje, valor_total, horas_ent, minutos_ent)}
+    if cerrados:
+        canal_ocupacion.publicar(
+            {"evento": "salidas", "placas": [registro.placa_moto for _, registro, *_ in cerrados]},
+            casilleros={casillero_id for casillero_id, _ in liberadas}, activos=-len(cerrados),
+            hoy=hora_salida.date(), cobros=[(registro.tipo_cobro, 1, valor) for _, registro, _, valor, *_ in cerrados],
+        )
+    return resultados
+
+
 @app.post("/registros/pago_mensualidad/")
 def pagar_mensualidad(placa_moto: str, db: Session = Depends(get_db)):
-    registro = db.query(Registro).filter(
-        Registro.placa_moto == placa_moto
-    ).order_by(Registro.id.desc()).first()
+    registro = db.scalars(consultas.ultimo_registro(placa_moto)).first()
 
     if not registro:
         return {"mensaje": f"No hay registros para la moto con placa {placa_moto}"}
 
-    ahora = datetime.now(pytz.timezone("America/Bogota"))
+    ahora = hora_colombia()
     proximo_pago = ahora + timedelta(days=30)
-    valor_mensualidad = 45000  # valor fijo mensual
+    tipo_vehiculo = registro.moto.tipo_vehiculo if registro.moto else None
+    valor_mensualidad = motor_tarifas.tabla(tipo_vehiculo).tarifa_mensualidad
 
+    tipo_anterior = registro.tipo_cobro
     registro.tipo_cobro = "mensualidad"
     registro.proximo_pago = proximo_pago
     registro.valor_total = valor_mensualidad
+    resumen_diario.mover_cobro(db, registro, tipo_anterior)
 
+    eventos = diario.preparar(db, "pago", [registro], tipo_anterior=tipo_anterior)
     db.commit()
+    diario.anotar(eventos)
+    agendar(registro)
+    # Igual que mover_cobro: si el registro ya salió hoy, su cobro cambia de tipo en el recaudo del día
+    hoy = ahora.date()
+    cobros = []
+    if registro.hora_salida is not None and registro.hora_salida.date() == hoy and tipo_anterior != registro.tipo_cobro:
+        valor = registro.valor_pagado or 0
+        cobros = [(tipo_anterior, -1, -valor), (registro.tipo_cobro, 1, valor)]
+    canal_ocupacion.publicar(
+        {"evento": "pago_mensualidad", "placa": registro.placa_moto, "proximo_pago": proximo_pago.strftime("%Y-%m-%d")},
+        hoy=hoy, cobros=cobros,
+    )
 
     return {
         "mensaje": (
@@ -569,28 +1262,84 @@ def pagar_mensualidad(placa_moto: str, db: Session = Depends(get_db)):
         "tipo_cobro": registro.tipo_cobro
     }
 
+# Mensualidades vencidas, que vencen hoy y en los próximos días (para cartera)
+def dato_vencimiento(placa: str, proximo_pago, hoy):
+    moto = indice_placas.valores.get(placa) or {}
+    telefono = moto.get("propietario_telefono")
+    return {
+        "placa": placa,
+        "proximo_pago": proximo_pago,
+        "dias_mora": max((hoy - proximo_pago).days, 0),
+        "propietario": indice_telefonos.valores.get(str(telefono)) if telefono is not None else None,
+    }
+
+@app.get("/mensualidades/vencimientos")
+def vencimientos_mensualidades():
+    hoy = hora_colombia().date()
+    grupos = agenda_mensualidades.grupos(hoy)
+    return {
+        "fecha": hoy,
+        "totales": {grupo: len(placas) for grupo, placas in grupos.items()},
+        **{
+            grupo: [dato_vencimiento(placa, proximo_pago, hoy) for placa, proximo_pago in placas]
+            for grupo, placas in grupos.items()
+        },
+    }
+
+# --- Tablero en vivo por WebSocket ---
+async def enviar_eventos(websocket: WebSocket, suscripcion):
+    await websocket.send_json(instantanea_tablero())
+    while True:
+        evento = await suscripcion.siguiente()
+        # None: la pantalla se atrasó y perdió eventos, se le manda el estado completo
+        await websocket.send_json(evento if evento is not None else instantanea_tablero())
+
+@app.websocket("/ws/ocupacion")
+async def ocupacion_en_vivo(websocket: WebSocket):
+    """Instantánea al conectar y luego deltas (con "seq") de cada ingreso, salida o pago."""
+    await websocket.accept()
+    suscripcion = canal_ocupacion.suscribir()
+    envio = asyncio.create_task(enviar_eventos(websocket, suscripcion))
+    try:
+        # Las pantallas no mandan nada: esperar aquí solo sirve para notar el cierre
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        envio.cancel()
+        canal_ocupacion.cancelar(suscripcion)
+
 @app.get("/cuadre_caja")
 def cuadre_caja(
     fecha_inicio: datetime,
     fecha_fin: datetime,
     tipo_cobro: str | None = None,
-    db: Session = Depends(get_db)
+    incluir_detalles: bool = True,
+    limite: int = 100,
+    offset: int = 0,
+    db: Session = Depends(get_db_lectura)
 ):
+    if limite < 1 or limite > 1000:
+        raise HTTPException(status_code=400, detail="El límite de detalles debe estar entre 1 y 1000.")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="El offset no puede ser negativo.")
+
     # Si la fecha fin es el mismo día que inicio, ajustamos a las 23:59:59
     if fecha_inicio.date() == fecha_fin.date():
         fecha_fin = fecha_fin.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-    # Filtrar registros dentro del rango de salida
-    query = db.query(Registro).filter(
+    # Filtros del rango de salida para los detalles
+    filtros = [
         Registro.hora_salida != None,
         Registro.hora_salida >= fecha_inicio,
-        Registro.hora_salida <= fecha_fin
-    )
-
+        Registro.hora_salida <= fecha_fin,
+    ]
     if tipo_cobro:
-        query = query.filter(Registro.tipo_cobro == tipo_cobro)
+        filtros.append(Registro.tipo_cobro == tipo_cobro)
 
-    registros = query.all()
+    # --- Totales por tipo de cobro: resumen diario + registros del día en curso ---
+    totales = resumen_diario.totales_por_tipo(db, fecha_inicio, fecha_fin, tipo_cobro, hora_colombia().date(), archivo)
 
     resumen = {
         "por_horas": {"total_cobros": 0, "cantidad_motos": 0},
@@ -600,26 +1349,40 @@ def cuadre_caja(
 
     total_motos = 0
     total_recaudado = 0
-    detalles = []
 
-    for r in registros:
-        valor = r.valor_pagado or 0
-        tipo = r.tipo_cobro.lower()
+    for tipo_registro, cantidad, total in totales:
+        tipo_registro = (tipo_registro or "").lower()
+        if tipo_registro in resumen:
+            resumen[tipo_registro]["total_cobros"] += total
+            resumen[tipo_registro]["cantidad_motos"] += cantidad
 
-        if tipo in resumen:
-            resumen[tipo]["total_cobros"] += valor
-            resumen[tipo]["cantidad_motos"] += 1
+        total_motos += cantidad
+        total_recaudado += total
 
-        total_motos += 1
-        total_recaudado += valor
-
-        detalles.append({
-            "placa": r.placa_moto,
-            "tipo_cobro": r.tipo_cobro,
-            "hora_entrada": r.hora_entrada,
-            "hora_salida": r.hora_salida,
-            "valor_pagado": valor,
-        })
+    # --- Detalles opcionales y paginados (tabla viva + archivo, por id) ---
+    detalles = []
+    if incluir_detalles:
+        vivos = db.query(
+            Registro.id,
+            Registro.placa_moto,
+            Registro.tipo_cobro,
+            Registro.hora_entrada,
+            Registro.hora_salida,
+            Registro.valor_pagado,
+        ).filter(*filtros).order_by(Registro.id).limit(limite + offset)
+        archivados = archivo.filas(salida=(fecha_inicio, fecha_fin), tipo_cobro=tipo_cobro)
+        filas = islice(fusionar((r._asdict() for r in vivos), archivados, "id"), offset, offset + limite)
+
+        detalles = [
+            {
+                "placa": r["placa_moto"],
+                "tipo_cobro": r["tipo_cobro"],
+                "hora_entrada": r["hora_entrada"],
+                "hora_salida": r["hora_salida"],
+                "valor_pagado": r["valor_pagado"] or 0,
+            }
+            for r in filas
+        ]
 
     return {
         "fecha_inicio": fecha_inicio,
@@ -629,13 +1392,220 @@ def cuadre_caja(
         "total_recaudado": total_recaudado,
         "resumen_por_tipo": resumen,
         "detalles": detalles,
+        "paginacion": {
+            "limite": limite,
+            "offset": offset,
+            "total": total_motos,
+        },
     }
 
 @app.get("/cuadre_caja/hoy")
-def cuadre_caja_hoy(db: Session = Depends(get_db)):
-    zona_horaria = pytz.timezone("America/Bogota")
-    ahora = datetime.now(zona_horaria).replace(tzinfo=None)
+def cuadre_caja_hoy(
+    incluir_detalles: bool = True,
+    limite: int = 100,
+    offset: int = 0,
+    db: Session = Depends(get_db_lectura)
+):
+    ahora = hora_colombia().replace(tzinfo=None)
     fecha_inicio = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
     fecha_fin = ahora.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-    return cuadre_caja(fecha_inicio, fecha_fin, db=db)
+    return cuadre_caja(
+        fecha_inicio,
+        fecha_fin,
+        incluir_detalles=incluir_detalles,
+        limite=limite,
+        offset=offset,
+        db=db
+    )
+
+
+# --- Lotes ---
+@app.get("/lotes")
+def listar_lotes():
+    return {"lotes": list(LOTES), "por_defecto": LOTE_POR_DEFECTO}
+
+
+def cuadre_de_lote(lote: str, **parametros):
+    with en_lote(lote), SessionLocal.lectura() as db:
+        return cuadre_caja(db=db, **parametros)
+
+
+# Cuadre de caja de varios lotes: cada uno se consulta en paralelo (su base,
+# su resumen diario y su archivo) y los totales se suman. Los detalles se
+# paginan sobre la lista de todos los lotes, en el orden de `lotes`.
+@app.get("/cuadre_caja/lotes")
+async def cuadre_caja_lotes(
+    fecha_inicio: datetime,
+    fecha_fin: datetime,
+    tipo_cobro: str | None = None,
+    incluir_detalles: bool = True,
+    limite: int = 100,
+    offset: int = 0,
+    lotes: list[str] | None = Query(None),
+):
+    if limite < 1 or limite > 1000:
+        raise HTTPException(status_code=400, detail="El límite de detalles debe estar entre 1 y 1000.")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="El offset no puede ser negativo.")
+    lotes = list(dict.fromkeys(lotes)) if lotes else list(LOTES)
+    desconocidos = [lote for lote in lotes if lote not in LOTES]
+    if desconocidos:
+        raise HTTPException(status_code=404, detail=f"Lote desconocido: {', '.join(desconocidos)}")
+
+    rango = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin, "tipo_cobro": tipo_cobro}
+    cuadres = await asyncio.gather(*(
+        run_in_threadpool(cuadre_de_lote, lote, **rango, incluir_detalles=False) for lote in lotes
+    ))
+
+    resumen = {tipo: {"total_cobros": 0, "cantidad_motos": 0} for tipo in ("por_horas", "por_dia", "mensualidad")}
+    for cuadre in cuadres:
+        for tipo, valores in cuadre["resumen_por_tipo"].items():
+            resumen[tipo]["total_cobros"] += valores["total_cobros"]
+            resumen[tipo]["cantidad_motos"] += valores["cantidad_motos"]
+    total_motos = sum(cuadre["total_motos_salida"] for cuadre in cuadres)
+
+    # --- Detalles: solo se piden a los lotes que caen en [offset, offset + limite) ---
+    detalles = []
+    if incluir_detalles:
+        tramos = []  # (lote, offset dentro del lote, cuántos)
+        inicio = 0
+        for lote, cuadre in zip(lotes, cuadres):
+            fin = inicio + cuadre["total_motos_salida"]
+            desde, hasta = max(offset, inicio), min(offset + limite, fin)
+            if desde < hasta:
+                tramos.append((lote, desde - inicio, hasta - desde))
+            inicio = fin
+        paginas = await asyncio.gather(*(
+            run_in_threadpool(cuadre_de_lote, lote, **rango, limite=cuantos, offset=desde_lote)
+            for lote, desde_lote, cuantos in tramos
+        ))
+        detalles = [
+            {"lote": lote, **detalle}
+            for (lote, _, _), pagina_lote in zip(tramos, paginas)
+            for detalle in pagina_lote["detalles"]
+        ]
+
+    return {
+        "fecha_inicio": fecha_inicio,
+        "fecha_fin": cuadres[0]["fecha_fin"],
+        "tipo_cobro_filtrado": tipo_cobro,
+        "total_motos_salida": total_motos,
+        "total_recaudado": sum(cuadre["total_recaudado"] for cuadre in cuadres),
+        "resumen_por_tipo": resumen,
+        "por_lote": {
+            lote: {"total_motos_salida": cuadre["total_motos_salida"], "total_recaudado": cuadre["total_recaudado"]}
+            for lote, cuadre in zip(lotes, cuadres)
+        },
+        "detalles": detalles,
+        "paginacion": {
+            "limite": limite,
+            "offset": offset,
+            "total": total_motos,
+        },
+    }
+
+
+# Ocupación por hora del día y día de la semana, permanencia y horas pico
+# (para planear personal y casilleros). Por defecto, el último año.
+@app.get("/analitica/ocupacion")
+def analitica_ocupacion(
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    tipo_cobro: str | None = None,
+    db: Session = Depends(get_db_lectura)
+):
+    ahora = hora_colombia().replace(tzinfo=None)
+    por_defecto = rango_por_defecto(ahora)
+    desde = (desde or por_defecto[0]).replace(tzinfo=None)
+    hasta = (hasta or por_defecto[1]).replace(tzinfo=None)
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="'desde' debe ser anterior a 'hasta'.")
+    if hasta - desde > timedelta(days=3 * 366):
+        raise HTTPException(status_code=400, detail="El rango no puede pasar de 3 años.")
+    return analitica.informe(db, desde, hasta, ahora, tipo_cobro)
+
+
+# --- Rutas asíncronas (motor_bd = "async") ---
+# Misma lógica que las rutas sync: AsyncSession.run_sync le pasa a cada
+# función una Session cuyo I/O va por aiosqlite, así que la transacción
+# no ocupa un hilo del pool de Starlette mientras espera a la base.
+rutas_async = APIRouter()
+
+@rutas_async.post("/registros/")
+async def crear_registro_async(
+    placa: str,
+    tipo_cobro: str = "por_horas",
+    num_cascos: int = 0,
+    observaciones: str | None = None,
+    db: AsyncSession = Depends(get_db_async)
+):
+    return await db.run_sync(lambda s: crear_registro(placa, tipo_cobro, num_cascos, observaciones, db=s))
+
+@rutas_async.post("/registrar_ingreso")
+async def registrar_ingreso_async(request: Request, db: AsyncSession = Depends(get_db_async)):
+    data = await request.json()
+    placa = data.get("placa", "").upper()
+    tipo_cobro = data.get("tipo_cobro", "por_horas")
+    num_cascos = data.get("num_cascos", 0)
+    observaciones = data.get("observaciones", None)
+    try:
+        return await db.run_sync(lambda s: crear_registro(placa, tipo_cobro, num_cascos, observaciones, db=s))
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@rutas_async.post("/registros/salida/")
+async def registrar_salida_async(placa_moto: str, db: AsyncSession = Depends(get_db_async)):
+    return await db.run_sync(lambda s: registrar_salida(placa_moto, db=s))
+
+@rutas_async.get("/motos/{placa}")
+async def obtener_moto_async(placa: str, db: AsyncSession = Depends(get_db_async)):
+    # Con la cache caliente ni siquiera se toma una conexión
+    en_cache = cache_motos.obtener(placa.upper())
+    if en_cache is not None:
+        return en_cache
+    return await db.run_sync(lambda s: obtener_moto(placa, db=s))
+
+@rutas_async.get("/registros/activos/")
+async def listar_registros_activos_async(db: AsyncSession = Depends(get_db_async_lectura)):
+    return await db.run_sync(lambda s: listar_registros_activos(db=s))
+
+@rutas_async.get("/cuadre_caja")
+async def cuadre_caja_async(
+    fecha_inicio: datetime,
+    fecha_fin: datetime,
+    tipo_cobro: str | None = None,
+    incluir_detalles: bool = True,
+    limite: int = 100,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_db_async_lectura)
+):
+    return await db.run_sync(lambda s: cuadre_caja(
+        fecha_inicio, fecha_fin, tipo_cobro, incluir_detalles=incluir_detalles, limite=limite, offset=offset, db=s
+    ))
+
+@rutas_async.get("/cuadre_caja/hoy")
+async def cuadre_caja_hoy_async(
+    incluir_detalles: bool = True,
+    limite: int = 100,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_db_async_lectura)
+):
+    return await db.run_sync(lambda s: cuadre_caja_hoy(incluir_detalles, limite, offset, db=s))
+
+def usar_rutas_async():
+    """Reemplaza las rutas sync que tienen versión async (mismo path y método)."""
+    reemplazadas = {(ruta.path, metodo) for ruta in rutas_async.routes for metodo in ruta.methods}
+    app.router.routes[:] = [
+        ruta for ruta in app.router.routes
+        if not any((getattr(ruta, "path", None), metodo) in reemplazadas for metodo in getattr(ruta, "methods", None) or ())
+    ]
+    app.include_router(rutas_async)
+
+if MOTOR_BD == "async":
+    usar_rutas_async()
+
+# Por fuera de todos los middlewares: idempotencia y métricas ya corren en el lote
+app.add_middleware(MiddlewareLotes, lotes=LOTES)
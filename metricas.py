@@ -0,0 +1,258 @@
+# metricas.py
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from sqlalchemy import event
+from database import lote_actual
+
+# Límites (segundos) de las cubetas del histograma de latencia
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# --- Medición de una petición ---
+class Medicion:
+    """Lo que acumula una petición mientras corre (SQL, filas, tramos cronometrados)."""
+
+    __slots__ = ("sentencias", "sql_segundos", "filas", "tramos", "detalle")
+
+    def __init__(self, guardar_sql: bool):
+        self.sentencias = 0
+        self.sql_segundos = 0.0
+        self.filas = 0
+        self.tramos = {}
+        # Solo con el log de peticiones lentas activo: [(segundos, sql)]
+        self.detalle = [] if guardar_sql else None
+
+
+# La medición viaja en un ContextVar: Starlette copia el contexto al pool de
+# hilos, así que las rutas sync y los eventos de SQLAlchemy ven la misma.
+medicion_actual: ContextVar[Medicion | None] = ContextVar("medicion_actual", default=None)
+
+
+@contextmanager
+def cronometro(tramo: str):
+    """Suma la duración del bloque al `tramo` de la petición en curso (p. ej. "asignacion_casilleros")."""
+    medicion = medicion_actual.get()
+    if medicion is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.tramos[tramo] = medicion.tramos.get(tramo, 0.0) + time.perf_counter() - inicio
+
+
+# --- Acumulado por ruta (formato de texto de Prometheus) ---
+class Serie:
+    __slots__ = ("cubetas", "suma", "cantidad", "sentencias", "sql_segundos", "filas", "tramos", "codigos")
+
+    def __init__(self):
+        self.cubetas = [0] * (len(CUBETAS) + 1)  # la última es +Inf
+        self.suma = 0.0
+        self.cantidad = 0
+        self.sentencias = 0
+        self.sql_segundos = 0.0
+        self.filas = 0
+        self.tramos = {}  # tramo -> [segundos, veces]
+        self.codigos = {}
+
+    def copia(self):
+        otra = Serie()
+        otra.cubetas = self.cubetas[:]
+        otra.suma, otra.cantidad = self.suma, self.cantidad
+        otra.sentencias, otra.sql_segundos, otra.filas = self.sentencias, self.sql_segundos, self.filas
+        otra.tramos = {tramo: list(valores) for tramo, valores in self.tramos.items()}
+        otra.codigos = dict(self.codigos)
+        return otra
+
+
+class Metricas:
+    """
+    Contadores por (lote, método, ruta) que se actualizan al terminar cada
+    petición: un lock y unas sumas, nada por sentencia más allá de dos
+    perf_counter. /metrics los exporta en texto de Prometheus.
+    """
+
+    def __init__(self, peticion_lenta_ms: float | None = None, sentencias_en_log: int = 10):
+        self.peticion_lenta_ms = peticion_lenta_ms
+        self.sentencias_en_log = sentencias_en_log
+        self._series = {}
+        self._lock = Lock()
+
+    def configurar(self, peticion_lenta_ms: float | None, sentencias_en_log: int):
+        self.peticion_lenta_ms = peticion_lenta_ms
+        self.sentencias_en_log = sentencias_en_log
+
+    # --- Hooks de SQLAlchemy ---
+    def instrumentar(self, engine):
+        """Cuenta sentencias, tiempo de SQL y filas leídas del engine."""
+        event.listen(engine, "before_cursor_execute", _antes_de_sql)
+        event.listen(engine, "after_cursor_execute", _despues_de_sql)
+
+    # --- Registro de peticiones ---
+    def registrar(self, lote: str, metodo: str, ruta: str, codigo: int, segundos: float, medicion: Medicion):
+        with self._lock:
+            serie = self._series.get((lote, metodo, ruta))
+            if serie is None:
+                serie = self._series[(lote, metodo, ruta)] = Serie()
+            serie.cubetas[bisect_left(CUBETAS, segundos)] += 1
+            serie.suma += segundos
+            serie.cantidad += 1
+            serie.sentencias += medicion.sentencias
+            serie.sql_segundos += medicion.sql_segundos
+            serie.filas += medicion.filas
+            for tramo, duracion in medicion.tramos.items():
+                acumulado = serie.tramos.setdefault(tramo, [0.0, 0])
+                acumulado[0] += duracion
+                acumulado[1] += 1
+            serie.codigos[codigo] = serie.codigos.get(codigo, 0) + 1
+
+        if self.peticion_lenta_ms is not None and segundos * 1000 >= self.peticion_lenta_ms:
+            self._log_lenta(lote, metodo, ruta, codigo, segundos, medicion)
+
+    def _log_lenta(self, lote, metodo, ruta, codigo, segundos, medicion: Medicion):
+        print(f"🐢 [{lote}] {metodo} {ruta} -> {codigo} en {segundos * 1000:.0f} ms: "
+              f"{medicion.sentencias} SQL ({medicion.sql_segundos * 1000:.0f} ms), {medicion.filas} filas"
+              + "".join(f", {t} {d * 1000:.1f} ms" for t, d in medicion.tramos.items()))
+        for duracion, sql in sorted(medicion.detalle or (), reverse=True)[:self.sentencias_en_log]:
+            print(f"   {duracion * 1000:8.2f} ms  {' '.join(sql.split())[:300]}")
+
+    # --- Exportación ---
+    def exportar(self) -> str:
+        with self._lock:
+            series = [
+                (f'lote="{lote}",metodo="{metodo}",ruta="{ruta}"', serie.copia())
+                for (lote, metodo, ruta), serie in sorted(self._series.items())
+            ]
+
+        lineas = [
+            "# HELP parqueadero_peticiones_total Peticiones atendidas por ruta y código HTTP.",
+            "# TYPE parqueadero_peticiones_total counter",
+        ]
+        for etiquetas, serie in series:
+            for codigo, cantidad in sorted(serie.codigos.items()):
+                lineas.append(f'parqueadero_peticiones_total{{{etiquetas},codigo="{codigo}"}} {cantidad}')
+
+        lineas += [
+            "# HELP parqueadero_peticion_segundos Latencia de las peticiones por ruta.",
+            "# TYPE parqueadero_peticion_segundos histogram",
+        ]
+        for etiquetas, serie in series:
+            acumulado = 0
+            for limite, veces in zip((*CUBETAS, "+Inf"), serie.cubetas):
+                acumulado += veces
+                lineas.append(f'parqueadero_peticion_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f"parqueadero_peticion_segundos_sum{{{etiquetas}}} {serie.suma:.6f}")
+            lineas.append(f"parqueadero_peticion_segundos_count{{{etiquetas}}} {serie.cantidad}")
+
+        contadores = [
+            ("parqueadero_sql_sentencias_total", "Sentencias SQL ejecutadas por las peticiones de cada ruta.", "sentencias"),
+            ("parqueadero_sql_segundos_total", "Tiempo en SQL de las peticiones de cada ruta.", "sql_segundos"),
+            ("parqueadero_filas_cargadas_total", "Filas leídas de los cursores SQL por las peticiones de cada ruta.", "filas"),
+        ]
+        for nombre, ayuda, atributo in contadores:
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+            for etiquetas, serie in series:
+                lineas.append(f"{nombre}{{{etiquetas}}} {round(getattr(serie, atributo), 6)}")
+
+        lineas += [
+            "# HELP parqueadero_tramo_segundos Tiempo en tramos cronometrados (p. ej. asignación de casilleros).",
+            "# TYPE parqueadero_tramo_segundos summary",
+        ]
+        for etiquetas, serie in series:
+            for tramo, (segundos, veces) in sorted(serie.tramos.items()):
+                lineas.append(f'parqueadero_tramo_segundos_sum{{{etiquetas},tramo="{tramo}"}} {segundos:.6f}')
+                lineas.append(f'parqueadero_tramo_segundos_count{{{etiquetas},tramo="{tramo}"}} {veces}')
+        return "\n".join(lineas) + "\n"
+
+
+# --- Listeners de SQLAlchemy (usan la medición de la petición en curso) ---
+def _antes_de_sql(conn, cursor, statement, parameters, context, executemany):
+    if medicion_actual.get() is not None:
+        conn.info.setdefault("inicio_sql", []).append(time.perf_counter())
+
+
+def _despues_de_sql(conn, cursor, statement, parameters, context, executemany):
+    medicion = medicion_actual.get()
+    if medicion is None:
+        return
+    pila = conn.info.get("inicio_sql")
+    if not pila:
+        return
+    duracion = time.perf_counter() - pila.pop()
+    medicion.sentencias += 1
+    medicion.sql_segundos += duracion
+    if medicion.detalle is not None:
+        medicion.detalle.append((duracion, statement))
+    # Con filas que leer (SELECT o RETURNING), el resultado se arma después
+    # de este evento sobre context.cursor: envolverlo cuenta lo que se lee,
+    # sean entidades ORM, columnas sueltas o Core.
+    if cursor.description is not None and not executemany:
+        context.cursor = _CursorContado(cursor, medicion)
+
+
+class _CursorContado:
+    """Cursor DBAPI que suma a la medición las filas que se leen de él."""
+
+    __slots__ = ("_cursor", "_medicion")
+
+    def __init__(self, cursor, medicion: Medicion):
+        self._cursor = cursor
+        self._medicion = medicion
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        if fila is not None:
+            self._medicion.filas += 1
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        filas = self._cursor.fetchmany(*args, **kwargs)
+        self._medicion.filas += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        self._medicion.filas += len(filas)
+        return filas
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+# --- Middleware ASGI ---
+class MiddlewareMetricas:
+    """Mide cada petición HTTP y la registra con la plantilla de la ruta (/motos/{placa}, no /motos/ABC12)."""
+
+    def __init__(self, app, metricas: Metricas):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicion = Medicion(self.metricas.peticion_lenta_ms is not None)
+        token = medicion_actual.set(medicion)
+        codigo = 500
+
+        async def enviar(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            medicion_actual.reset(token)
+            ruta = scope.get("route")
+            # Sin ruta de FastAPI: un Mount (/static) o un 404
+            nombre = getattr(ruta, "path", None) or scope.get("root_path") or "sin_ruta"
+            self.metricas.registrar(lote_actual.get(), scope["method"], nombre, codigo, duracion, medicion)
@@ -0,0 +1,214 @@
+# migraciones.py
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from database import engine, ruta_config
+
+# --- Pasos en Python ---
+def _recalcular_ocupacion(conn):
+    """cascos_ocupados/disponible de cada casillero a partir de las asignaciones activas."""
+    config = json.loads(ruta_config().read_text(encoding="utf-8"))
+    capacidad = config["capacidad_por_casillero"]
+    conn.exec_driver_sql(
+        "UPDATE casilleros SET cascos_ocupados = COALESCE(("
+        "  SELECT SUM(a.cascos) FROM asignaciones_casillero a"
+        "  JOIN registros r ON r.id = a.id_registro"
+        "  WHERE a.id_casillero = casilleros.id AND r.hora_salida IS NULL"
+        "), 0)"
+    )
+    conn.exec_driver_sql(
+        "UPDATE casilleros SET disponible = (cascos_ocupados < ?)", (capacidad,)
+    )
+
+
+def _cerrar_activos_duplicados(conn):
+    """
+    Antes del índice único de activos por placa: si una carrera dejó dos
+    registros abiertos para la misma placa, queda abierto el más reciente y
+    los anteriores se cierran sin cobro a la hora de entrada del que queda,
+    con una nota en observaciones. El resumen diario (si ya tiene datos)
+    suma esas salidas para seguir cuadrando con registros.
+    """
+    activos = {}
+    for registro_id, placa, tipo_cobro, hora_entrada in conn.exec_driver_sql(
+        "SELECT id, placa_moto, tipo_cobro, hora_entrada FROM registros WHERE hora_salida IS NULL ORDER BY placa_moto, id"
+    ):
+        activos.setdefault(placa, []).append((registro_id, tipo_cobro, hora_entrada))
+    duplicados = {placa: filas for placa, filas in activos.items() if len(filas) > 1}
+    if not duplicados:
+        return
+    tablas = {fila[0] for fila in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    con_resumen = "resumen_diario" in tablas and conn.exec_driver_sql("SELECT 1 FROM resumen_diario LIMIT 1").first()
+    cerrados = 0
+    for placa, filas in duplicados.items():
+        queda_id, _, cierre = filas[-1]
+        for registro_id, tipo_cobro, _ in filas[:-1]:
+            conn.exec_driver_sql(
+                "UPDATE registros SET hora_salida = ?, valor_pagado = 0, "
+                "observaciones = TRIM(COALESCE(observaciones, '') || ' ' || ?) WHERE id = ?",
+                (cierre, f"[Cerrado por migración: registro activo duplicado, sigue el #{queda_id}]", registro_id),
+            )
+            if con_resumen:
+                conn.exec_driver_sql(
+                    "INSERT INTO resumen_diario (fecha, tipo_cobro, cantidad_motos, total_cobros) VALUES (date(?), ?, 1, 0) "
+                    "ON CONFLICT (fecha, tipo_cobro) DO UPDATE SET cantidad_motos = cantidad_motos + 1",
+                    (cierre, tipo_cobro),
+                )
+            cerrados += 1
+    print(f"⚠️ {cerrados} registros activos duplicados cerrados sin cobro ({', '.join(sorted(duplicados))})")
+
+
+def _agregar_columna(tabla: str, columna: str, definicion: str):
+    """ALTER TABLE ADD COLUMN solo si la columna no existe (create_all ya la trae en bases nuevas)."""
+    def paso(conn):
+        columnas = {fila[1] for fila in conn.exec_driver_sql(f"PRAGMA table_info({tabla})")}
+        if columna not in columnas:
+            conn.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+    return paso
+
+
+# --- Migraciones versionadas (PRAGMA user_version) ---
+# Cada entrada: (versión, descripción, [sentencias SQL o funciones(conn)]).
+# Los pasos son idempotentes porque una base nueva ya trae el esquema de
+# models.py vía create_all; en una base existente agregan lo que falte.
+MIGRACIONES = [
+    (1, "Índices de consultas calientes en registros", [
+        "CREATE INDEX IF NOT EXISTS ix_registros_activos_placa "
+        "ON registros (placa_moto) WHERE hora_salida IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_registros_activos_casillero "
+        "ON registros (id_casillero) WHERE hora_salida IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_registros_salida "
+        "ON registros (hora_salida, tipo_cobro, valor_pagado) WHERE hora_salida IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS ix_registros_placa_id "
+        "ON registros (placa_moto, id)",
+        "ANALYZE registros",
+    ]),
+    (2, "Asignaciones por casillero y un solo registro activo por placa", [
+        "CREATE TABLE IF NOT EXISTS asignaciones_casillero ("
+        " id INTEGER NOT NULL PRIMARY KEY,"
+        " id_registro INTEGER NOT NULL REFERENCES registros (id),"
+        " id_casillero INTEGER NOT NULL REFERENCES casilleros (id),"
+        " cascos INTEGER NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_asignaciones_casillero_id_registro "
+        "ON asignaciones_casillero (id_registro)",
+        # Los registros activos anteriores solo guardaban el casillero principal
+        "INSERT INTO asignaciones_casillero (id_registro, id_casillero, cascos) "
+        "SELECT r.id, r.id_casillero, r.cascos FROM registros r "
+        "WHERE r.hora_salida IS NULL AND r.id_casillero IS NOT NULL AND r.cascos > 0 "
+        "AND NOT EXISTS (SELECT 1 FROM asignaciones_casillero a WHERE a.id_registro = r.id)",
+        # Una base con la carrera anterior puede tener dos activos por placa: el índice único fallaría
+        _cerrar_activos_duplicados,
+        _recalcular_ocupacion,
+        "DROP INDEX IF EXISTS ix_registros_activos_placa",
+        "CREATE UNIQUE INDEX ix_registros_activos_placa "
+        "ON registros (placa_moto) WHERE hora_salida IS NULL",
+    ]),
+    (3, "Tipo de vehículo en motos (tarifas por tipo)", [
+        _agregar_columna("motos", "tipo_vehiculo", "VARCHAR DEFAULT 'moto'"),
+    ]),
+]
+
+
+def version_actual(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+@contextmanager
+def bloqueo_escritura(bind):
+    """
+    Transacción BEGIN IMMEDIATE: toma el bloqueo de escritura antes de leer,
+    así que si varios workers arrancan a la vez solo uno prepara la base y
+    los demás esperan (busy_timeout) y encuentran el trabajo hecho.
+    """
+    with bind.connect() as conn:
+        # AUTOCOMMIT: pysqlite no abre su propio BEGIN y el nuestro manda
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+
+
+def migrar(bind=engine) -> int:
+    """Aplica las migraciones pendientes, cada una en su propia transacción."""
+    ultima = MIGRACIONES[-1][0]
+    with bind.connect() as conn:
+        if version_actual(conn) >= ultima:
+            return 0
+    aplicadas = 0
+    for version, descripcion, sentencias in MIGRACIONES:
+        with bloqueo_escritura(bind) as conn:
+            # Se relee dentro del bloqueo: otro proceso pudo aplicarla mientras tanto
+            if version <= version_actual(conn):
+                continue
+            for sentencia in sentencias:
+                if callable(sentencia):
+                    sentencia(conn)
+                else:
+                    conn.exec_driver_sql(sentencia)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+        print(f"🔧 Migración {version} aplicada: {descripcion}")
+        aplicadas += 1
+    return aplicadas
+
+
+def preparar_esquema(metadata, bind=engine) -> int:
+    """create_all + migrar, seguro cuando varios procesos arrancan a la vez."""
+    with bloqueo_escritura(bind) as conn:
+        metadata.create_all(bind=conn)
+    return migrar(bind)
+
+
+# --- Verificación de planes de las consultas calientes ---
+def consultas_calientes() -> list[tuple]:
+    """
+    (descripción, sentencia, índice que debe usar). Las sentencias salen de
+    consultas.py, las mismas que ejecutan las rutas: si una cambia, la
+    verificación revisa el plan nuevo.
+    """
+    import consultas
+
+    desde, hasta = datetime(2025, 1, 1), datetime(2025, 1, 31, 23, 59, 59)
+    return [
+        ("registro activo por placa", consultas.registro_activo("ABC12"), "ix_registros_activos_placa"),
+        ("registros activos de un lote de placas", consultas.registros_activos(["ABC12", "XYZ34"]), "ix_registros_activos_placa"),
+        ("último registro por placa (pagar_mensualidad)", consultas.ultimo_registro("ABC12"), "ix_registros_placa_id"),
+        ("rango de salida (cuadre_caja)", consultas.totales_salida(desde, hasta, None, True), "ix_registros_salida"),
+        ("rango de salida por tipo (cuadre_caja)", consultas.totales_salida(desde, hasta, "por_horas", False), "ix_registros_salida"),
+    ]
+
+
+def verificar_planes(bind=engine) -> list[str]:
+    """Devuelve los problemas encontrados con EXPLAIN QUERY PLAN (lista vacía si todo usa índice)."""
+    problemas = []
+    with bind.connect() as conn:
+        for descripcion, sentencia, indice in consultas_calientes():
+            sql = str(sentencia.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            plan = [fila[-1] for fila in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+            if any(paso.startswith("SCAN registros") for paso in plan) or not any(indice in paso for paso in plan):
+                problemas.append(f"{descripcion}: se esperaba {indice}, plan = {plan}")
+    return problemas
+
+
+def avisar_planes(bind=engine):
+    """Al arrancar: avisa si alguna consulta caliente ya no usa su índice."""
+    for problema in verificar_planes(bind):
+        print(f"⚠️ Consulta sin índice: {problema}")
+
+
+if __name__ == "__main__":
+    import sys
+    from database import Base
+    import models
+
+    preparar_esquema(Base.metadata)
+    if "--verificar" in sys.argv:
+        problemas = verificar_planes()
+        for problema in problemas:
+            print(f"❌ {problema}")
+        if problemas:
+            sys.exit(1)
+        print("✅ Todas las consultas calientes usan índice.")
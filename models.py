@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Float, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -20,6 +20,7 @@ class Moto(Base):
 
     placa = Column(String(6), primary_key=True, index=True)
     propietario_telefono = Column(Integer, ForeignKey("propietarios.telefono"))
+    tipo_vehiculo = Column(String, default="moto", server_default="moto")  # clave de config["tarifas"]["vehiculos"]
 
     propietario = relationship("Propietario", back_populates="motos")
     registros = relationship("Registro", back_populates="moto")
@@ -48,8 +49,68 @@ class Registro(Base):
     id_casillero = Column(Integer, ForeignKey("casilleros.id"))
     moto = relationship("Moto", back_populates="registros")
     casillero = relationship("Casillero")
+    asignaciones = relationship("AsignacionCasillero", back_populates="registro")
     observaciones = Column(String, nullable=True)
     tipo_cobro = Column(String, default="por_horas")  # por_horas, por_dia o mensualidad
     proximo_pago = Column(DateTime, nullable=True)
     fecha_ultimo_pago = Column(DateTime, nullable=True)
 
+    # Índices de las consultas calientes (ver migraciones.py para bases existentes)
+    __table_args__ = (
+        # Registro activo por placa (crear_registro, registrar_salida); único:
+        # una moto no puede tener dos registros abiertos a la vez
+        Index("ix_registros_activos_placa", "placa_moto", unique=True, sqlite_where=hora_salida.is_(None)),
+        # Registros activos por casillero
+        Index("ix_registros_activos_casillero", "id_casillero", sqlite_where=hora_salida.is_(None)),
+        # Rango de salida en cuadre_caja (cubre tipo_cobro y valor_pagado)
+        Index("ix_registros_salida", "hora_salida", "tipo_cobro", "valor_pagado", sqlite_where=hora_salida.isnot(None)),
+        # Último registro de una placa (pagar_mensualidad)
+        Index("ix_registros_placa_id", "placa_moto", "id"),
+    )
+
+
+# --- MODELO: Cascos asignados a cada casillero por registro ---
+# Un registro puede repartir sus cascos en varios casilleros; aquí queda
+# cuánto usó en cada uno para liberarlo exactamente en la salida.
+class AsignacionCasillero(Base):
+    __tablename__ = "asignaciones_casillero"
+
+    id = Column(Integer, primary_key=True, index=True)
+    id_registro = Column(Integer, ForeignKey("registros.id"), nullable=False, index=True)
+    id_casillero = Column(Integer, ForeignKey("casilleros.id"), nullable=False)
+    cascos = Column(Integer, nullable=False)
+    registro = relationship("Registro", back_populates="asignaciones")
+
+
+# --- MODELO: Resumen diario de recaudo (una fila por día y tipo de cobro) ---
+class ResumenDiario(Base):
+    __tablename__ = "resumen_diario"
+
+    fecha = Column(Date, primary_key=True)
+    tipo_cobro = Column(String, primary_key=True)
+    cantidad_motos = Column(Integer, nullable=False, default=0)
+    total_cobros = Column(Float, nullable=False, default=0)
+
+
+# --- MODELO: Respuestas guardadas por Idempotency-Key ---
+# La primera petición con una clave deja aquí su respuesta; los reintentos
+# (otro worker, o después de reiniciar) la repiten sin volver a ejecutarse.
+class RespuestaIdempotente(Base):
+    __tablename__ = "respuestas_idempotentes"
+
+    clave = Column(String, primary_key=True)
+    huella = Column(String, nullable=False)  # sha256 de método, ruta, query y cuerpo
+    creada = Column(DateTime, nullable=False, index=True)
+    codigo = Column(Integer, nullable=True)  # None mientras la primera petición sigue en curso
+    tipo_contenido = Column(String, nullable=True)
+    cuerpo = Column(LargeBinary, nullable=True)
+
+
+# --- MODELO: Marca del diario de eventos (una sola fila, id = 1) ---
+# Último evento del diario que ya está en la base; se mueve en la misma
+# transacción que la entrada, salida o pago (ver diario.py).
+class EstadoDiario(Base):
+    __tablename__ = "diario_estado"
+
+    id = Column(Integer, primary_key=True)
+    ultimo_evento = Column(Integer, nullable=False, default=0)
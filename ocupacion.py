@@ -0,0 +1,205 @@
+# ocupacion.py
+from bisect import bisect_left, insort
+from heapq import merge
+from threading import RLock
+
+
+# --- Índice en memoria de ocupación de casilleros ---
+class IndiceOcupacion:
+    """
+    Ocupación de cascos por casillero, agrupada por espacio libre.
+
+    Mantiene una lista ordenada de números de casillero por cada nivel de
+    espacio libre (1..capacidad), así que "el primer casillero con al menos
+    N espacios" se responde mirando la cabeza de cada lista, sin consultar
+    la base de datos. La ocupación se cuenta por asignación
+    (asignaciones_casillero), igual que casilleros.cascos_ocupados.
+
+    Con varios workers sobre la misma base el índice de cada uno es solo
+    una guía: la base decide (UPDATE condicional) y sincronizar() trae la
+    ocupación real de los casilleros que otro worker cambió.
+    """
+
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        self.lock = RLock()
+        self._ocupacion = {}       # id_casillero -> cascos
+        self._numero = {}          # id_casillero -> numero
+        self._id_por_numero = {}   # numero -> id_casillero
+        self._reservado = {}       # id_casillero -> cascos apartados por ingresos aún sin commit
+        # _niveles[k] = números de casillero con exactamente k espacios libres
+        self._niveles = [[] for _ in range(capacidad + 1)]
+
+    # --- Construcción ---
+    def cargar(self, casilleros, ocupacion_activa):
+        """casilleros: [(id, numero)]; ocupacion_activa: {id_casillero: cascos asignados}."""
+        with self.lock:
+            self._ocupacion.clear()
+            self._numero.clear()
+            self._id_por_numero.clear()
+            self._reservado.clear()
+            self._niveles = [[] for _ in range(self.capacidad + 1)]
+            for casillero_id, numero in casilleros:
+                self._numero[casillero_id] = numero
+                self._id_por_numero[numero] = casillero_id
+                self._ocupacion[casillero_id] = ocupacion_activa.get(casillero_id, 0) or 0
+            for casillero_id in sorted(self._numero, key=self._numero.get):
+                libre = self.libre(casillero_id)
+                if 0 < libre <= self.capacidad:
+                    self._niveles[libre].append(self._numero[casillero_id])
+
+    def agregar_casillero(self, casillero_id: int, numero: int):
+        with self.lock:
+            if casillero_id in self._numero:
+                return
+            self._numero[casillero_id] = numero
+            self._id_por_numero[numero] = casillero_id
+            self._ocupacion[casillero_id] = 0
+            insort(self._niveles[self.capacidad], numero)
+
+    def cambiar_capacidad(self, capacidad: int):
+        """Reagrupa por espacio libre con la nueva capacidad; la ocupación no cambia."""
+        with self.lock:
+            self.capacidad = capacidad
+            self._niveles = [[] for _ in range(capacidad + 1)]
+            for casillero_id in sorted(self._numero, key=self._numero.get):
+                libre = self.libre(casillero_id)
+                if 0 < libre <= capacidad:
+                    self._niveles[libre].append(self._numero[casillero_id])
+
+    # --- Consultas ---
+    def ocupacion(self, casillero_id: int) -> int:
+        return self._ocupacion.get(casillero_id, 0)
+
+    def numero(self, casillero_id: int) -> int:
+        return self._numero[casillero_id]
+
+    def casilleros(self):
+        """Ids de todos los casilleros, por número ascendente."""
+        with self.lock:
+            return sorted(self._numero, key=self._numero.get)
+
+    def libre(self, casillero_id: int) -> int:
+        return self.capacidad - self._ocupacion.get(casillero_id, 0)
+
+    def primero_con_espacio(self, minimo: int):
+        """Id del casillero de menor número con al menos `minimo` espacios libres."""
+        mejor = None
+        for nivel in range(max(minimo, 1), self.capacidad + 1):
+            numeros = self._niveles[nivel]
+            if numeros and (mejor is None or numeros[0] < mejor):
+                mejor = numeros[0]
+        return None if mejor is None else self._id_por_numero[mejor]
+
+    def parciales(self):
+        """Casilleros con algo ocupado y espacio libre, por número ascendente: (id, libre)."""
+        niveles = [
+            [(numero, nivel) for numero in self._niveles[nivel]]
+            for nivel in range(1, self.capacidad)
+        ]
+        for numero, nivel in merge(*niveles):
+            yield self._id_por_numero[numero], nivel
+
+    def vacios(self):
+        """Casilleros sin cascos, por número ascendente."""
+        for numero in self._niveles[self.capacidad]:
+            yield self._id_por_numero[numero]
+
+    def planear(self, num_cascos: int):
+        """
+        Reparte `num_cascos` igual que la asignación original de crear_registro:
+        primero un único casillero que los aloje todos; si no existe, llena
+        parciales y luego vacíos. Devuelve [(id_casillero, uso)] o None si no
+        hay capacidad. No modifica el índice.
+        """
+        if num_cascos <= 0:
+            return []
+        with self.lock:
+            unico = self.primero_con_espacio(num_cascos)
+            if unico is not None:
+                return [(unico, num_cascos)]
+
+            asignaciones = []
+            restante = num_cascos
+            for casillero_id, libre in self.parciales():
+                if restante <= 0:
+                    break
+                uso = min(libre, restante)
+                asignaciones.append((casillero_id, uso))
+                restante -= uso
+            for casillero_id in self.vacios():
+                if restante <= 0:
+                    break
+                uso = min(self.capacidad, restante)
+                asignaciones.append((casillero_id, uso))
+                restante -= uso
+            return asignaciones if restante <= 0 else None
+
+    # --- Actualizaciones (entrada / salida) ---
+    def _mover(self, casillero_id: int, delta: int):
+        if casillero_id is None or not delta or casillero_id not in self._numero:
+            return
+        numero = self._numero[casillero_id]
+        libre_antes = self.libre(casillero_id)
+        if 0 < libre_antes <= self.capacidad:
+            numeros = self._niveles[libre_antes]
+            del numeros[bisect_left(numeros, numero)]
+        # Nunca negativa: liberar un casillero que este worker no vio ocupar lo deja en 0
+        self._ocupacion[casillero_id] = max(0, self._ocupacion[casillero_id] + delta)
+        libre_despues = self.libre(casillero_id)
+        if 0 < libre_despues <= self.capacidad:
+            insort(self._niveles[libre_despues], numero)
+
+    def reservar(self, num_cascos: int):
+        """
+        Planea y aparta los casilleros en un solo paso atómico, para que dos
+        ingresos simultáneos no vean el mismo espacio libre. Devuelve el plan
+        o None si no hay capacidad; si la transacción falla se deshace con
+        cancelar(plan) y si se confirma, con confirmar(plan).
+        """
+        with self.lock:
+            plan = self.planear(num_cascos)
+            if plan:
+                for casillero_id, uso in plan:
+                    self._mover(casillero_id, uso)
+                    self._reservado[casillero_id] = self._reservado.get(casillero_id, 0) + uso
+            return plan
+
+    def _soltar_reserva(self, plan):
+        for casillero_id, uso in plan or []:
+            restante = self._reservado.get(casillero_id, 0) - uso
+            if restante > 0:
+                self._reservado[casillero_id] = restante
+            else:
+                self._reservado.pop(casillero_id, None)
+
+    def cancelar(self, plan):
+        with self.lock:
+            self._soltar_reserva(plan)
+            for casillero_id, uso in plan or []:
+                self._mover(casillero_id, -uso)
+
+    def confirmar(self, plan):
+        """El plan ya está en la base: deja de contarse como reserva pendiente."""
+        with self.lock:
+            self._soltar_reserva(plan)
+
+    def sincronizar(self, ocupacion_base):
+        """
+        {id_casillero: cascos_ocupados en la base}: fija esa ocupación.
+        Corrige lo que otro worker ocupó o liberó sin que este índice se
+        enterara. Se salta los casilleros con reservas de este worker: no se
+        sabe si su commit ya está en la base, y sumarlas podría contarlas dos veces.
+        """
+        with self.lock:
+            for casillero_id, cascos in ocupacion_base.items():
+                if casillero_id in self._numero and casillero_id not in self._reservado:
+                    self._mover(casillero_id, (cascos or 0) - self._ocupacion[casillero_id])
+
+    def ocupar(self, casillero_id: int, cascos: int):
+        with self.lock:
+            self._mover(casillero_id, cascos or 0)
+
+    def liberar(self, casillero_id: int, cascos: int):
+        with self.lock:
+            self._mover(casillero_id, -(cascos or 0))
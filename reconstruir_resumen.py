@@ -0,0 +1,11 @@
+from database import Base, engine, SessionLocal, carpeta_archivo
+from archivo import Archivo
+import models
+import resumen
+
+print("📊 Reconstruyendo el resumen diario desde registros...")
+Base.metadata.create_all(bind=engine)
+db = SessionLocal()
+filas = resumen.reconstruir(db, Archivo(carpeta_archivo()))
+db.close()
+print(f"✅ Resumen diario reconstruido ({filas} filas).")
@@ -0,0 +1,55 @@
+import argparse
+import json
+from datetime import datetime
+from sqlalchemy import String, bindparam, type_coerce, update
+from archivo import Archivo
+from database import SessionLocal, carpeta_archivo, ruta_config
+from models import Moto, Registro
+from tarifas import MotorTarifas
+import resumen
+
+parser = argparse.ArgumentParser(description="Recalcula valor_pagado de registros cerrados con las tarifas de config.json.")
+parser.add_argument("--desde", type=datetime.fromisoformat, help="hora_salida mínima (YYYY-MM-DD)")
+parser.add_argument("--hasta", type=datetime.fromisoformat, help="hora_salida máxima (YYYY-MM-DD)")
+parser.add_argument("--aplicar", action="store_true", help="guardar los nuevos valores (por defecto solo muestra el impacto)")
+args = parser.parse_args()
+
+config = json.loads(ruta_config().read_text(encoding="utf-8"))
+motor = MotorTarifas.desde_config(config)
+db = SessionLocal()
+consulta = (
+    # Fechas en texto, como las guarda SQLite: cotizar_lote las convierte con NumPy
+    db.query(Registro.id, Registro.tipo_cobro, type_coerce(Registro.hora_entrada, String), type_coerce(Registro.hora_salida, String),
+             Moto.tipo_vehiculo, Registro.valor_pagado)
+    .outerjoin(Moto, Moto.placa == Registro.placa_moto)
+    .filter(Registro.hora_salida != None)
+)
+if args.desde:
+    consulta = consulta.filter(Registro.hora_salida >= args.desde)
+if args.hasta:
+    consulta = consulta.filter(Registro.hora_salida <= args.hasta)
+filas = consulta.all()
+
+print(f"🧮 Recotizando {len(filas)} registros...")
+_, tipos_cobro, entradas, salidas, vehiculos, _ = zip(*filas) if filas else ([],) * 6
+valores = motor.cotizar_lote(tipos_cobro, entradas, salidas, vehiculos)
+cambios = [
+    {"b_id": f.id, "b_valor": valor}
+    for f, valor in zip(filas, valores)
+    if valor != (f.valor_pagado or 0)
+]
+diferencia = sum(valor - (f.valor_pagado or 0) for f, valor in zip(filas, valores))
+print(f"   {len(cambios)} registros cambian de valor; diferencia total: ${diferencia:,.0f}")
+
+if args.aplicar and cambios:
+    db.connection().execute(
+        update(Registro.__table__)
+        .where(Registro.__table__.c.id == bindparam("b_id"))
+        .values(valor_pagado=bindparam("b_valor")),
+        cambios,
+    )
+    db.commit()
+    # Los registros archivados conservan su valor; el resumen los sigue sumando
+    resumen.reconstruir(db, Archivo(carpeta_archivo()))
+    print("✅ Valores guardados y resumen diario reconstruido.")
+db.close()
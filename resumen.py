@@ -0,0 +1,146 @@
+# resumen.py
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import Registro, ResumenDiario
+import consultas
+
+
+# --- Acumular en el resumen diario ---
+def acumular(db: Session, fecha: date, tipo_cobro: str, cantidad: int, total: float):
+    """
+    Suma `cantidad` motos y `total` pesos al resumen de (fecha, tipo_cobro).
+    Se ejecuta dentro de la transacción del llamador: el resumen se guarda
+    en el mismo commit que el registro.
+    """
+    stmt = insert(ResumenDiario).values(
+        fecha=fecha,
+        tipo_cobro=tipo_cobro,
+        cantidad_motos=cantidad,
+        total_cobros=total,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ResumenDiario.fecha, ResumenDiario.tipo_cobro],
+        set_={
+            "cantidad_motos": ResumenDiario.cantidad_motos + stmt.excluded.cantidad_motos,
+            "total_cobros": ResumenDiario.total_cobros + stmt.excluded.total_cobros,
+        },
+    )
+    db.execute(stmt)
+
+
+def registrar_cobro(db: Session, registro: Registro):
+    """Agrega al resumen un registro que acaba de cerrarse."""
+    acumular(db, registro.hora_salida.date(), registro.tipo_cobro, 1, registro.valor_pagado or 0)
+
+
+def mover_cobro(db: Session, registro: Registro, tipo_anterior: str):
+    """Mueve un registro cerrado de `tipo_anterior` a su tipo de cobro actual."""
+    if registro.hora_salida is None or tipo_anterior == registro.tipo_cobro:
+        return
+    valor = registro.valor_pagado or 0
+    acumular(db, registro.hora_salida.date(), tipo_anterior, -1, -valor)
+    acumular(db, registro.hora_salida.date(), registro.tipo_cobro, 1, valor)
+
+
+# --- Archivo a medio mover ---
+def _ids_vivos_en(db: Session, rangos: list[tuple[int, int]]) -> set[int]:
+    """
+    Ids de la tabla viva dentro de los rangos de id de los segmentos: la
+    última fila de cada placa, que no se archiva, y las que el job dejó en
+    los dos lados si murió entre escribir el segmento y borrarlas. Se
+    cuentan en la tabla viva y se excluyen del archivo, como en
+    exportacion.fusionar.
+    """
+    if not rangos:
+        return set()
+    condicion = or_(*(Registro.id.between(id_min, id_max) for id_min, id_max in rangos))
+    return {id_registro for (id_registro,) in db.query(Registro.id).filter(condicion)}
+
+
+# --- Reconstruir desde registros ---
+def reconstruir(db: Session, archivo=None) -> int:
+    """Regenera todo el resumen diario a partir de la tabla registros (y del `archivo.Archivo`, si se pasa)."""
+    db.query(ResumenDiario).delete()
+    dia = func.date(Registro.hora_salida)
+    filas = db.query(
+        dia,
+        Registro.tipo_cobro,
+        func.count(Registro.id),
+        func.coalesce(func.sum(func.coalesce(Registro.valor_pagado, 0)), 0),
+    ).filter(Registro.hora_salida != None).group_by(dia, Registro.tipo_cobro).all()
+
+    totales = {}
+    filas = [(date.fromisoformat(fecha), tipo_cobro, cantidad, total) for fecha, tipo_cobro, cantidad, total in filas]
+    if archivo is not None:
+        filas += archivo.resumen_diario(excluir=_ids_vivos_en(db, archivo.rangos_id()))
+    for fecha, tipo_cobro, cantidad, total in filas:
+        acumulado = totales.setdefault((fecha, tipo_cobro), [0, 0])
+        acumulado[0] += cantidad
+        acumulado[1] += total
+
+    for (fecha, tipo_cobro), (cantidad, total) in totales.items():
+        db.add(ResumenDiario(
+            fecha=fecha,
+            tipo_cobro=tipo_cobro,
+            cantidad_motos=cantidad,
+            total_cobros=total,
+        ))
+    db.commit()
+    return len(totales)
+
+
+def reconstruir_si_vacio(db: Session, archivo=None):
+    """Llena el resumen la primera vez que la tabla existe en una base con historial."""
+    if db.query(ResumenDiario).first() is not None:
+        return
+    if db.query(Registro.id).filter(Registro.hora_salida != None).first() or (archivo is not None and archivo.segmentos()):
+        reconstruir(db, archivo)
+
+
+# --- Totales por tipo para un rango de salida ---
+def _totales_crudos(db: Session, desde: datetime, hasta: datetime, tipo_cobro: str | None, incluir_hasta: bool, archivo=None):
+    filas = db.execute(consultas.totales_salida(desde, hasta, tipo_cobro, incluir_hasta)).all()
+    if archivo is not None:
+        vivos = _ids_vivos_en(db, archivo.rangos_id(salida=(desde, hasta)))
+        filas += archivo.totales(desde, hasta, tipo_cobro, incluir_hasta, excluir=vivos)
+    return filas
+
+
+def totales_por_tipo(db: Session, fecha_inicio: datetime, fecha_fin: datetime, tipo_cobro: str | None, hoy: date, archivo=None):
+    """
+    [(tipo_cobro, cantidad, total)] de los registros cerrados en
+    [fecha_inicio, fecha_fin]. Los días completos anteriores a `hoy` salen
+    del resumen diario; los bordes parciales y el día de hoy se consultan
+    directamente en registros (y en `archivo`, si se pasa).
+    """
+    # Días completos dentro del rango: [primer_dia, ultimo_dia)
+    primer_dia = fecha_inicio.date()
+    if fecha_inicio != datetime.combine(primer_dia, time.min):
+        primer_dia += timedelta(days=1)
+    ultimo_dia = fecha_fin.date()
+    if fecha_fin >= datetime.combine(ultimo_dia, time.max):
+        ultimo_dia += timedelta(days=1)
+    ultimo_dia = min(ultimo_dia, hoy)
+
+    if primer_dia >= ultimo_dia:
+        return _totales_crudos(db, fecha_inicio, fecha_fin, tipo_cobro, incluir_hasta=True, archivo=archivo)
+
+    filtros = [ResumenDiario.fecha >= primer_dia, ResumenDiario.fecha < ultimo_dia]
+    if tipo_cobro:
+        filtros.append(ResumenDiario.tipo_cobro == tipo_cobro)
+    filas = db.query(
+        ResumenDiario.tipo_cobro,
+        func.sum(ResumenDiario.cantidad_motos),
+        func.sum(ResumenDiario.total_cobros),
+    ).filter(*filtros).group_by(ResumenDiario.tipo_cobro).all()
+
+    # Bordes que no cubre el resumen
+    inicio_resumen = datetime.combine(primer_dia, time.min)
+    fin_resumen = datetime.combine(ultimo_dia, time.min)
+    if fecha_inicio < inicio_resumen:
+        filas += _totales_crudos(db, fecha_inicio, inicio_resumen, tipo_cobro, incluir_hasta=False, archivo=archivo)
+    if fecha_fin >= fin_resumen:
+        filas += _totales_crudos(db, fin_resumen, fecha_fin, tipo_cobro, incluir_hasta=True, archivo=archivo)
+    return filas
@@ -0,0 +1,230 @@
+# simulacion.py
+import heapq
+import json
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+import numpy as np
+from ocupacion import IndiceOcupacion
+from tarifas import MotorTarifas
+
+# parciales_primero es la regla de crear_registro (IndiceOcupacion.planear)
+ESTRATEGIAS = ("parciales_primero", "vacios_primero", "mejor_ajuste", "sin_dividir")
+
+Llegada = namedtuple("Llegada", "entrada salida cascos tipo_cobro tipo_vehiculo")
+
+# Perfil de llegadas sintéticas: peso de cada hora del día (picos de la mañana y la tarde)
+PERFIL_HORARIO = (1, 1, 1, 1, 1, 2, 6, 12, 14, 9, 6, 6, 7, 7, 6, 6, 7, 10, 11, 7, 4, 3, 2, 1)
+TIPOS_COBRO = {"por_horas": 0.8, "por_dia": 0.1, "mensualidad": 0.1}
+CASCOS = {0: 0.3, 1: 0.5, 2: 0.2}
+# Mediana (horas) y dispersión de la permanencia por tipo de cobro (lognormal)
+PERMANENCIA = {"por_horas": (2.0, 0.7), "por_dia": (9.0, 0.3), "mensualidad": (9.0, 0.4)}
+
+
+@dataclass(frozen=True)
+class Politica:
+    total_casilleros: int
+    capacidad_por_casillero: int
+    estrategia: str = "parciales_primero"
+    # Claves de config.json que lee MotorTarifas.desde_config
+    tarifas: dict = field(default_factory=dict, hash=False)
+    nombre_tarifas: str = "config"
+
+
+# --- Flujos de llegadas ---
+def llegadas_historial(db, archivo, desde: datetime, hasta: datetime, ahora: datetime) -> list[Llegada]:
+    """Ingresos reales de [desde, hasta), vivos y archivados; los que siguen adentro salen `ahora`."""
+    from models import Moto, Registro
+
+    vivos = (
+        db.query(Registro.id, Registro.hora_entrada, Registro.hora_salida, Registro.cascos,
+                 Registro.tipo_cobro, Moto.tipo_vehiculo)
+        .outerjoin(Moto, Moto.placa == Registro.placa_moto)
+        .filter(Registro.hora_entrada >= desde, Registro.hora_entrada < hasta)
+    )
+    por_id = {f.id: (f.hora_entrada, f.hora_salida, f.cascos, f.tipo_cobro, f.tipo_vehiculo) for f in vivos}
+    archivados = [f for f in archivo.filas(entrada=(desde, hasta)) if f["hora_entrada"] < hasta and f["id"] not in por_id]
+    if archivados:
+        vehiculos = dict(db.query(Moto.placa, Moto.tipo_vehiculo))
+        for f in archivados:
+            por_id[f["id"]] = (f["hora_entrada"], f["hora_salida"], f["cascos"], f["tipo_cobro"],
+                               vehiculos.get(f["placa_moto"]))
+    llegadas = [
+        Llegada(entrada, salida or ahora, cascos or 0, tipo_cobro or "por_horas", tipo_vehiculo)
+        for entrada, salida, cascos, tipo_cobro, tipo_vehiculo in por_id.values()
+    ]
+    llegadas.sort(key=lambda llegada: llegada.entrada)
+    return llegadas
+
+
+def llegadas_sinteticas(dias: int, llegadas_por_dia: int, semilla: int, inicio: datetime) -> list[Llegada]:
+    """Flujo inventado con PERFIL_HORARIO, TIPOS_COBRO, CASCOS y PERMANENCIA; reproducible con `semilla`."""
+    azar = random.Random(semilla)
+    horas = list(range(24))
+    tipos, pesos_tipos = list(TIPOS_COBRO), list(TIPOS_COBRO.values())
+    cascos, pesos_cascos = list(CASCOS), list(CASCOS.values())
+    llegadas = []
+    for dia in range(dias):
+        base = inicio + timedelta(days=dia)
+        for hora in azar.choices(horas, weights=PERFIL_HORARIO, k=llegadas_por_dia):
+            entrada = base + timedelta(hours=hora, seconds=azar.randrange(3600))
+            tipo_cobro = azar.choices(tipos, weights=pesos_tipos)[0]
+            mediana, dispersion = PERMANENCIA[tipo_cobro]
+            permanencia = timedelta(hours=mediana) * azar.lognormvariate(0, dispersion)
+            llegadas.append(Llegada(
+                entrada, entrada + max(permanencia, timedelta(minutes=5)),
+                azar.choices(cascos, weights=pesos_cascos)[0], tipo_cobro, None,
+            ))
+    llegadas.sort(key=lambda llegada: llegada.entrada)
+    return llegadas
+
+
+# --- Estrategias de asignación ---
+def planear(indice: IndiceOcupacion, cascos: int, estrategia: str):
+    """[(id_casillero, uso)] o None si la estrategia no encuentra espacio. No modifica el índice."""
+    if estrategia == "parciales_primero" or cascos <= 0:
+        return indice.planear(cascos)
+    if estrategia == "mejor_ajuste":
+        # El casillero que quede más lleno: el parcial con menos espacio suficiente, si no un vacío
+        ajustados = [(libre, indice.numero(c), c) for c, libre in indice.parciales() if libre >= cascos]
+        if ajustados:
+            return [(min(ajustados)[2], cascos)]
+        if cascos <= indice.capacidad:
+            vacio = next(indice.vacios(), None)
+            if vacio is not None:
+                return [(vacio, cascos)]
+        return indice.planear(cascos)
+
+    unico = indice.primero_con_espacio(cascos)
+    if unico is not None:
+        return [(unico, cascos)]
+    if estrategia == "sin_dividir":
+        return None
+    # vacios_primero: dividir en casilleros vacíos antes de completar parciales
+    plan, restante = [], cascos
+    for casillero_id in indice.vacios():
+        if restante <= 0:
+            break
+        uso = min(indice.capacidad, restante)
+        plan.append((casillero_id, uso))
+        restante -= uso
+    for casillero_id, libre in indice.parciales():
+        if restante <= 0:
+            break
+        uso = min(libre, restante)
+        plan.append((casillero_id, uso))
+        restante -= uso
+    return plan if restante <= 0 else None
+
+
+# --- Simulación por eventos ---
+# La cotización no depende de la política: cada proceso pasa las llegadas a
+# columnas una vez y cotiza una vez por juego de tarifas
+_cotizaciones = {"llegadas": None, "columnas": None, "valores": {}}
+
+
+def _valores(llegadas, tarifas: dict) -> list[int]:
+    if _cotizaciones["llegadas"] is not llegadas:
+        columnas = (
+            [llegada.tipo_cobro for llegada in llegadas],
+            np.array([llegada.entrada for llegada in llegadas], dtype="datetime64[us]"),
+            np.array([llegada.salida for llegada in llegadas], dtype="datetime64[us]"),
+            [llegada.tipo_vehiculo for llegada in llegadas],
+        )
+        _cotizaciones.update(llegadas=llegadas, columnas=columnas, valores={})
+    clave = json.dumps(tarifas, sort_keys=True)
+    if clave not in _cotizaciones["valores"]:
+        motor = MotorTarifas.desde_config(tarifas)
+        _cotizaciones["valores"][clave] = motor.cotizar_lote(*_cotizaciones["columnas"])
+    return _cotizaciones["valores"][clave]
+
+
+def simular(llegadas: list[Llegada], politica: Politica) -> dict:
+    """
+    Pasa las llegadas (ordenadas por entrada) por un índice de casilleros
+    con la política dada. Antes de cada ingreso salen las motos cuya salida
+    ya pasó (a la misma hora, primero las salidas). Un ingreso sin espacio
+    para sus cascos se rechaza y su cobro se cuenta como perdido.
+    """
+    if politica.estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estrategia desconocida: {politica.estrategia}")
+    indice = IndiceOcupacion(politica.capacidad_por_casillero)
+    indice.cargar([(n, n) for n in range(1, politica.total_casilleros + 1)], {})
+    espacio_total = politica.total_casilleros * politica.capacidad_por_casillero
+    valores = _valores(llegadas, politica.tarifas)
+
+    pendientes = []  # (salida, orden, plan)
+    ocupados = pico = 0
+    aceptados = rechazados = rechazados_con_espacio = 0
+    con_cascos = varios_cascos = divididos = casilleros_usados = 0
+    recaudo = recaudo_perdido = 0
+    for orden, (llegada, valor) in enumerate(zip(llegadas, valores)):
+        while pendientes and pendientes[0][0] <= llegada.entrada:
+            _, _, plan = heapq.heappop(pendientes)
+            for casillero_id, uso in plan:
+                indice.liberar(casillero_id, uso)
+                ocupados -= uso
+
+        cascos = llegada.cascos
+        plan = planear(indice, cascos, politica.estrategia)
+        if plan is None:
+            rechazados += 1
+            recaudo_perdido += valor
+            # Había espacio en total, pero repartido de una forma que la estrategia no usa
+            if espacio_total - ocupados >= cascos:
+                rechazados_con_espacio += 1
+            continue
+
+        aceptados += 1
+        recaudo += valor
+        if cascos:
+            con_cascos += 1
+            casilleros_usados += len(plan)
+            varios_cascos += cascos > 1
+            divididos += len(plan) > 1
+            for casillero_id, uso in plan:
+                indice.ocupar(casillero_id, uso)
+            ocupados += cascos
+            pico = max(pico, ocupados)
+            heapq.heappush(pendientes, (llegada.salida, orden, plan))
+
+    llegadas_con_cascos = con_cascos + rechazados
+    return {
+        "politica": {**asdict(politica), "tarifas": politica.nombre_tarifas},
+        "llegadas": len(llegadas),
+        "aceptados": aceptados,
+        "rechazados": rechazados,
+        "tasa_rechazo": round(rechazados / len(llegadas), 5) if llegadas else 0,
+        "tasa_rechazo_con_cascos": round(rechazados / llegadas_con_cascos, 5) if llegadas_con_cascos else 0,
+        "rechazados_con_espacio": rechazados_con_espacio,
+        "divididos": divididos,
+        "fragmentacion": round(divididos / varios_cascos, 5) if varios_cascos else 0,
+        "casilleros_por_ingreso": round(casilleros_usados / con_cascos, 4) if con_cascos else 0,
+        "pico_cascos": pico,
+        "uso_pico": round(pico / espacio_total, 4),
+        "recaudo": recaudo,
+        "recaudo_perdido": recaudo_perdido,
+    }
+
+
+# --- Barrido de políticas en paralelo ---
+_llegadas_del_proceso = None
+
+
+def _iniciar_proceso(llegadas):
+    global _llegadas_del_proceso
+    _llegadas_del_proceso = llegadas
+
+
+def _simular_en_proceso(politica: Politica) -> dict:
+    return simular(_llegadas_del_proceso, politica)
+
+
+def barrer(llegadas: list[Llegada], politicas: list[Politica], procesos: int | None = None) -> list[dict]:
+    """Simula cada política; con más de un proceso, cada uno recibe las llegadas una sola vez al arrancar."""
+    if procesos == 1 or len(politicas) == 1:
+        return [simular(llegadas, politica) for politica in politicas]
+    with ProcessPoolExecutor(procesos, initializer=_iniciar_proceso, initargs=(llegadas,)) as pool:
+        return list(pool.map(_simular_en_proceso, politicas))
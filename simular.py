@@ -0,0 +1,88 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from database import ruta_config
+from simulacion import ESTRATEGIAS, Politica, barrer, llegadas_historial, llegadas_sinteticas
+
+CLAVES_TARIFAS = ("tarifa_hora", "tolerancia_minutos", "tarifa_dia", "tope_horas", "tarifa_mensualidad", "tarifas")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simula ingresos y salidas contra varias configuraciones de casilleros y tarifas, sin HTTP ni base "
+                    "(ver simulacion.py). Reporta rechazos, cascos divididos entre casilleros y recaudo de cada una."
+    )
+    parser.add_argument("--fuente", choices=("historial", "sintetico"), default="historial")
+    parser.add_argument("--desde", type=datetime.fromisoformat, help="historial: primer día (por defecto, hace 90 días)")
+    parser.add_argument("--hasta", type=datetime.fromisoformat, help="historial: día siguiente al último (por defecto, hoy)")
+    parser.add_argument("--dias", type=int, default=90, help="sintético: días a generar")
+    parser.add_argument("--llegadas-dia", type=int, default=300, help="sintético: ingresos por día")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--casilleros", type=int, nargs="+", help="valores de total_casilleros (por defecto, el de config.json)")
+    parser.add_argument("--capacidad", type=int, nargs="+", help="valores de capacidad_por_casillero (por defecto, el de config.json)")
+    parser.add_argument("--estrategias", nargs="+", choices=ESTRATEGIAS, default=list(ESTRATEGIAS))
+    parser.add_argument("--tarifas", type=Path, nargs="*", default=[],
+                        help="JSON con claves de tarifas de config.json a probar además de las actuales")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    parser.add_argument("--salida", type=Path, help="guardar los resultados en este JSON")
+    args = parser.parse_args()
+
+    config = json.loads(ruta_config().read_text(encoding="utf-8"))
+    tarifas_actuales = {clave: config[clave] for clave in CLAVES_TARIFAS if clave in config}
+    juegos_tarifas = [("config", tarifas_actuales)] + [
+        (ruta.stem, {**tarifas_actuales, **json.loads(ruta.read_text(encoding="utf-8"))}) for ruta in args.tarifas
+    ]
+
+    inicio = time.perf_counter()
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if args.fuente == "historial":
+        from archivo import Archivo
+        from database import SessionLocal, carpeta_archivo
+
+        desde = args.desde or hoy - timedelta(days=90)
+        hasta = args.hasta or hoy
+        db = SessionLocal()
+        llegadas = llegadas_historial(db, Archivo(carpeta_archivo()), desde, hasta, datetime.now())
+        db.close()
+        origen = f"historial {desde:%Y-%m-%d} a {hasta:%Y-%m-%d}"
+    else:
+        llegadas = llegadas_sinteticas(args.dias, args.llegadas_dia, args.semilla, hoy)
+        origen = f"sintético: {args.dias} días, {args.llegadas_dia} ingresos/día, semilla {args.semilla}"
+    print(f"🚦 {len(llegadas)} llegadas ({origen}) en {time.perf_counter() - inicio:.1f}s")
+    if not llegadas:
+        return
+
+    politicas = [
+        Politica(casilleros, capacidad, estrategia, tarifas, nombre)
+        for (nombre, tarifas), casilleros, capacidad, estrategia in itertools.product(
+            juegos_tarifas,
+            args.casilleros or [config["total_casilleros"]],
+            args.capacidad or [config["capacidad_por_casillero"]],
+            args.estrategias,
+        )
+    ]
+    inicio = time.perf_counter()
+    resultados = barrer(llegadas, politicas, args.procesos)
+    print(f"⚙️ {len(politicas)} políticas simuladas en {time.perf_counter() - inicio:.1f}s ({args.procesos} procesos)\n")
+
+    print(f"{'tarifas':<10} {'casill.':>7} {'cap.':>4} {'estrategia':<18} {'rechazo':>8} {'c/cascos':>8} "
+          f"{'divididos':>9} {'uso pico':>8} {'recaudo':>14} {'perdido':>12}")
+    for r in resultados:
+        p = r["politica"]
+        print(f"{p['tarifas']:<10} {p['total_casilleros']:>7} {p['capacidad_por_casillero']:>4} {p['estrategia']:<18} "
+              f"{r['tasa_rechazo']:>8.2%} {r['tasa_rechazo_con_cascos']:>8.2%} {r['fragmentacion']:>9.2%} "
+              f"{r['uso_pico']:>8.0%} {r['recaudo']:>14,} {r['recaudo_perdido']:>12,}")
+
+    if args.salida:
+        args.salida.write_text(json.dumps({"origen": origen, "llegadas": len(llegadas), "resultados": resultados},
+                                          indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n💾 Resultados en {args.salida}")
+
+
+# Los procesos del barrido importan este módulo: solo el principal corre la simulación
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ document.addEventListener("DOMContentLoaded", () => {
     const btnHoras = document.getElementById("btnHoras");
     const btnDia = document.getElementById("btnDia");
     const btnMensualidad = document.getElementById("btnMensualidad");
+    // Abierta como /lotes/<lote>/, la pantalla trabaja sobre ese parqueadero
+    const lote = (location.pathname.match(/^\/lotes\/[^\/]+/) || [""])[0];
 
 // --- Función para validar placa ---
 function validarPlaca(placa) {
@@ -17,9 +19,24 @@ function validarPlaca(placa) {
     return regex.test(placa);
 }
 
-// --- Convertir automáticamente a mayúsculas ---
-placaInput.addEventListener("input", (e) => {
+// --- Convertir automáticamente a mayúsculas y sugerir placas ---
+const sugerenciasPlaca = document.getElementById("sugerenciasPlaca");
+
+placaInput.addEventListener("input", async (e) => {
     e.target.value = e.target.value.toUpperCase();
+    const texto = e.target.value.trim();
+    if (texto.length < 2) return;
+
+    try {
+        const response = await fetch(`${lote}/buscar?q=${encodeURIComponent(texto)}&similares=true`);
+        if (!response.ok) return;
+        const data = await response.json();
+        sugerenciasPlaca.innerHTML = [...data.placas, ...data.similares]
+            .map((m) => `<option value="${m.placa}"></option>`)
+            .join("");
+    } catch (error) {
+        console.error("Error al buscar placas:", error);
+    }
 });
 
 // --- Click en botón Consultar ---
@@ -37,7 +54,7 @@ botonConsultar.addEventListener("click", async () => {
     }
 
     try {
-        const response = await fetch(`/motos/${placa}`);
+        const response = await fetch(`${lote}/motos/${placa}`);
         if (response.ok) {
             const data = await response.json();
             resultado.innerHTML = `
@@ -57,20 +74,30 @@ botonConsultar.addEventListener("click", async () => {
     }
 });
 
-// --- Al cambiar teléfono ---
+// --- Al cambiar teléfono: sugerir teléfonos y reconocer al propietario ---
+const sugerenciasTelefono = document.getElementById("sugerenciasTelefono");
+
 document.getElementById("telefono").addEventListener("input", async (e) => {
     const telefono = e.target.value.trim();
-    if (telefono.length < 7) return;
+    if (telefono.length < 2) return;
 
     try {
-        const response = await fetch(`/propietario/${telefono}`);
-        if (response.ok) {
-            const data = await response.json();
+        const response = await fetch(`${lote}/buscar?q=${encodeURIComponent(telefono)}`);
+        if (!response.ok) return;
+        const data = await response.json();
+        sugerenciasTelefono.innerHTML = data.telefonos
+            .map((p) => `<option value="${p.telefono}">${p.nombre} ${p.apellido}</option>`)
+            .join("");
+        if (telefono.length < 7) return;
+
+        const propietario = data.telefonos.find((p) => String(p.telefono) === telefono);
+        if (propietario) {
             resultado.innerHTML = `
                 <p>Propietario existente:</p>
-                <p><strong>Nombre:</strong> ${data.nombre}</p>
-                <p><strong>Apellidos:</strong> ${data.apellidos}</p>
+                <p><strong>Nombre:</strong> ${propietario.nombre}</p>
+                <p><strong>Apellidos:</strong> ${propietario.apellido}</p>
             `;
+            nombreDiv.style.display = "none";
             botonGuardar.style.display = "block";
         } else {
             resultado.innerHTML = "<p>Propietario nuevo. Ingresa nombre y apellidos.</p>";
@@ -96,7 +123,7 @@ botonGuardar.addEventListener("click", async () => {
     }
 
     try {
-        const response = await fetch("/registrar_moto", {
+        const response = await fetch(`${lote}/registrar_moto`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ placa, telefono, nombre, apellidos })
@@ -118,6 +145,24 @@ botonGuardar.addEventListener("click", async () => {
 
 // --- Funciones para ingreso de moto ---
 // --- Ingreso de moto ---
+// --- POST con Idempotency-Key: si la red falla, se reintenta con la misma clave ---
+// y el servidor devuelve la respuesta del primer intento en vez de registrar dos veces.
+async function enviarIdempotente(url, datos, intentos = 3) {
+    const clave = crypto.randomUUID();
+    for (let intento = 1; ; intento++) {
+        try {
+            return await fetch(url, {
+                method: "POST",
+                headers: { "Content-Type": "application/json", "Idempotency-Key": clave },
+                body: JSON.stringify(datos)
+            });
+        } catch (error) {
+            if (intento >= intentos) throw error;
+            await new Promise(resolve => setTimeout(resolve, 500 * intento));
+        }
+    }
+}
+
 async function registrarIngreso(tipo) {
     const placa = document.getElementById("placa").value.trim().toUpperCase();
     const numCascos = prompt("¿Cuántos cascos deja? (0, 1 o 2):", "0");
@@ -128,14 +173,10 @@ async function registrarIngreso(tipo) {
     }
 
     try {
-        const response = await fetch("/registrar_ingreso", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                placa: placa,
-                tipo_cobro: tipo,
-                num_cascos: parseInt(numCascos) || 0
-            })
+        const response = await enviarIdempotente(`${lote}/registrar_ingreso`, {
+            placa: placa,
+            tipo_cobro: tipo,
+            num_cascos: parseInt(numCascos) || 0
         });
 
         const data = await response.json();
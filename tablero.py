@@ -0,0 +1,127 @@
+# tablero.py
+import asyncio
+from datetime import date
+from threading import Lock
+
+
+# --- Suscripción de una pantalla (portería / caja) ---
+class Suscripcion:
+    """Cola acotada de eventos de un cliente. Si se llena, el cliente se resincroniza con una instantánea."""
+
+    def __init__(self, loop, tamano: int):
+        self.loop = loop
+        self.cola = asyncio.Queue(tamano)
+        self.desfasada = False
+
+    def _entregar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.desfasada = True
+
+    async def siguiente(self):
+        """Próximo evento, o None si se perdieron eventos y hay que mandar la instantánea."""
+        evento = await self.cola.get()
+        if self.desfasada:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.desfasada = False
+            return None
+        return evento
+
+
+# --- Canal de ocupación en vivo ---
+class CanalOcupacion:
+    """
+    Estado del tablero (motos dentro, ocupación de casilleros, recaudo del
+    día) mantenido en memoria y publicado como deltas a las pantallas
+    conectadas. Los deltas llevan valores absolutos de lo que cambió y un
+    número de secuencia, así que aplicarlos dos veces no descuadra nada.
+
+    `leer_casilleros(ids)` devuelve {numero: cascos} del índice de ocupación;
+    se llama al publicar, con el lock tomado, para que el último evento
+    enviado siempre tenga los valores más recientes.
+    """
+
+    def __init__(self, leer_casilleros, tamano_cola: int = 256):
+        self.leer_casilleros = leer_casilleros
+        self.tamano_cola = tamano_cola
+        self._lock = Lock()
+        self._suscripciones = set()
+        self.secuencia = 0
+        self.activos = 0
+        self.fecha = None
+        self.recaudo = {}  # tipo_cobro -> {"cantidad_motos", "total_cobros"}
+
+    def cargar(self, activos: int, fecha: date, totales):
+        """Estado inicial: motos dentro y totales del día [(tipo, cantidad, total)]."""
+        with self._lock:
+            self.activos = activos
+            self.fecha = fecha
+            self.recaudo = {}
+            for tipo_cobro, cantidad, total in totales:
+                self._sumar(tipo_cobro, cantidad, total)
+
+    def _sumar(self, tipo_cobro: str, cantidad: int, total):
+        tipo = self.recaudo.setdefault((tipo_cobro or "").lower(), {"cantidad_motos": 0, "total_cobros": 0})
+        tipo["cantidad_motos"] += cantidad
+        tipo["total_cobros"] += total or 0
+
+    def _copia_recaudo(self):
+        # Copia: el evento se serializa después, fuera del lock
+        return {tipo: dict(valores) for tipo, valores in self.recaudo.items()}
+
+    def _cambiar_dia(self, fecha: date):
+        if fecha != self.fecha:
+            self.fecha = fecha
+            self.recaudo = {}
+
+    # --- Suscripciones (desde el event loop) ---
+    def suscribir(self) -> Suscripcion:
+        suscripcion = Suscripcion(asyncio.get_running_loop(), self.tamano_cola)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def __len__(self):
+        return len(self._suscripciones)
+
+    def instantanea(self, hoy: date, todos_los_casilleros):
+        with self._lock:
+            self._cambiar_dia(hoy)
+            return {
+                "evento": "instantanea",
+                "seq": self.secuencia,
+                "activos": self.activos,
+                "casilleros": self.leer_casilleros(todos_los_casilleros),
+                "recaudo_hoy": self._copia_recaudo(),
+            }
+
+    # --- Publicación (desde cualquier hilo, después del commit) ---
+    def publicar(self, evento: dict, casilleros=(), activos: int = 0, hoy: date | None = None, cobros=()):
+        """
+        Aplica el cambio al estado y lo envía. `activos`: variación de motos
+        dentro; `cobros`: [(tipo_cobro, cantidad, valor)] sumados al recaudo
+        de `hoy`.
+        """
+        with self._lock:
+            self.activos += activos
+            if hoy is not None:
+                self._cambiar_dia(hoy)
+                for tipo_cobro, cantidad, valor in cobros:
+                    self._sumar(tipo_cobro, cantidad, valor)
+            self.secuencia += 1
+            evento = {**evento, "seq": self.secuencia, "activos": self.activos}
+            if casilleros:
+                evento["casilleros"] = self.leer_casilleros(casilleros)
+            if cobros:
+                evento["recaudo_hoy"] = self._copia_recaudo()
+            for suscripcion in list(self._suscripciones):
+                try:
+                    suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+                except RuntimeError:  # el loop de esa pantalla ya se cerró
+                    self._suscripciones.discard(suscripcion)
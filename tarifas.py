@@ -0,0 +1,168 @@
+# tarifas.py
+from dataclasses import dataclass
+from datetime import datetime
+
+MINUTOS_DIA = 24 * 60
+
+# Valores por defecto: los que estaban fijos en registrar_salida / pagar_mensualidad
+TARIFA_BASE = {
+    "tarifa_hora": 1100,
+    "tolerancia_minutos": 10,
+    "tope_horas": 7,
+    "tarifa_dia": 7000,
+    "tarifa_mensualidad": 45000,
+    "franjas": [],
+}
+
+
+# --- Tabla compilada para un tipo de vehículo ---
+@dataclass(frozen=True)
+class TablaTarifas:
+    tarifa_hora: int
+    tolerancia_minutos: int
+    tope_horas: int
+    tarifa_dia: int
+    tarifa_mensualidad: int
+    # Tarifa de la hora que empieza en cada minuto del día; None si es plana
+    por_minuto: tuple | None
+
+    def valor_horas(self, minuto_inicio: int, horas: int) -> int:
+        if self.por_minuto is None:
+            return horas * self.tarifa_hora
+        tabla = self.por_minuto
+        return sum(tabla[(minuto_inicio + 60 * i) % MINUTOS_DIA] for i in range(horas))
+
+
+@dataclass(frozen=True)
+class Cobro:
+    valor: int
+    horas: int
+    minutos: int
+    supera_tope: bool = False
+
+
+def _minuto_del_dia(texto: str) -> int:
+    horas, minutos = texto.split(":")
+    return (int(horas) * 60 + int(minutos)) % MINUTOS_DIA
+
+
+def compilar_tabla(parametros: dict) -> TablaTarifas:
+    """Convierte las franjas horarias en una tabla de 1440 posiciones (una por minuto)."""
+    por_minuto = None
+    if parametros.get("franjas"):
+        tabla = [parametros["tarifa_hora"]] * MINUTOS_DIA
+        for franja in parametros["franjas"]:
+            desde = _minuto_del_dia(franja["desde"])
+            hasta = _minuto_del_dia(franja["hasta"])
+            # "22:00" -> "06:00" cruza la medianoche
+            minutos = range(desde, hasta) if desde < hasta else [*range(desde, MINUTOS_DIA), *range(0, hasta)]
+            for minuto in minutos:
+                tabla[minuto] = franja["tarifa_hora"]
+        por_minuto = tuple(tabla)
+    return TablaTarifas(
+        tarifa_hora=parametros["tarifa_hora"],
+        tolerancia_minutos=parametros["tolerancia_minutos"],
+        tope_horas=parametros["tope_horas"],
+        tarifa_dia=parametros["tarifa_dia"],
+        tarifa_mensualidad=parametros["tarifa_mensualidad"],
+        por_minuto=por_minuto,
+    )
+
+
+# --- Motor de tarifas ---
+class MotorTarifas:
+    """
+    Tarifas por tipo de vehículo compiladas al arrancar. La configuración
+    general (tarifa_hora, tolerancia_minutos, tarifa_dia, ...) es la base y
+    cada entrada de config["tarifas"]["vehiculos"] la sobrescribe.
+    """
+
+    def __init__(self, tablas: dict[str, TablaTarifas]):
+        self.tablas = tablas
+
+    @classmethod
+    def desde_config(cls, config: dict):
+        base = {clave: config.get(clave, valor) for clave, valor in TARIFA_BASE.items()}
+        base["franjas"] = config.get("tarifas", {}).get("franjas", base["franjas"])
+        vehiculos = config.get("tarifas", {}).get("vehiculos", {})
+        tablas = {"moto": compilar_tabla(base)}
+        for tipo, parametros in vehiculos.items():
+            tablas[tipo] = compilar_tabla({**base, **parametros})
+        return cls(tablas)
+
+    def tabla(self, tipo_vehiculo: str | None) -> TablaTarifas:
+        return self.tablas.get(tipo_vehiculo or "moto", self.tablas["moto"])
+
+    def cotizar(self, tipo_cobro: str, hora_entrada: datetime, hora_salida: datetime, tipo_vehiculo: str | None = None) -> Cobro:
+        tabla = self.tabla(tipo_vehiculo)
+        total_segundos = int((hora_salida - hora_entrada).total_seconds())
+        horas = total_segundos // 3600
+        minutos = (total_segundos % 3600) // 60
+        tipo_cobro = tipo_cobro.lower()
+
+        if tipo_cobro == "por_horas":
+            if horas >= tabla.tope_horas:
+                return Cobro(tabla.tarifa_dia, horas, minutos, supera_tope=True)
+            horas_cobradas = horas
+            if minutos > tabla.tolerancia_minutos:
+                horas_cobradas += 1
+            elif minutos == 0 and horas == 0:
+                horas_cobradas = 1  # mínimo 1 hora
+            minuto_inicio = hora_entrada.hour * 60 + hora_entrada.minute
+            return Cobro(tabla.valor_horas(minuto_inicio, horas_cobradas), horas, minutos)
+        if tipo_cobro == "por_dia":
+            return Cobro(tabla.tarifa_dia, horas, minutos)
+        if tipo_cobro == "mensualidad":
+            return Cobro(tabla.tarifa_mensualidad, horas, minutos)
+        return Cobro(0, horas, minutos)
+
+    def cotizar_lote(self, tipos_cobro, entradas, salidas, tipos_vehiculo) -> list[int]:
+        """
+        Valores de muchas salidas de una vez, por columnas: entradas y
+        salidas como arreglos datetime64 (o texto ISO, como las guarda
+        SQLite). Mismas reglas que cotizar(), calculadas con NumPy sobre los
+        arreglos, una pasada por tabla de tarifas; sirve para recotizar el
+        historial o simular con otras tarifas.
+        """
+        # NumPy solo hace falta aquí: importar main (y cotizar una salida) no lo carga
+        import numpy as np
+
+        entrada = np.asarray(entradas, dtype="datetime64[us]")
+        salida = np.asarray(salidas, dtype="datetime64[us]")
+        if not len(entrada):
+            return []
+        # Segundos completos, truncando hacia cero como int(timedelta.total_seconds())
+        micros = (salida - entrada).astype(np.int64)
+        total_segundos = np.sign(micros) * (np.abs(micros) // 1_000_000)
+        horas = total_segundos // 3600
+        minutos = total_segundos % 3600 // 60
+        minuto_inicio = (entrada - entrada.astype("datetime64[D]")).astype("timedelta64[m]").astype(np.int64)
+        # Los textos se pasan a minúsculas una vez por valor distinto, no por fila
+        tipos, codigos = np.unique(np.asarray(tipos_cobro, dtype=str), return_inverse=True)
+        tipo_cobro = np.char.lower(tipos)[codigos]
+        vehiculo = np.asarray(tipos_vehiculo, dtype=object)
+        vehiculo = np.where(np.equal(vehiculo, None), "moto", vehiculo).astype(str)
+
+        # Tipos sin tabla propia se cobran como moto (igual que tabla())
+        valores = np.zeros(len(entrada), dtype=np.int64)
+        propios = np.isin(vehiculo, list(self.tablas))
+        for nombre, tabla in self.tablas.items():
+            de_tabla = vehiculo == nombre if nombre != "moto" else (vehiculo == nombre) | ~propios
+            valores[de_tabla & (tipo_cobro == "por_dia")] = tabla.tarifa_dia
+            valores[de_tabla & (tipo_cobro == "mensualidad")] = tabla.tarifa_mensualidad
+
+            por_horas = de_tabla & (tipo_cobro == "por_horas")
+            valores[por_horas & (horas >= tabla.tope_horas)] = tabla.tarifa_dia
+            cobradas = por_horas & (horas < tabla.tope_horas)
+            h, m = horas[cobradas], minutos[cobradas]
+            horas_cobradas = h + (m > tabla.tolerancia_minutos)
+            horas_cobradas[(h == 0) & (m == 0)] = 1  # mínimo 1 hora
+            if tabla.por_minuto is None:
+                valores[cobradas] = horas_cobradas * tabla.tarifa_hora
+            else:
+                # Tarifa de cada hora cobrada según la franja en que empieza (son menos de tope_horas)
+                desplazamientos = 60 * np.arange(tabla.tope_horas)
+                minuto_hora = (minuto_inicio[cobradas][:, None] + desplazamientos) % MINUTOS_DIA
+                tarifa_hora = np.array(tabla.por_minuto, dtype=np.int64)[minuto_hora]
+                valores[cobradas] = np.where(np.arange(tabla.tope_horas) < horas_cobradas[:, None], tarifa_hora, 0).sum(axis=1)
+        return valores.tolist()
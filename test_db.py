@@ -1,25 +1,28 @@
 # test_db.py
-from database import SessionLocal
+from database import Base, SessionLocal, engine
+from migraciones import preparar_esquema
 from models import Propietario, Moto
 
+# 0️⃣ Asegurar que las tablas y migraciones estén al día
+preparar_esquema(Base.metadata, engine)
+
 # 1️⃣ Crear una nueva sesión
 db = SessionLocal()
 
-# 2️⃣ Crear un nuevo propietario
-nuevo_propietario = Propietario(
-    nombre="JUAN MANUEL ORTEGON",
-    telefono="3104567890"
-)
+# 2️⃣ Crear (o actualizar) un propietario: el teléfono es la llave
+nuevo_propietario = db.merge(Propietario(
+    telefono=3104567890,
+    nombre="JUAN MANUEL",
+    apellido="ORTEGON"
+))
 
-# 3️⃣ Crear una moto asociada a ese propietario
-nueva_moto = Moto(
+# 3️⃣ Crear (o actualizar) una moto asociada a ese propietario
+nueva_moto = db.merge(Moto(
     placa="TRK89C",
-    propietario=nuevo_propietario
-)
+    propietario_telefono=nuevo_propietario.telefono
+))
 
 # 4️⃣ Guardar los datos en la base de datos
-db.add(nuevo_propietario)
-db.add(nueva_moto)
 db.commit()
 
 print("✅ Propietario y moto guardados correctamente!")
@@ -30,11 +33,11 @@ motos = db.query(Moto).all()
 
 print("\n📋 Propietarios registrados:")
 for p in propietarios:
-    print(f"- {p.id}: {p.nombre} ({p.telefono})")
+    print(f"- {p.telefono}: {p.nombre} {p.apellido}")
 
 print("\n🏍️ Motos registradas:")
 for m in motos:
-    print(f"- {m.placa} (Propietario ID: {m.id_propietario})")
+    print(f"- {m.placa} (Propietario: {m.propietario_telefono})")
 
 # 6️⃣ Cerrar la sesión
 db.close()
@@ -0,0 +1,98 @@
+# test_ingreso_lote.py
+# Ingreso por lote con elementos mal tipados: cada uno recibe su error y el
+# índice de casilleros sigue cuadrando con la base.
+#   python -m pytest -q test_ingreso_lote.py   (o: python test_ingreso_lote.py)
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# Base y config temporales antes de importar main
+_carpeta = Path(tempfile.mkdtemp(prefix="test_lote_"))
+_config = json.loads((Path(__file__).resolve().parent / "config.json").read_text(encoding="utf-8"))
+_config.update(total_casilleros=3, capacidad_por_casillero=2)
+_config.pop("diario", None)
+(_carpeta / "config.json").write_text(json.dumps(_config), encoding="utf-8")
+(_carpeta / "lotes.json").write_text(json.dumps({"prueba": {"url": f"sqlite:///{_carpeta}/prueba.db"}}), encoding="utf-8")
+os.environ["PARQUEADERO_LOTES"] = str(_carpeta / "lotes.json")
+
+from fastapi.testclient import TestClient  # noqa: E402
+import main  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal  # noqa: E402
+
+PLACAS = ("ABC12", "ABC13", "ABC14", "ABC15", "ABC16")
+
+
+def _cliente(**kwargs):
+    cliente = TestClient(main.app, **kwargs)
+    cliente.__enter__()
+    cliente.post("/propietarios/", params={"nombre": "Ana", "apellido": "Paz", "telefono": "3001234567"})
+    for placa in PLACAS:
+        cliente.post("/motos/", params={"placa": placa, "propietario_telefono": "3001234567"})
+    return cliente
+
+
+def _sacar_todas(cliente):
+    for placa in PLACAS:
+        cliente.post("/registros/salida/", params={"placa_moto": placa})
+
+
+def _indice_cuadra():
+    with SessionLocal() as db:
+        en_base = dict(db.query(models.Casillero.id, models.Casillero.cascos_ocupados).all())
+    en_indice = {i: main.indice_casilleros.ocupacion(i) for i in main.indice_casilleros.casilleros()}
+    return en_indice == {i: cascos or 0 for i, cascos in en_base.items()}, en_indice, en_base
+
+
+def test_lote_con_elementos_mal_tipados():
+    cliente = _cliente()
+    try:
+        respuesta = cliente.post("/registros/lote", json=[
+            {"placa": "ABC13", "num_cascos": 2},
+            {"placa": "ABC12", "num_cascos": 1.5},
+            {"placa": "ABC14", "num_cascos": "1"},
+            {"placa": "ABC15", "num_cascos": True},
+            {"placa": "ABC16", "tipo_cobro": None},
+            {"placa": 12345},
+            "ABC12",
+            {"placa": "ABC12", "observaciones": {"x": 1}},
+        ])
+        assert respuesta.status_code == 200, respuesta.text
+        resultados = respuesta.json()
+        assert resultados[0]["ok"] is True
+        assert [r["status_code"] for r in resultados[1:]] == [422] * 7
+        cuadra, en_indice, en_base = _indice_cuadra()
+        assert cuadra, (en_indice, en_base)
+    finally:
+        _sacar_todas(cliente)
+        cliente.__exit__(None, None, None)
+
+
+def test_error_al_reservar_devuelve_las_reservas():
+    cliente = _cliente(raise_server_exceptions=False)
+    reservar = main.indice_casilleros.de().reservar
+    llamadas = []
+
+    def reservar_que_falla(num_cascos):
+        llamadas.append(num_cascos)
+        if len(llamadas) == 2:
+            raise RuntimeError("falla simulada")
+        return reservar(num_cascos)
+
+    main.indice_casilleros.de().reservar = reservar_que_falla
+    try:
+        respuesta = cliente.post("/registros/lote", json=[{"placa": "ABC13", "num_cascos": 2}, {"placa": "ABC14", "num_cascos": 1}])
+        assert respuesta.status_code == 500
+        cuadra, en_indice, en_base = _indice_cuadra()
+        assert cuadra, (en_indice, en_base)
+    finally:
+        del main.indice_casilleros.de().reservar
+        _sacar_todas(cliente)
+        cliente.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    test_lote_con_elementos_mal_tipados()
+    test_error_al_reservar_devuelve_las_reservas()
+    print("✅ Ingreso por lote: errores por elemento y el índice cuadra con la base.")
@@ -0,0 +1,35 @@
+# test_planes.py
+# Las consultas calientes de consultas.py usan su índice en una base recién
+# creada, y la verificación avisa cuando un índice falta.
+#   python -m pytest -q test_planes.py   (o: python test_planes.py)
+import tempfile
+from pathlib import Path
+from sqlalchemy import create_engine
+from database import Base
+from migraciones import preparar_esquema, verificar_planes
+import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+
+def _base_nueva():
+    bind = create_engine(f"sqlite:///{Path(tempfile.mkdtemp(prefix='test_planes_')) / 'planes.db'}")
+    preparar_esquema(Base.metadata, bind)
+    return bind
+
+
+def test_consultas_calientes_usan_indice():
+    problemas = verificar_planes(_base_nueva())
+    assert problemas == [], problemas
+
+
+def test_sin_indice_se_reporta():
+    bind = _base_nueva()
+    with bind.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_registros_placa_id")
+    problemas = verificar_planes(bind)
+    assert any("ix_registros_placa_id" in problema for problema in problemas), problemas
+
+
+if __name__ == "__main__":
+    test_consultas_calientes_usan_indice()
+    test_sin_indice_se_reporta()
+    print("✅ Todas las consultas calientes usan índice.")
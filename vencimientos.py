@@ -0,0 +1,122 @@
+# vencimientos.py
+import asyncio
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+from threading import Lock
+
+DIAS_SEMANA = 7
+GRUPOS = ("vencidas", "vencen_hoy", "vencen_semana")
+
+
+# --- Agenda de mensualidades por fecha de pago ---
+class AgendaMensualidades:
+    """
+    Próximo pago de cada placa cuyo último registro es de mensualidad (el
+    mismo registro que modifica pagar_mensualidad). Una lista ordenada de
+    (fecha, placa) sirve de índice por vencimiento y, encima, se mantienen
+    los tres grupos que pide cartera: vencidas (fecha < hoy), vencen hoy y
+    vencen en los próximos DIAS_SEMANA días. Cada ingreso o pago mueve una
+    sola placa; el cambio de día reagrupa con bisect.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._vence = {}   # placa -> fecha de pago
+        self._orden = []   # [(fecha, placa)] ordenada
+        self._hoy = date.min
+        self._grupos = {grupo: {} for grupo in GRUPOS}  # grupo -> {placa: fecha}
+
+    # --- Construcción ---
+    def cargar(self, pares, hoy: date):
+        """pares: [(placa, proximo_pago)] de las placas con mensualidad."""
+        with self._lock:
+            self._vence = {placa: _fecha(proximo) for placa, proximo in pares if proximo is not None}
+            self._orden = sorted((fecha, placa) for placa, fecha in self._vence.items())
+            self._reagrupar(hoy)
+
+    def _grupo(self, fecha: date):
+        if fecha < self._hoy:
+            return "vencidas"
+        if fecha == self._hoy:
+            return "vencen_hoy"
+        if fecha <= self._hoy + timedelta(days=DIAS_SEMANA):
+            return "vencen_semana"
+        return None
+
+    def _reagrupar(self, hoy: date):
+        self._hoy = hoy
+        manana = bisect_left(self._orden, (hoy + timedelta(days=1),))
+        inicio_hoy = bisect_left(self._orden, (hoy,))
+        fin_semana = bisect_left(self._orden, (hoy + timedelta(days=DIAS_SEMANA + 1),))
+        self._grupos = {
+            "vencidas": {placa: fecha for fecha, placa in self._orden[:inicio_hoy]},
+            "vencen_hoy": {placa: fecha for fecha, placa in self._orden[inicio_hoy:manana]},
+            "vencen_semana": {placa: fecha for fecha, placa in self._orden[manana:fin_semana]},
+        }
+
+    # --- Cambios (después del commit de ingresos y pagos) ---
+    def actualizar(self, placa: str, proximo_pago):
+        """Nueva fecha de pago de `placa`; None si su último registro ya no es de mensualidad."""
+        fecha = _fecha(proximo_pago) if proximo_pago is not None else None
+        with self._lock:
+            anterior = self._vence.pop(placa, None)
+            if anterior is not None:
+                del self._orden[bisect_left(self._orden, (anterior, placa))]
+                grupo = self._grupo(anterior)
+                if grupo:
+                    del self._grupos[grupo][placa]
+            if fecha is None:
+                return
+            self._vence[placa] = fecha
+            insort(self._orden, (fecha, placa))
+            grupo = self._grupo(fecha)
+            if grupo:
+                self._grupos[grupo][placa] = fecha
+
+    # --- Consultas ---
+    def __len__(self):
+        return len(self._vence)
+
+    def grupos(self, hoy: date) -> dict:
+        """{grupo: [(placa, fecha)] ordenadas por fecha}; si el programador no ha corrido aún hoy, reagrupa."""
+        with self._lock:
+            if hoy != self._hoy:
+                self._reagrupar(hoy)
+            return {
+                grupo: sorted(placas.items(), key=lambda par: (par[1], par[0]))
+                for grupo, placas in self._grupos.items()
+            }
+
+    def proximo_pago(self, placa: str):
+        return self._vence.get(placa)
+
+    # --- Programador del cambio de día ---
+    async def programar(self, reloj, recargar, parar: asyncio.Event):
+        """
+        Espera a la medianoche de `reloj()` y llama `recargar()` (en el pool
+        de hilos: relee la base, así corrige lo que hayan cambiado otros
+        workers) hasta que `parar` se active.
+        """
+        from starlette.concurrency import run_in_threadpool
+
+        while not parar.is_set():
+            # Hora local sin zona: Colombia no cambia de horario
+            ahora = reloj().replace(tzinfo=None)
+            medianoche = datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time())
+            try:
+                await asyncio.wait_for(parar.wait(), (medianoche - ahora).total_seconds() + 1)
+            except asyncio.TimeoutError:
+                try:
+                    await run_in_threadpool(recargar)
+                except Exception as e:
+                    print(f"❌ No se pudo recargar la agenda de mensualidades: {e}")
+                    with self._lock:
+                        self._reagrupar(reloj().date())
+                    continue
+                conteos = {grupo: len(placas) for grupo, placas in self._grupos.items()}
+                print(f"📅 Mensualidades {self._hoy}: {conteos['vencidas']} vencidas, "
+                      f"{conteos['vencen_hoy']} vencen hoy, {conteos['vencen_semana']} esta semana")
+
+
+def _fecha(valor) -> date:
+    return valor.date() if isinstance(valor, datetime) else valor